@@ -0,0 +1,102 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""StreamingResampler 与 resampy 的吞吐对比 + 质量校验
+
+模拟 TTS 引擎按网络块（默认 20~120ms 随机长度）收到音频的场景：
+- 吞吐：逐块 resampy.resample（引擎原来的做法） vs StreamingResampler，给出实时倍率；
+- 质量：多频点正弦分块重采样后与理想 16k 信号比较 SNR；逐块 resampy 每块输出长度取整造成的
+  时间漂移和块边界误差都会拉低 SNR；
+- 一致性：分块输出与整段一次性输出逐样本相同。
+任一采样率的 SNR 低于阈值或分块结果不一致时以非零状态退出。
+
+用法：
+    python scripts/benchmark_resampler.py [--seconds 10] [--min_snr 60]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+import numpy as np
+import resampy
+
+from src.tts.resampler import StreamingResampler
+
+SR_NEW = 16000
+
+
+def make_chunks(num_samples, sr, rng):
+    bounds = [0]
+    while bounds[-1] < num_samples:
+        bounds.append(bounds[-1] + int(sr * rng.uniform(0.02, 0.12)))
+    bounds[-1] = num_samples
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+def test_signal(sr, seconds):
+    # 多个频点的正弦叠加，避开过渡带（> 7kHz）
+    t = np.arange(int(sr * seconds)) / sr
+    freqs = [180.0, 733.3, 1900.0, 3100.7, 5200.0]
+    x = sum(0.15 * np.sin(2 * np.pi * f * t + i) for i, f in enumerate(freqs))
+    return x.astype(np.float32), freqs
+
+
+def ideal_signal(freqs, n):
+    t = np.arange(n) / SR_NEW
+    return sum(0.15 * np.sin(2 * np.pi * f * t + i) for i, f in enumerate(freqs))
+
+
+def snr_db(y, ref, margin=1000):
+    n = min(len(y), len(ref)) - margin
+    err = y[margin:n] - ref[margin:n]
+    return 10 * np.log10(np.mean(ref[margin:n] ** 2) / max(np.mean(err ** 2), 1e-30))
+
+
+def run(sr, seconds, min_snr, rng):
+    x, freqs = test_signal(sr, seconds)
+    chunks = make_chunks(len(x), sr, rng)
+
+    t = time.perf_counter()
+    y_resampy = np.concatenate([resampy.resample(x[a:b], sr, SR_NEW) for a, b in chunks])
+    t_resampy = time.perf_counter() - t
+
+    resampler = StreamingResampler(sr, SR_NEW)
+    t = time.perf_counter()
+    parts = [resampler.process(x[a:b]) for a, b in chunks]
+    parts.append(resampler.flush())
+    t_stream = time.perf_counter() - t
+    y_stream = np.concatenate(parts)
+
+    resampler.reset()
+    y_whole = np.concatenate([resampler.process(x), resampler.flush()])
+    consistent = len(y_whole) == len(y_stream) and np.array_equal(y_whole, y_stream)
+
+    ref = ideal_signal(freqs, len(y_stream))
+    snr_resampy = snr_db(y_resampy, ref)
+    snr_stream = snr_db(y_stream, ref)
+    ok = consistent and snr_stream >= min_snr
+    print(f"{sr:>7}{len(chunks):>8}{seconds / t_resampy:>11.0f}x{seconds / t_stream:>11.0f}x"
+          f"{snr_resampy:>12.1f}{snr_stream:>12.1f}  {'ok' if ok else 'FAIL'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sr', type=int, nargs='+', default=[22050, 24000, 44100])
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--min_snr', type=float, default=60.0)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    # 预热 resampy 的 numba 编译
+    resampy.resample(np.zeros(4410, np.float32), 22050, SR_NEW)
+    print(f"{'sr':>7}{'chunks':>8}{'resampy RT':>12}{'stream RT':>12}{'resampy SNR':>12}{'stream SNR':>12}")
+    ok = all([run(sr, args.seconds, args.min_snr, rng) for sr in args.sr])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
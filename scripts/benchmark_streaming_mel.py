@@ -0,0 +1,110 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""Wav2Lip 流式 mel 与批量实现的一致性校验 + 单步 CPU 耗时
+
+模拟 LipAudioStreamHandler 的滑动窗口（左 stride + 2*batch_size 帧 + 右 stride），
+逐步对比 audio.melspectrogram 切块结果与 StreamingMelExtractor 的输出，
+最大误差超过阈值时以非零状态退出。
+
+用法：
+    python scripts/benchmark_streaming_mel.py [--batch_size 16] [--steps 200] [--wav xxx.wav]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+
+import numpy as np
+
+from src.avatars.wav2lip import audio
+from src.avatars.wav2lip.streaming_mel import StreamingMelExtractor
+
+FPS = 50
+CHUNK = 16000 // FPS
+
+
+def batch_mel_chunks(frames, fps, stride_left_size, stride_right_size):
+    """原 LipAudioStreamHandler.run_step 中的批量实现"""
+    inputs = np.concatenate(frames)
+    mel = audio.melspectrogram(inputs)
+    left = max(0, stride_left_size * 80 / 50)
+    mel_idx_multiplier = 80. * 2 / fps
+    mel_step_size = 16
+    i = 0
+    mel_chunks = []
+    while i < (len(frames) - stride_left_size - stride_right_size) / 2:
+        start_idx = int(left + i * mel_idx_multiplier)
+        if start_idx + mel_step_size > len(mel[0]):
+            mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
+        else:
+            mel_chunks.append(mel[:, start_idx: start_idx + mel_step_size])
+        i += 1
+    return mel_chunks
+
+
+def make_stream(num_samples, wav_path=None):
+    if wav_path:
+        wav = audio.load_wav(wav_path, 16000).astype(np.float32)
+        reps = num_samples // len(wav) + 1
+        return np.tile(wav, reps)[:num_samples]
+    # 合成带包络的多谐波信号，夹杂静音段
+    t = np.arange(num_samples) / 16000
+    wav = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 1330 * t + 1.0)
+    wav *= 0.5 + 0.5 * np.sin(2 * np.pi * 0.7 * t)
+    wav += 0.02 * np.random.randn(num_samples)
+    wav[(t % 3.0) > 2.2] = 0
+    return wav.astype(np.float32)
+
+
+def run(batch_size, steps, l, r, wav_path, tol):
+    step_frames = batch_size * 2
+    stream = make_stream((l + r + step_frames * steps) * CHUNK, wav_path)
+    frames = [stream[i * CHUNK:(i + 1) * CHUNK] for i in range(len(stream) // CHUNK)]
+
+    extractor = StreamingMelExtractor(FPS, l, r, CHUNK)
+    # 预热，排除 librosa / mel basis 的首次初始化
+    batch_mel_chunks(frames[:l + r + step_frames], FPS, l, r)
+    t_batch = t_stream = 0.
+    max_err = 0.
+    offset = 0
+    for k in range(steps):
+        window = frames[offset:offset + l + r + step_frames]
+        t = time.perf_counter()
+        expect = batch_mel_chunks(window, FPS, l, r)
+        t_batch += time.perf_counter() - t
+
+        inputs = np.concatenate(window)
+        t = time.perf_counter()
+        got = extractor(inputs, offset * CHUNK)
+        t_stream += time.perf_counter() - t
+
+        assert len(got) == len(expect)
+        for a, b in zip(got, expect):
+            max_err = max(max_err, float(np.max(np.abs(a - b))))
+        offset += step_frames
+
+    ok = max_err <= tol
+    print(f"{batch_size:>6}{t_batch / steps * 1000:>12.3f}{t_stream / steps * 1000:>13.3f}"
+          f"{t_batch / t_stream:>9.2f}x{max_err:>12.2e}  {'ok' if ok else 'MISMATCH'}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--batch_size', type=int, nargs='+', default=[8, 10, 16])
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('-l', type=int, default=10)
+    parser.add_argument('-r', type=int, default=10)
+    parser.add_argument('--wav', type=str, default=None)
+    parser.add_argument('--tol', type=float, default=1e-6)
+    args = parser.parse_args()
+
+    print(f"{'batch':>6}{'batch ms':>12}{'stream ms':>13}{'speedup':>10}{'max err':>12}")
+    ok = all([run(b, args.steps, args.l, args.r, args.wav, args.tol) for b in args.batch_size])
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
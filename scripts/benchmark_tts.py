@@ -0,0 +1,411 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""TTS 延迟基准（离线，本地桩服务回放协议轨迹）
+
+对每个引擎逐句合成（上一句 end 帧到达后再发下一句），--sessions 个会话同时进行，
+在引擎输出帧的出口记录到达时间，统计：
+- ttff_ms：put_msg_txt 到首个音频帧的时间；
+- rtf：整句合成耗时 / 音频时长；
+- jitter_ms：网络块之间到达间隔的标准差，max_gap_ms 为最大间隔；
+- underrun_ms：从首帧开始按 20ms 实时播放时，音频帧最多晚到多少（0 表示不会断音）。
+开启 --server_concurrency 时报告中附带调度器的排队等待统计。
+结果写入 JSON 报告，便于跨版本对比。
+
+引擎：mock 不需要服务；xtts / gpt-sovits / fishtts / cosyvoice（HTTP）和 cosyvoice_api / doubao（WebSocket）
+连接本地桩服务，桩服务按轨迹文件回放服务端的响应时序和内容。
+
+轨迹格式（JSON）：
+    {"protocol": "http" | "websocket", "events": [...]}
+    事件：{"t_ms": 相对请求（WebSocket 为最近一次 recv）的发送时间, "kind": ..., ...}
+    - recv：等待客户端的一条消息（仅 WebSocket）
+    - json：发送 JSON 文本 data，字符串中的 {task_id} 替换为客户端消息里的 task_id
+    - pcm：发送 bytes 字节的确定性 16bit PCM（sample_rate 采样率）
+    - ogg：发送 samples 个样本编码成的独立 OGG 片段（gpt-sovits 的流式格式）
+    - doubao_audio：发送豆包二进制协议的音频帧，last 为 True 时是末包
+    - b64：发送录制下来的原始字节 data（base64）
+不指定 --trace 时按 --first_byte_ms / --chunk_ms / --rtf / --audio_s 为每个引擎生成合成轨迹；
+--record 可以把 HTTP 引擎到真实服务的一次响应录成轨迹（桩服务作为转发代理）。
+
+用法：
+    python scripts/benchmark_tts.py --engines mock xtts cosyvoice_api --output tts_report.json
+    python scripts/benchmark_tts.py --engines xtts --record http://127.0.0.1:8020 --trace xtts_trace.json
+    python scripts/benchmark_tts.py --engines xtts --trace xtts_trace.json
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import base64
+import io
+import json
+import platform
+import subprocess
+import tempfile
+import threading
+import time
+
+import aiohttp
+import numpy as np
+import soundfile as sf
+from aiohttp import web
+
+from src.config.schema import Config, TTSConfig
+from src.tts.base import shutdown_tts_loop
+from src.tts.factory import create_tts_engine
+
+SENTENCES = [
+    "你好，我是数字人助手。",
+    "今天天气不错，适合出去走走。",
+    "如果你有任何问题，可以随时问我，我会尽力为你解答。",
+    "好的。",
+    "语音合成的首包延迟直接决定了数字人开口说话的速度。",
+]
+
+# 各引擎的协议和服务端音频格式
+ENGINE_PROTOCOLS = {
+    "xtts": ("http", "pcm", 24000),
+    "gpt-sovits": ("http", "ogg", 32000),
+    "fishtts": ("http", "pcm", 44100),
+    "cosyvoice": ("http", "pcm", 22050),
+    "cosyvoice_api": ("websocket", "pcm", 22050),
+    "doubao": ("websocket", "doubao_audio", 16000),
+}
+
+
+def synthetic_trace(engine, first_byte_ms, chunk_ms, rtf, audio_s):
+    protocol, kind, sr = ENGINE_PROTOCOLS[engine]
+    samples = int(sr * chunk_ms / 1000)
+    n_chunks = max(int(audio_s * 1000 / chunk_ms), 1)
+    audio = []
+    for i in range(n_chunks):
+        event = {"t_ms": first_byte_ms + i * chunk_ms * rtf, "kind": kind, "sample_rate": sr}
+        if kind == "ogg":
+            event["samples"] = samples
+        else:
+            event["bytes"] = samples * 2
+        audio.append(event)
+
+    if engine == "cosyvoice_api":
+        header = {"event": "task-started", "task_id": "{task_id}"}
+        events = [{"kind": "recv"}, {"t_ms": 20, "kind": "json", "data": {"header": header}},
+                  {"kind": "recv"}, {"kind": "recv"}]
+        events += audio
+        finished = {"header": {"event": "task-finished", "task_id": "{task_id}"}}
+        events.append({"t_ms": audio[-1]["t_ms"], "kind": "json", "data": finished})
+    elif engine == "doubao":
+        audio[-1]["last"] = True
+        events = [{"kind": "recv"}] + audio
+    else:
+        events = audio
+    return {"protocol": protocol, "events": events}
+
+
+def _pcm(n_bytes, sr, offset):
+    t = np.arange(offset, offset + n_bytes // 2) / sr
+    return (np.sin(2 * np.pi * 220 * t) * 8000).astype("<i2").tobytes()
+
+
+def _payload(event, seq, offset):
+    """生成一个事件的发送内容，返回 (数据, 消耗的样本数)。"""
+    kind = event["kind"]
+    sr = event.get("sample_rate", 16000)
+    if kind == "b64":
+        return base64.b64decode(event["data"]), 0
+    if kind == "pcm":
+        return _pcm(event["bytes"], sr, offset), event["bytes"] // 2
+    if kind == "ogg":
+        buf = io.BytesIO()
+        pcm = np.frombuffer(_pcm(event["samples"] * 2, sr, offset), "<i2")
+        sf.write(buf, pcm, sr, format="OGG")
+        return buf.getvalue(), event["samples"]
+    if kind == "doubao_audio":
+        audio = _pcm(event["bytes"], sr, offset)
+        seq = -seq if event.get("last") else seq
+        header = bytes([0x11, 0xB1 if seq > 0 else 0xB3, 0x10, 0x00])
+        return header + seq.to_bytes(4, "big", signed=True) + len(audio).to_bytes(4, "big") + audio, event["bytes"] // 2
+    raise ValueError(f"unknown trace event kind: {kind}")
+
+
+class StubServer:
+    """按轨迹回放的桩服务；record 不为空时作为 HTTP 转发代理录制轨迹。"""
+
+    def __init__(self, trace=None, record=None):
+        self.trace = trace
+        self.record = record
+        self.recorded = None
+
+    async def _sleep_until(self, anchor, t_ms):
+        delay = anchor + t_ms / 1000 - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def handle(self, request):
+        if request.path == "/clone_speaker":
+            # xtts 初始化时获取说话人
+            return web.json_response({})
+        if self.record:
+            return await self._proxy(request)
+        if request.headers.get("Upgrade", "").lower() == "websocket":
+            return await self._replay_ws(request)
+        return await self._replay_http(request)
+
+    async def _replay_http(self, request):
+        await request.read()
+        anchor = time.perf_counter()
+        resp = web.StreamResponse()
+        await resp.prepare(request)
+        offset = 0
+        for seq, event in enumerate(self.trace["events"], 1):
+            await self._sleep_until(anchor, event.get("t_ms", 0))
+            data, n = _payload(event, seq, offset)
+            offset += n
+            await resp.write(data)
+        await resp.write_eof()
+        return resp
+
+    async def _replay_ws(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        # 连接复用：客户端可以在同一条连接上连续提交多句
+        while not ws.closed:
+            anchor, task_id, offset = time.perf_counter(), "", 0
+            for seq, event in enumerate(self.trace["events"], 1):
+                if event["kind"] == "recv":
+                    msg = await ws.receive()
+                    if msg.type != aiohttp.WSMsgType.TEXT and msg.type != aiohttp.WSMsgType.BINARY:
+                        return ws
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        task_id = json.loads(msg.data).get("header", {}).get("task_id", task_id)
+                    anchor = time.perf_counter()
+                    continue
+                await self._sleep_until(anchor, event.get("t_ms", 0))
+                if event["kind"] == "json":
+                    await ws.send_str(json.dumps(event["data"]).replace("{task_id}", task_id))
+                else:
+                    data, n = _payload(event, seq, offset)
+                    offset += n
+                    await ws.send_bytes(data)
+        return ws
+
+    async def _proxy(self, request):
+        body = await request.read()
+        headers = {k: v for k, v in request.headers.items() if k.lower() not in ("host", "content-length")}
+        anchor = time.perf_counter()
+        events = []
+        async with aiohttp.ClientSession() as session:
+            async with session.request(request.method, self.record + request.path_qs,
+                                       data=body, headers=headers) as upstream:
+                resp = web.StreamResponse(status=upstream.status)
+                await resp.prepare(request)
+                async for chunk in upstream.content.iter_any():
+                    events.append({"t_ms": round((time.perf_counter() - anchor) * 1000, 1), "kind": "b64",
+                                   "data": base64.b64encode(chunk).decode()})
+                    await resp.write(chunk)
+        await resp.write_eof()
+        if self.recorded is None and events:
+            self.recorded = {"protocol": "http", "events": events}
+        return resp
+
+    def start(self):
+        """在后台线程启动，返回端口。"""
+        ready = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            app = web.Application()
+            app.router.add_route("*", "/{tail:.*}", self.handle)
+            runner = web.AppRunner(app)
+            loop.run_until_complete(runner.setup())
+            site = web.TCPSite(runner, "127.0.0.1", 0)
+            loop.run_until_complete(site.start())
+            ready.append(site._server.sockets[0].getsockname()[1])
+            loop.run_forever()
+
+        threading.Thread(target=run, daemon=True).start()
+        while not ready:
+            time.sleep(0.01)
+        return ready[0]
+
+
+class _Recorder:
+    """充当 Avatar，记录每个音频帧到达的时间。"""
+
+    def __init__(self, sessionid=0):
+        self.sessionid = sessionid
+        self.arrivals = []
+        self.done = threading.Event()
+
+    def put_audio_frame(self, frame, eventpoint, generation=None):
+        self.arrivals.append(time.perf_counter())
+        if eventpoint and eventpoint.get("status") == "end":
+            self.done.set()
+
+
+def make_engine(engine, port, args, ref_file, sessionid):
+    tts = TTSConfig(type=engine, lookahead=1, cache_mb=0, ref_file=ref_file, ref_text="",
+                    tts_server=f"http://127.0.0.1:{port}", mock=json.loads(args.mock),
+                    server_concurrency=args.server_concurrency)
+    config = Config(tts=tts)
+    parent = _Recorder(sessionid)
+    tts_engine = create_tts_engine(engine, config, parent)
+    ws_uri = f"ws://127.0.0.1:{port}/ws"
+    if engine == "cosyvoice_api":
+        tts_engine.uri = ws_uri
+    elif engine == "doubao":
+        tts_engine.api_url = ws_uri
+    return tts_engine, parent
+
+
+def _summary(values):
+    values = np.asarray(values, dtype=np.float64)
+    return {
+        "mean": round(float(values.mean()), 3),
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+        "max": round(float(values.max()), 3),
+    }
+
+
+def run_session(engine, tts_engine, parent, args, metrics):
+    frame_s = 1 / tts_engine.fps
+    for i in range(args.sentences):
+        text = SENTENCES[(i + parent.sessionid) % len(SENTENCES)]
+        parent.arrivals.clear()
+        parent.done.clear()
+        start = time.perf_counter()
+        tts_engine.put_msg_txt(text)
+        if not parent.done.wait(args.timeout):
+            print(f"{engine}: session {parent.sessionid} sentence {i} timed out")
+            continue
+        # 最后一帧是引擎补的 end 静音帧，不计入
+        arrivals = np.array(parent.arrivals[:-1])
+        if len(arrivals) == 0:
+            print(f"{engine}: session {parent.sessionid} sentence {i} produced no audio")
+            continue
+        metrics["ttff"].append((arrivals[0] - start) * 1000)
+        metrics["rtf"].append((arrivals[-1] - start) / (len(arrivals) * frame_s))
+        # 同一网络块解出的帧几乎同时到达，间隔 > 1ms 的才算块边界
+        gaps = np.diff(arrivals) * 1000
+        gaps = gaps[gaps > 1.0]
+        metrics["jitter"].append(float(gaps.std()) if len(gaps) > 1 else 0.0)
+        metrics["max_gap"].append(float(gaps.max()) if len(gaps) else 0.0)
+        schedule = arrivals[0] + np.arange(len(arrivals)) * frame_s
+        metrics["underrun"].append(max(float((arrivals - schedule).max()) * 1000, 0.0))
+
+
+def run_engine(engine, args, ref_file):
+    server = None
+    port = 0
+    trace_source = None
+    if engine != "mock":
+        if args.record:
+            trace = None
+        elif args.trace:
+            with open(args.trace, encoding="utf-8") as f:
+                trace = json.load(f)
+            trace_source = args.trace
+        else:
+            trace = synthetic_trace(engine, args.first_byte_ms, args.chunk_ms, args.rtf, args.audio_s)
+            trace_source = "synthetic"
+        server = StubServer(trace, args.record)
+        port = server.start()
+
+    quit_event = threading.Event()
+    metrics = {k: [] for k in ("ttff", "rtf", "jitter", "max_gap", "underrun")}
+    # 多个会话同时逐句合成，模拟共享同一个服务的场景
+    threads = []
+    for sessionid in range(args.sessions):
+        tts_engine, parent = make_engine(engine, port, args, ref_file, sessionid)
+        tts_engine.render(quit_event)
+        thread = threading.Thread(target=run_session, args=(engine, tts_engine, parent, args, metrics))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    quit_event.set()
+    if args.record and server.recorded:
+        with open(args.trace, "w", encoding="utf-8") as f:
+            json.dump(server.recorded, f)
+        print(f"{engine}: trace recorded to {args.trace}")
+
+    if not metrics["ttff"]:
+        return {"trace": trace_source, "sentences": 0}
+    result = {
+        "trace": trace_source,
+        "sessions": args.sessions,
+        "sentences": len(metrics["ttff"]),
+        "ttff_ms": _summary(metrics["ttff"]),
+        "rtf": _summary(metrics["rtf"]),
+        "jitter_ms": _summary(metrics["jitter"]),
+        "max_gap_ms": _summary(metrics["max_gap"]),
+        "underrun_ms": _summary(metrics["underrun"]),
+    }
+    gate = tts_engine.gate
+    if gate is not None:
+        result["dispatch"] = gate.stats()
+    return result
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--engines", nargs="+", default=["mock"],
+                        choices=["mock"] + list(ENGINE_PROTOCOLS))
+    parser.add_argument("--sentences", type=int, default=10, help="每个会话合成的句数")
+    parser.add_argument("--sessions", type=int, default=1, help="同时合成的会话数")
+    parser.add_argument("--server_concurrency", type=int, default=0, help="tts.server_concurrency，0 不调度")
+    parser.add_argument("--trace", help="回放的轨迹文件；配合 --record 时为录制输出")
+    parser.add_argument("--record", help="录制模式：转发到该 HTTP 服务并把第一条响应录成轨迹")
+    parser.add_argument("--first_byte_ms", type=float, default=200.0)
+    parser.add_argument("--chunk_ms", type=float, default=100.0)
+    parser.add_argument("--rtf", type=float, default=0.3)
+    parser.add_argument("--audio_s", type=float, default=2.0)
+    parser.add_argument("--mock", default="{}", help='mock 引擎参数（JSON），如 \'{"first_byte_ms": 150}\'')
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--output", default="tts_benchmark.json")
+    args = parser.parse_args()
+    if args.record and not args.trace:
+        parser.error("--record 需要 --trace 指定输出文件")
+
+    # cosyvoice 需要上传参考音频
+    ref_wav = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
+    sf.write(ref_wav.name, np.zeros(16000, np.int16), 16000)
+
+    results = {}
+    for engine in args.engines:
+        results[engine] = run_engine(engine, args, ref_wav.name)
+        r = results[engine]
+        if r["sentences"]:
+            print(f"{engine:>14}  ttff p50 {r['ttff_ms']['p50']:7.1f}ms  p95 {r['ttff_ms']['p95']:7.1f}ms  "
+                  f"rtf {r['rtf']['mean']:.3f}  jitter {r['jitter_ms']['mean']:6.1f}ms  "
+                  f"underrun {r['underrun_ms']['max']:6.1f}ms")
+    shutdown_tts_loop()
+    os.unlink(ref_wav.name)
+
+    report = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "params": {k: getattr(args, k) for k in ("sessions", "server_concurrency", "sentences",
+                                                     "first_byte_ms", "chunk_ms", "rtf", "audio_s", "mock")},
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
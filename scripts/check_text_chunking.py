@@ -0,0 +1,70 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""LLM 流式分段自检（AdaptiveTextStreamProcessor）
+
+- 中英混排：以拉丁词开头的中文回复按 2 个字符一个 token 输入，检查在 flush 之前已经切出多段，
+  且首段不超过 first_max；
+- 纯中文 / 纯英文：检查分段前后拼接与原文一致、后续分段逐步加长；
+- LLM 停顿：首批 token 不含标点、之后不再有新 token，检查 first_deadline_ms 到时定时器送出首段。
+检查失败时以非零状态退出。
+
+用法：
+    python scripts/check_text_chunking.py
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import time
+
+from src.llm.base import CHUNK_POLICIES, AdaptiveTextStreamProcessor, count_units
+
+CASES = {
+    "mixed": "Python 是一种编程语言，它简单易学。它有丰富的第三方库，可以用来做数据分析、机器学习和网站开发。"
+             "很多初学者把它作为第一门编程语言，因为语法清晰，社区也非常活跃。",
+    "cjk": "你好，我是数字人。今天天气不错，适合出去走走，也可以在家里看看书，听听音乐，放松一下心情。",
+    "latin": "Hello there, I am a digital human. The weather is nice today, so it is a good time to go for a walk, "
+             "read a book at home, or listen to some music and relax.",
+}
+
+
+def feed(text, step=2):
+    processor = AdaptiveTextStreamProcessor()
+    fragments = []
+    for i in range(0, len(text), step):
+        processor.process_chunk(text[i:i + step], fragments.append)
+    before_flush = len(fragments)
+    processor.flush(fragments.append)
+    return fragments, before_flush
+
+
+def main():
+    ok = True
+    for name, text in CASES.items():
+        fragments, before_flush = feed(text)
+        units = [count_units(f, ",.!?;:，。！？：；、") for f in fragments]
+        print(f"{name}: {len(fragments)} fragments ({before_flush} before flush), units {units}")
+        for fragment in fragments:
+            print(f"    {fragment!r}")
+        ok &= "".join(fragments).replace(" ", "") == text.replace(" ", "")
+        ok &= before_flush >= 3 and units[0] <= CHUNK_POLICIES["cjk"].first_max
+        ok &= units[1] <= units[-2] if len(units) > 3 else True
+
+    # LLM 停顿：首批 token 没有标点，之后一直没有新 token
+    processor = AdaptiveTextStreamProcessor()
+    fragments = []
+    start = time.perf_counter()
+    processor.process_chunk("Python 是一种", fragments.append)
+    while not fragments and time.perf_counter() - start < 2:
+        time.sleep(0.01)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"stall: first fragment {fragments[:1]} after {elapsed_ms:.0f}ms")
+    ok &= bool(fragments) and elapsed_ms < 600
+    processor.flush(fragments.append)
+
+    print('ok' if ok else 'FAIL')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
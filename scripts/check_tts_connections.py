@@ -0,0 +1,157 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""TTS 连接复用自检（本地桩服务，不依赖外网）
+
+- HTTP：起一个模拟 XTTS /tts_stream 的 aiohttp 服务，XTTS 连续合成多句，
+  检查整个过程只新建了 1 条 TCP 连接；
+- WebSocket：起一个模拟 DashScope run-task / continue-task / finish-task 协议的服务，
+  CosyVoiceAPITTS 连续合成多句，检查连接被复用；再让服务端主动断开空闲连接，
+  检查下一句能自动换新连接重试成功。
+最后打印 connection_stats()，检查失败时以非零状态退出。
+
+用法：
+    python scripts/check_tts_connections.py [--sentences 5]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import threading
+from types import SimpleNamespace
+
+import numpy as np
+import websockets
+from aiohttp import web
+
+from src.tts.base import BaseTTS, shutdown_tts_loop
+from src.tts.connection import connection_stats
+from src.tts.engines.cosyvoice_api import CosyVoiceAPITTS
+from src.tts.engines.xtts import XTTS
+
+PCM = (np.sin(2 * np.pi * 220 * np.arange(12000) / 24000) * 8000).astype('<i2').tobytes()
+
+
+class _Parent:
+    sessionid = 0
+
+    def __init__(self):
+        self.frames = 0
+
+    def put_audio_frame(self, frame, eventpoint, generation=None):
+        self.frames += 1
+
+
+async def _http_tts_stream(request):
+    resp = web.StreamResponse()
+    await resp.prepare(request)
+    for i in range(0, len(PCM), 4800):
+        await resp.write(PCM[i:i + 4800])
+    await resp.write_eof()
+    return resp
+
+
+class _DashScopeStub:
+    """只实现合成所需的最小协议；close_idle 为 True 时任务结束后由服务端断开连接。"""
+
+    def __init__(self):
+        self.connections = 0
+        self.close_idle = False
+
+    async def handler(self, ws, path=None):
+        self.connections += 1
+        async for message in ws:
+            cmd = json.loads(message)
+            action, task_id = cmd["header"]["action"], cmd["header"]["task_id"]
+            if action == "run-task":
+                await ws.send(json.dumps({"header": {"event": "task-started", "task_id": task_id}}))
+            elif action == "finish-task":
+                for i in range(0, len(PCM), 4410):
+                    await ws.send(PCM[i:i + 4410])
+                await ws.send(json.dumps({"header": {"event": "task-finished", "task_id": task_id}}))
+                if self.close_idle:
+                    await ws.close()
+                    return
+
+
+def start_stub_servers(loop, ready):
+    asyncio.set_event_loop(loop)
+    app = web.Application()
+    app.router.add_post('/tts_stream', _http_tts_stream)
+    runner = web.AppRunner(app)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    http_port = site._server.sockets[0].getsockname()[1]
+
+    stub = _DashScopeStub()
+    server = loop.run_until_complete(websockets.serve(stub.handler, '127.0.0.1', 0))
+    ws_port = server.sockets[0].getsockname()[1]
+    ready.append((http_port, ws_port, stub))
+    loop.run_forever()
+
+
+def make_engine(cls, server_url):
+    config = SimpleNamespace(
+        audio=SimpleNamespace(fps=50),
+        tts=SimpleNamespace(lookahead=1, cache_mb=0, server_concurrency=0, ref_file='stub', ref_text='', tts_server=server_url),
+    )
+    parent = _Parent()
+    engine = cls.__new__(cls)
+    BaseTTS.__init__(engine, config, parent)
+    return engine, parent
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sentences', type=int, default=5)
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    ready = []
+    threading.Thread(target=start_stub_servers, args=(loop, ready), daemon=True).start()
+    while not ready:
+        threading.Event().wait(0.05)
+    http_port, ws_port, stub = ready[0]
+    ok = True
+
+    http_url = f'http://127.0.0.1:{http_port}'
+    xtts, parent = make_engine(XTTS, http_url)
+    xtts.speaker = {}
+    for i in range(args.sentences):
+        xtts.txt_to_audio((f'句子{i}', {}))
+    http_stats = connection_stats()[http_url]
+    print(f"http: frames={parent.frames} {http_stats}")
+    ok &= http_stats['opened'] == 1 and http_stats['requests'] == args.sentences
+
+    cosy, parent = make_engine(CosyVoiceAPITTS, f'ws://127.0.0.1:{ws_port}')
+    cosy.api_key = 'stub'
+    cosy.uri = f'ws://127.0.0.1:{ws_port}/'
+    cosy.model = 'stub'
+    for i in range(args.sentences):
+        cosy.txt_to_audio((f'句子{i}', {}))
+    frames_before = parent.frames
+    ws_url = f'ws://127.0.0.1:{ws_port}'
+    print(f"websocket: frames={parent.frames} server connections={stub.connections} {connection_stats()[ws_url]}")
+    ok &= stub.connections == 1 and parent.frames > 0
+
+    # 服务端断开空闲连接后，下一句应自动换新连接
+    stub.close_idle = True
+    cosy.txt_to_audio(('断开', {}))
+    stub.close_idle = False
+    cosy.txt_to_audio(('重连', {}))
+    ws_stats = connection_stats()[ws_url]
+    print(f"websocket after server close: frames={parent.frames - frames_before} "
+          f"server connections={stub.connections} {ws_stats}")
+    per_sentence = frames_before // args.sentences
+    ok &= parent.frames - frames_before == 2 * per_sentence and stub.connections == 2
+
+    shutdown_tts_loop()
+    print('ok' if ok else 'FAIL')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
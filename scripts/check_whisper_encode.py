@@ -0,0 +1,62 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""MuseTalk whisper encoder 一致性校验
+
+- 30s 输入：Audio2Feature.encode（手写前向，流式短窗口使用）与 encode_full
+  （transformers 原版 encoder，非流式默认路径）逐层输出的最大误差，超过 --tol 时以非零状态退出；
+- 短窗口：StreamingAudio2Feature 的特征与 30s 版本在窗口内的差异，仅作参考（注意力范围不同，
+  本来就不完全一致）。
+
+用法：
+    python scripts/check_whisper_encode.py [--model_path ./models/musetalk/whisper] [--tol 0.001]
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+
+import numpy as np
+
+from src.avatars.musetalk.whisper.audio2feature import Audio2Feature, StreamingAudio2Feature, weight_dtype
+
+
+def make_wav(num_samples):
+    t = np.arange(num_samples) / 16000
+    wav = 0.3 * np.sin(2 * np.pi * 220 * t) + 0.2 * np.sin(2 * np.pi * 1330 * t + 1.0)
+    wav *= 0.5 + 0.5 * np.sin(2 * np.pi * 0.7 * t)
+    wav += 0.02 * np.random.randn(num_samples)
+    return wav.astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--model_path', default='./models/musetalk/whisper')
+    parser.add_argument('--seconds', type=float, default=1.28)
+    parser.add_argument('--window_s', type=float, default=2.0)
+    parser.add_argument('--tol', type=float, default=None, help='默认 fp32 为 1e-3，fp16 为 2e-2')
+    args = parser.parse_args()
+    tol = args.tol if args.tol is not None else (2e-2 if str(weight_dtype) == 'torch.float16' else 1e-3)
+
+    processor = Audio2Feature(model_path=args.model_path)
+    wav = make_wav(int(args.seconds * 16000))
+    mel = processor.log_mel(wav)
+    full = processor.encode_full(mel)[0]
+    hand = processor.encode(mel)[0]
+    scale = np.abs(full).max(axis=(0, 2))
+    err = np.abs(full - hand).max(axis=(0, 2)) / scale
+    print(f"30s input: layers {full.shape[1]}, relative max error per layer {np.round(err, 6).tolist()}")
+    ok = bool(err.max() <= tol)
+
+    stream = StreamingAudio2Feature(processor, int(args.window_s * 16000))
+    short = stream(wav)
+    n = int(args.seconds * 50)
+    diff = np.abs(short[:n] - full[:n]).max(axis=(0, 2)) / scale
+    print(f"{args.window_s}s window vs 30s (reference only): relative max error per layer {np.round(diff, 4).tolist()}")
+
+    print('ok' if ok else f'FAIL: encode differs from encode_full by more than {tol}')
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
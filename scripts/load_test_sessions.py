@@ -0,0 +1,170 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""多会话压测：逐步增加模拟会话，找出帧率开始崩塌的拐点
+
+每个模拟会话是一个 aiortc 客户端（和前端一样 recvonly 接收音视频），通过 /offer 建立连接，
+每隔 --speak_interval_s 用 /human type=echo 让数字人说一句话，使推理保持在说话状态。
+每 --step_s 秒增加一个会话，统计每个会话最近半个步长内实际收到的视频帧率，同时记录 /health 的 capacity。
+
+结束条件：
+- 任一会话帧率低于 --video_fps * --min_fps_ratio：拐点为上一步的会话数；
+- /offer 返回 503（准入控制拒绝）：记录拒绝时的会话数，可与实测拐点对比；
+- 达到 --max_sessions。
+结果打印成表格并写入 JSON 报告。
+
+用法：
+    python scripts/load_test_sessions.py --url http://127.0.0.1:8010 --max_sessions 8 --output load_report.json
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import ssl
+import time
+from collections import deque
+
+import aiohttp
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError
+
+
+class SimSession:
+    def __init__(self, http, url):
+        self.http = http
+        self.url = url
+        self.pc = RTCPeerConnection()
+        self.sessionid = None
+        self.frames = deque()  # 收到视频帧的时间
+        self.tasks = []
+
+    async def connect(self):
+        """返回 None 表示连接成功，否则返回被拒绝时的响应"""
+        self.pc.addTransceiver('audio', direction='recvonly')
+        self.pc.addTransceiver('video', direction='recvonly')
+
+        @self.pc.on('track')
+        def on_track(track):
+            self.tasks.append(asyncio.ensure_future(self._consume(track)))
+
+        await self.pc.setLocalDescription(await self.pc.createOffer())
+        offer = {"sdp": self.pc.localDescription.sdp, "type": self.pc.localDescription.type}
+        async with self.http.post(f'{self.url}/offer', json=offer) as resp:
+            if resp.status != 200:
+                return {"status": resp.status, "retry_after": resp.headers.get('Retry-After'), "body": await resp.text()}
+            answer = await resp.json()
+        self.sessionid = answer['sessionid']
+        await self.pc.setRemoteDescription(RTCSessionDescription(sdp=answer['sdp'], type=answer['type']))
+        return None
+
+    async def _consume(self, track):
+        while True:
+            try:
+                await track.recv()
+            except MediaStreamError:
+                return
+            if track.kind == 'video':
+                self.frames.append(time.perf_counter())
+
+    def start_speaking(self, text, interval_s):
+        async def speak():
+            while True:
+                try:
+                    await self.http.post(f'{self.url}/human', json={
+                        "type": "echo", "text": text, "interrupt": False, "sessionid": self.sessionid,
+                    })
+                except aiohttp.ClientError:
+                    pass
+                await asyncio.sleep(interval_s)
+        self.tasks.append(asyncio.ensure_future(speak()))
+
+    def fps(self, window_s):
+        now = time.perf_counter()
+        while self.frames and now - self.frames[0] > window_s:
+            self.frames.popleft()
+        return len(self.frames) / window_s
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await self.pc.close()
+
+
+async def health(http, url):
+    try:
+        async with http.get(f'{url}/health') as resp:
+            return (await resp.json()).get('capacity')
+    except (aiohttp.ClientError, ValueError):
+        return None
+
+
+async def run(args):
+    connector = aiohttp.TCPConnector(ssl=False if args.insecure else ssl.create_default_context())
+    sessions = []
+    rows = []
+    knee = None
+    stop_reason = 'max_sessions'
+    min_fps_allowed = args.video_fps * args.min_fps_ratio
+    window_s = args.step_s / 2
+
+    async with aiohttp.ClientSession(connector=connector) as http:
+        try:
+            for n in range(1, args.max_sessions + 1):
+                session = SimSession(http, args.url)
+                rejected = await session.connect()
+                if rejected is not None:
+                    await session.close()
+                    stop_reason = f'rejected at {n} sessions: {rejected}'
+                    break
+                session.start_speaking(args.text, args.speak_interval_s)
+                sessions.append(session)
+
+                # 前半步让新会话建连、收敛，后半步统计帧率
+                await asyncio.sleep(args.step_s)
+                fps = [s.fps(window_s) for s in sessions]
+                row = {
+                    "sessions": n,
+                    "min_fps": round(min(fps), 1),
+                    "avg_fps": round(sum(fps) / len(fps), 1),
+                    "capacity": await health(http, args.url),
+                }
+                rows.append(row)
+                cap = row["capacity"] or {}
+                print(f"sessions={n:3d} min_fps={row['min_fps']:5.1f} avg_fps={row['avg_fps']:5.1f} "
+                      f"capacity={cap.get('capacity')} bottleneck={cap.get('bottleneck')} "
+                      f"peak_load={cap.get('peak_load')}", flush=True)
+                if row["min_fps"] < min_fps_allowed:
+                    knee = n - 1
+                    stop_reason = f'min fps {row["min_fps"]} < {min_fps_allowed:.1f} at {n} sessions'
+                    break
+        finally:
+            await asyncio.gather(*(s.close() for s in sessions), return_exceptions=True)
+
+    if knee is None and rows:
+        knee = rows[-1]["sessions"]
+    print(f"knee: {knee} sessions ({stop_reason})")
+    report = {"knee": knee, "stop_reason": stop_reason, "args": vars(args), "steps": rows}
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"report written to {args.output}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8010')
+    parser.add_argument('--max_sessions', type=int, default=8)
+    parser.add_argument('--step_s', type=float, default=20)
+    parser.add_argument('--video_fps', type=float, default=25)
+    parser.add_argument('--min_fps_ratio', type=float, default=0.9)
+    parser.add_argument('--text', default='你好，我是数字人，这是一段用于压测的测试语音。')
+    parser.add_argument('--speak_interval_s', type=float, default=6)
+    parser.add_argument('--insecure', action='store_true', help='https 自签名证书时跳过校验')
+    parser.add_argument('--output', default='')
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""会话回收浸泡测试：反复打开 / 关闭大量会话，检查进程 RSS 和线程数保持平稳
+
+每个会话是一个 aiortc 客户端：/offer 建连，/human type=echo 说一句话，保持 --hold_s 秒后关闭连接，
+同时进行 --concurrency 个。每完成 --checkpoint 个会话，等服务端回收完所有会话（/health lifecycle 中 sessions、closing 均为 0）
+后记录 lifecycle 中的 rss_mb / threads。以 --warmup 个会话之后的第一个检查点为基线，
+结束时 RSS 增长超过 --rss_tolerance_mb 或线程数增长超过 --thread_tolerance 判为泄漏，以非零状态退出。
+
+--synthetic：不需要模型和外部服务，在本进程内启动服务端（create_app），avatar 换成一个
+轻量的合成实现（真实的 BaseAvatar / HumanPlayer / 帧处理线程 / mp.Queue，推理换成纯色帧），
+TTS 使用 mock 引擎，用于在 CI 上回归会话回收逻辑。
+
+用法：
+    python scripts/soak_sessions.py --synthetic --sessions 2000 --concurrency 8
+    python scripts/soak_sessions.py --url http://127.0.0.1:8010 --sessions 1000
+"""
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import asyncio
+import json
+import queue
+import time
+from threading import Event, Thread
+
+import aiohttp
+import numpy as np
+from aiohttp import web
+from aiortc import RTCPeerConnection, RTCSessionDescription
+from aiortc.mediastreams import MediaStreamError
+
+
+# ---------- 合成 avatar（--synthetic） ----------
+
+def build_synthetic_server(args):
+    import importlib
+
+    import torch.multiprocessing as mp
+
+    from src.avatars.audio_stream_handler import BaseAudioStreamHandler
+    from src.avatars.base import BaseAvatar, wake_queue
+    from src.config.schema import Config
+    from src.server.server import create_app
+    from src.server.session_pool import SessionPool
+    from src.server.state import state
+
+    face = np.full((64, 64, 3), 128, dtype=np.uint8)
+
+    class SyntheticAudioStreamHandler(BaseAudioStreamHandler):
+        def extract_features(self, inputs):
+            return np.zeros((self.batch_size, 1), dtype=np.float32)
+
+    def inference(quit_event, batch_size, feat_queue, audio_out_queue, res_frame_queue):
+        index = 0
+        while not quit_event.is_set():
+            try:
+                feat = feat_queue.get(block=True, timeout=1)
+            except queue.Empty:
+                continue
+            if feat is None:
+                continue
+            for _ in range(batch_size):
+                audio_frames = [audio_out_queue.get(), audio_out_queue.get()]
+                res_frame_queue.put((face, index % 2, audio_frames))
+                index += 1
+
+    class SyntheticAvatar(BaseAvatar):
+        def __init__(self, config, model, avatar):
+            super().__init__(config)
+            self.batch_size = config.model.batch_size
+            self.res_frame_queue = mp.Queue(self.batch_size * 2)
+            self.frame_list_cycle = [face, face]
+            self.audio_stream = SyntheticAudioStreamHandler(config, self)
+            self.audio_stream.warm_up()
+
+        def paste_back_frame(self, pred_frame, idx, combine_frame):
+            # 合成帧与背景相同，不需要贴回
+            return combine_frame
+
+        def render(self, quit_event, loop=None, audio_track=None, video_track=None):
+            self.init_customindex()
+            self.tts.render(quit_event)
+            infer_quit_event = Event()
+            infer_thread = Thread(target=inference, args=(infer_quit_event, self.batch_size, self.audio_stream.feat_queue,
+                                                          self.audio_stream.output_queue, self.res_frame_queue))
+            infer_thread.start()
+            process_quit_event = Event()
+            process_thread = Thread(target=self.process_frames, args=(process_quit_event, loop, audio_track, video_track))
+            process_thread.start()
+            while not quit_event.is_set():
+                self.audio_stream.run_step()
+                self.pacer.pace(video_track, self.batch_size)
+            infer_quit_event.set()
+            wake_queue(self.audio_stream.feat_queue)
+            infer_thread.join()
+            process_quit_event.set()
+            wake_queue(self.res_frame_queue)
+            process_thread.join()
+
+    def create_synthetic_avatar(config, model, avatar, sessionid):
+        from copy import deepcopy
+        session_config = deepcopy(config)
+        session_config.sessionid = sessionid
+        return SyntheticAvatar(session_config, model, avatar)
+
+    config = Config()
+    config.model.batch_size = 4
+    config.tts.type = 'mock'
+    config.tts.mock = {"first_byte_ms": 20, "chunk_ms": 100, "rtf": 0.1, "chars_per_second": 8}
+    config.tts.cache_mb = 0
+    config.app.session_pool = args.pool
+    config.customopt = []
+    state.config = config
+    for module in ('src.server.routes.webrtc', 'src.server.session_pool'):
+        importlib.import_module(module).create_avatar = create_synthetic_avatar
+    state.session_pool = SessionPool(config, None, None)
+    state.session_pool.start()
+    state.server_ready = True
+    return create_app()
+
+
+# ---------- 客户端 ----------
+
+async def run_session(http, url, args):
+    pc = RTCPeerConnection()
+    consumers = []
+    connected = asyncio.Event()
+
+    @pc.on('connectionstatechange')
+    def on_state():
+        if pc.connectionState == 'connected':
+            connected.set()
+
+    @pc.on('track')
+    def on_track(track):
+        async def consume():
+            while True:
+                try:
+                    await track.recv()
+                except MediaStreamError:
+                    return
+        consumers.append(asyncio.ensure_future(consume()))
+
+    try:
+        pc.addTransceiver('audio', direction='recvonly')
+        pc.addTransceiver('video', direction='recvonly')
+        await pc.setLocalDescription(await pc.createOffer())
+        offer = {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
+        async with http.post(f'{url}/offer', json=offer) as resp:
+            if resp.status != 200:
+                return f'offer {resp.status}'
+            answer = await resp.json()
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=answer['sdp'], type=answer['type']))
+        await asyncio.wait_for(connected.wait(), 15)
+        await http.post(f'{url}/human', json={
+            "type": "echo", "text": args.text, "interrupt": False, "sessionid": answer['sessionid'],
+        })
+        await asyncio.sleep(args.hold_s)
+        return None
+    except asyncio.TimeoutError:
+        return 'connect timeout'
+    finally:
+        for task in consumers:
+            task.cancel()
+        await pc.close()
+
+
+async def lifecycle_stats(http, url):
+    async with http.get(f'{url}/health') as resp:
+        return (await resp.json())['lifecycle']
+
+
+async def wait_idle(http, url, timeout_s=60):
+    """等待服务端回收完所有会话"""
+    deadline = time.monotonic() + timeout_s
+    while True:
+        stats = await lifecycle_stats(http, url)
+        if stats['sessions'] + stats['closing'] == 0 or time.monotonic() > deadline:
+            return stats
+        await asyncio.sleep(0.5)
+
+
+async def run(args):
+    runner = None
+    url = args.url
+    if args.synthetic:
+        runner = web.AppRunner(build_synthetic_server(args))
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        url = f'http://127.0.0.1:{site._server.sockets[0].getsockname()[1]}'
+
+    checkpoints = []
+    errors = {}
+    done = 0
+    start = time.perf_counter()
+    async with aiohttp.ClientSession(connector=aiohttp.TCPConnector(ssl=False)) as http:
+        while done < args.sessions:
+            batch = min(args.checkpoint, args.sessions - done)
+            sem = asyncio.Semaphore(args.concurrency)
+
+            async def one():
+                async with sem:
+                    return await run_session(http, url, args)
+
+            for error in await asyncio.gather(*(one() for _ in range(batch)), return_exceptions=True):
+                if error is not None:
+                    key = repr(error) if isinstance(error, BaseException) else error
+                    errors[key] = errors.get(key, 0) + 1
+            done += batch
+            stats = await wait_idle(http, url)
+            # stats 里的 sessions 是服务端仍存活的会话数，已完成的会话数另记为 done
+            row = {**stats, "done": done, "elapsed_s": round(time.perf_counter() - start, 1)}
+            checkpoints.append(row)
+            print(f"sessions={done:5d} rss={stats['rss_mb']:8.1f}MB threads={stats['threads']:3d} "
+                  f"live={stats['sessions']} recycled={stats['recycled']} stuck={stats['stuck_threads']} "
+                  f"close_p95={stats['close_ms_p95']}ms", flush=True)
+
+    if runner is not None:
+        await runner.cleanup()
+
+    base = next((c for c in checkpoints if c['done'] >= args.warmup), checkpoints[0])
+    last = checkpoints[-1]
+    rss_growth = last['rss_mb'] - base['rss_mb']
+    thread_growth = last['threads'] - base['threads']
+    ok = (rss_growth <= args.rss_tolerance_mb and thread_growth <= args.thread_tolerance
+          and last['sessions'] + last['closing'] == 0 and last['stuck_threads'] == 0)
+    print(f"rss growth {rss_growth:+.1f}MB (<= {args.rss_tolerance_mb}), "
+          f"thread growth {thread_growth:+d} (<= {args.thread_tolerance}), errors {errors}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"ok": ok, "errors": errors, "checkpoints": checkpoints, "args": vars(args)},
+                      f, ensure_ascii=False, indent=2)
+    print('ok' if ok else 'FAIL')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', default='http://127.0.0.1:8010')
+    parser.add_argument('--synthetic', action='store_true', help='进程内启动服务端，使用合成 avatar 和 mock TTS')
+    parser.add_argument('--pool', type=int, default=0, help='--synthetic 时的 session_pool 大小')
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--hold_s', type=float, default=1.0)
+    parser.add_argument('--checkpoint', type=int, default=100)
+    parser.add_argument('--warmup', type=int, default=200)
+    parser.add_argument('--rss_tolerance_mb', type=float, default=64)
+    parser.add_argument('--thread_tolerance', type=int, default=2)
+    parser.add_argument('--text', default='浸泡测试')
+    parser.add_argument('--output', default='')
+    ok = asyncio.run(run(parser.parse_args()))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,13 @@ from __future__ import annotations
 
 import os
 import tempfile
+import time
 import soundfile as sf
 from io import BytesIO
 from typing import Dict, Any
 from abc import ABC, abstractmethod
 
+from src.utils import metrics
 from src.utils.logging import logger
 
 
@@ -77,8 +79,10 @@ class BaseASR(ABC):
         # 统一转成临时文件，方便不同引擎复用文件接口
         temp_audio_path = None
         try:
+            start = time.perf_counter()
             temp_audio_path = self._save_temp_audio(audio_bytes)
             result = self._transcribe(temp_audio_path)
+            metrics.ASR_TRANSCRIBE.labels(self.__class__.__name__).observe(time.perf_counter() - start)
             
             logger.info(f'[ASR] 识别结果: {result.get("text", "")}')
             return result
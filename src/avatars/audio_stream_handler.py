@@ -6,14 +6,15 @@ import queue
 from queue import Queue
 import torch.multiprocessing as mp
 
-from src.avatars.base import BaseAvatar
+from src.avatars.base import BaseAvatar, drain_queue, close_queue
+from src.utils import metrics
 
 
 class BaseAudioStreamHandler:
     """音频流处理器基类
     
     负责音频缓冲管理、音频帧处理和特征提取的基础框架。
-    各 Avatar 模型应继承此类并实现 run_step() 方法。
+    各 Avatar 模型应继承此类并实现 extract_features()，或直接重写 run_step()。
     """
     def __init__(self, config, parent: BaseAvatar = None):
         self.config = config
@@ -24,28 +25,57 @@ class BaseAudioStreamHandler:
         self.sample_rate = 16000
         self.chunk = self.sample_rate // self.fps
         self.queue = Queue()
+        # 当前 TTS 打断代数，低于它的帧是打断前合成的，取出时直接丢弃
+        self.generation = 0
+        self.stale_frames = 0
         # 渲染侧消费的音频输出队列
         self.output_queue = mp.Queue()
 
         self.batch_size = config.model.batch_size
 
         self.frames = []
+        # 与 frames 一一对应的帧类型，0 为语音，用于静音快速路径
+        self.frame_types = []
+        # frames[0] 在整个音频流中的帧序号
+        self.frame_offset = 0
         self.stride_left_size = config.audio.l
         self.stride_right_size = config.audio.r
         #self.context_size = 10
         self.feat_queue = mp.Queue(2)
+        # 全静音窗口直接复用的特征，首次需要时计算一次
+        self._silence_feat = None
 
         #self.warm_up()
 
-    def flush_talk(self):
+    def flush_talk(self, generation=None):
+        if generation is not None:
+            self.generation = generation
         self.queue.queue.clear()
 
-    def put_audio_frame(self, audio_chunk, datainfo: dict):
-        self.queue.put((audio_chunk, datainfo))
+    def close(self):
+        """会话结束时关闭跨进程队列，结束其后台 feeder 线程"""
+        self.flush_talk()
+        for q in (self.output_queue, self.feat_queue):
+            drain_queue(q)
+            close_queue(q)
+        self.frames = []
+        self.frame_types = []
+
+    def put_audio_frame(self, audio_chunk, datainfo: dict, generation=None):
+        # generation 为 None 的帧（音频文件等）不参与打断过滤
+        self.queue.put((audio_chunk, datainfo, generation))
+
+    def _get_current_frame(self):
+        # 清空队列之后仍可能有合成线程写入旧代数的帧，这里跳过
+        while True:
+            frame, eventpoint, generation = self.queue.get(block=True, timeout=0.01)
+            if generation is None or generation >= self.generation:
+                return frame, eventpoint
+            self.stale_frames += 1
 
     def get_audio_frame(self):        
         try:
-            frame, eventpoint = self.queue.get(block=True, timeout=0.01)
+            frame, eventpoint = self._get_current_frame()
             type = 0
             #print(f'[INFO] get frame {frame.shape}')
         except queue.Empty:
@@ -66,13 +96,57 @@ class BaseAudioStreamHandler:
         for _ in range(self.stride_left_size + self.stride_right_size):
             audio_frame, type, eventpoint = self.get_audio_frame()
             self.frames.append(audio_frame)
+            self.frame_types.append(type)
             self.output_queue.put((audio_frame, type, eventpoint))
         for _ in range(self.stride_left_size):
             self.output_queue.get()
 
+    def extract_features(self, inputs: np.ndarray):
+        """从拼接后的音频窗口 [N * chunk] 提取一个 batch 的特征，子类实现"""
+        raise NotImplementedError
+
+    def is_silent_window(self) -> bool:
+        """本 batch 对应的中间帧是否全部不是语音
+
+        output_queue 比 frames 滞后 stride_right_size 帧，inference 取到的 batch
+        正是 frames[l : l + 2B]。这些帧里没有语音时 inference 不会使用特征，
+        左右 stride 只作为上下文，不影响判断。
+        """
+        left = self.stride_left_size
+        return all(t != 0 for t in self.frame_types[left:left + self.batch_size * 2])
+
+    def silence_feature(self):
+        if self._silence_feat is None:
+            window = len(self.frames) * self.chunk
+            self._silence_feat = self.extract_features(np.zeros(window, dtype=np.float32))
+        return self._silence_feat
+
     def run_step(self):
-        """执行一步音频处理，子类需要实现此方法"""
-        pass
+        """执行一步音频特征提取，全静音时跳过特征提取"""
+        for _ in range(self.batch_size * 2):
+            frame, type, eventpoint = self.get_audio_frame()
+            self.frames.append(frame)
+            self.frame_types.append(type)
+            # put to output
+            self.output_queue.put((frame, type, eventpoint))
+        # context not enough, do not run network.
+        if len(self.frames) <= self.stride_left_size + self.stride_right_size:
+            return
+
+        if self.is_silent_window():
+            self.feat_queue.put(self.silence_feature())
+        else:
+            t = time.perf_counter()
+            inputs = np.concatenate(self.frames)  # [N * chunk]
+            feats = self.extract_features(inputs)
+            metrics.AUDIO_FEATURE.labels(*metrics.session_labels(self.parent)).observe(time.perf_counter() - t)
+            self.feat_queue.put(feats)
+
+        # discard the old part to save memory
+        context = self.stride_left_size + self.stride_right_size
+        self.frame_offset += len(self.frames) - context
+        self.frames = self.frames[-context:]
+        self.frame_types = self.frame_types[-context:]
 
     def get_next_feat(self, block, timeout):        
         return self.feat_queue.get(block, timeout)
@@ -0,0 +1,169 @@
+"""预解码的 avatar 帧存储
+
+把 avatar 目录下的 full_imgs / face_imgs / mask 图片序列以及 coords.pkl /
+mask_coords.pkl 打包成一个连续的 uint8 文件（带索引头），加载时只读 mmap，
+启动几乎不耗时，帧数据由操作系统按需换入，并在多个进程之间共享同一份页缓存。
+
+文件布局::
+
+    [magic 8B][header_len uint64][header json][padding] [frame/blob 数据 ...]
+
+用法（离线编译）::
+
+    python -m src.avatars.avatar_store --avatar_id wav2lip_avatar1
+"""
+import argparse
+import glob
+import json
+import os
+import pickle
+import shutil
+import struct
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from src.utils.logging import logger
+
+BUNDLE_NAME = 'avatar.bundle'
+_MAGIC = b'LTSAVTR1'
+_ALIGN = 64
+_DATA_ALIGN = 4096
+
+# 需要打包的图片目录与序列化文件
+FRAME_DIRS = ('full_imgs', 'face_imgs', 'mask')
+BLOB_FILES = ('coords.pkl', 'mask_coords.pkl')
+
+
+def _align(n: int, align: int) -> int:
+    return (n + align - 1) // align * align
+
+
+def _list_imgs(path: str):
+    img_list = glob.glob(os.path.join(path, '*.[jpJP][pnPN]*[gG]'))
+    return sorted(img_list, key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
+
+
+class FrameStore:
+    """只读帧序列，按下标返回 mmap 上的 ndarray 视图，可直接替代 read_imgs 返回的 list"""
+
+    def __init__(self, data: np.ndarray, index):
+        self._data = data
+        self._index = index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        offset, shape = self._index[idx]
+        size = int(np.prod(shape))
+        return self._data[offset:offset + size].reshape(shape)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class AvatarBundle:
+    """已编译的 avatar 包，只读映射"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic = f.read(len(_MAGIC))
+            if magic != _MAGIC:
+                raise ValueError(f'not an avatar bundle: {path}')
+            header_len, = struct.unpack('<Q', f.read(8))
+            self.header = json.loads(f.read(header_len).decode('utf-8'))
+        # np.asarray 去掉 memmap 子类，得到普通的只读 ndarray 视图
+        self._data = np.asarray(np.memmap(path, dtype=np.uint8, mode='r', offset=self.header['data_offset']))
+
+    def has_frames(self, name: str) -> bool:
+        return name in self.header['frames']
+
+    def frames(self, name: str) -> FrameStore:
+        index = [(offset, tuple(shape)) for offset, shape in self.header['frames'][name]]
+        return FrameStore(self._data, index)
+
+    def has_blob(self, name: str) -> bool:
+        return name in self.header['blobs']
+
+    def load_pickle(self, name: str):
+        offset, size = self.header['blobs'][name]
+        return pickle.loads(self._data[offset:offset + size].tobytes())
+
+
+def open_avatar_bundle(avatar_path: str):
+    """avatar 目录下存在已编译的包时返回 AvatarBundle，否则返回 None"""
+    bundle_path = os.path.join(avatar_path, BUNDLE_NAME)
+    if not os.path.exists(bundle_path):
+        return None
+    logger.info(f'mapping avatar bundle {bundle_path}')
+    return AvatarBundle(bundle_path)
+
+
+def compile_avatar(avatar_path: str, output_path: str = None) -> str:
+    """把 avatar 目录中的图片序列和坐标文件打包成单个 bundle 文件"""
+    output_path = output_path or os.path.join(avatar_path, BUNDLE_NAME)
+    data_path = output_path + '.data'
+
+    # 数据区先流式写入临时文件，避免整段素材常驻内存
+    frames = {}
+    blobs = {}
+    offset = 0
+    with open(data_path, 'wb') as data_file:
+        def write(buf: bytes):
+            nonlocal offset
+            data_file.write(buf)
+            padded = _align(offset + len(buf), _ALIGN)
+            data_file.write(b'\0' * (padded - offset - len(buf)))
+            offset = padded
+
+        for name in FRAME_DIRS:
+            img_list = _list_imgs(os.path.join(avatar_path, name))
+            if not img_list:
+                continue
+            index = []
+            for img_path in tqdm(img_list, desc=name):
+                frame = cv2.imread(img_path)
+                index.append([offset, list(frame.shape)])
+                write(np.ascontiguousarray(frame).tobytes())
+            frames[name] = index
+        for name in BLOB_FILES:
+            blob_path = os.path.join(avatar_path, name)
+            if not os.path.exists(blob_path):
+                continue
+            with open(blob_path, 'rb') as f:
+                data = f.read()
+            blobs[name] = [offset, len(data)]
+            write(data)
+
+    header = {'version': 1, 'frames': frames, 'blobs': blobs, 'data_size': offset, 'data_offset': 0}
+    # data_offset 本身也写在头里，预留足够位数后按页对齐
+    header_len = len(json.dumps(header).encode('utf-8')) + 32
+    header['data_offset'] = _align(len(_MAGIC) + 8 + header_len, _DATA_ALIGN)
+    header_bytes = json.dumps(header).encode('utf-8')
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f, open(data_path, 'rb') as data_file:
+        f.write(_MAGIC)
+        f.write(struct.pack('<Q', len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\0' * (header['data_offset'] - f.tell()))
+        shutil.copyfileobj(data_file, f, 16 * 1024 * 1024)
+    os.remove(data_path)
+    os.replace(tmp_path, output_path)
+    logger.info(f'avatar bundle written: {output_path}, {offset / 1024 ** 2:.1f}MB')
+    return output_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compile avatar images into a memory-mapped bundle')
+    parser.add_argument('--avatar_id', type=str, required=True)
+    parser.add_argument('--avatar_root', type=str, default='./data/avatars')
+    args = parser.parse_args()
+    path = compile_avatar(os.path.join(args.avatar_root, args.avatar_id))
+    print(f'bundle written to {path}')
@@ -19,13 +19,15 @@ from threading import Thread, Event
 from io import BytesIO
 import soundfile as sf
 
-import asyncio
-from av import AudioFrame, VideoFrame
+from av import AudioFrame
 
 import av
 from fractions import Fraction
 
 from src.tts.factory import create_tts_engine
+from src.avatars.output_frame import output_frame
+from src.avatars.pacing import PacingController
+from src.utils import metrics
 from src.utils.logging import logger
 
 from tqdm import tqdm
@@ -54,6 +56,38 @@ def play_audio(quit_event,queue):
         stream.write(queue.get(block=True))
     stream.close()
 
+def drain_queue(q):
+    """取走队列中残留的项（queue.Queue / mp.Queue 通用）"""
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+
+def wake_queue(q):
+    """退出时放入 None 唤醒阻塞在 get 上的消费线程；队列已满说明消费方没有阻塞，直接忽略"""
+    try:
+        q.put_nowait(None)
+    except queue.Full:
+        pass
+
+
+def queue_size(q):
+    """队列长度；mp.Queue 在 macOS 上不支持 qsize，返回 0"""
+    try:
+        return q.qsize()
+    except NotImplementedError:
+        return 0
+
+
+def close_queue(q):
+    """mp.Queue 关闭后 feeder 线程退出；不等待未写完的数据，避免对端已停止时阻塞"""
+    if hasattr(q, 'cancel_join_thread'):
+        q.cancel_join_thread()
+        q.close()
+
+
 class BaseAvatar:
     def __init__(self, config):
         self.config = config
@@ -73,6 +107,12 @@ class BaseAvatar:
         self.width = self.height = 0
         self.current_record_file = None  # 当前录制的文件名
 
+        # WebRTC 输出缓冲的节奏控制
+        self.pacer = PacingController(config)
+        # 一批音频统一转换 int16 用的预分配缓冲（按需扩容）
+        self._pcm_float = np.empty((2 * config.model.batch_size, self.chunk), dtype=np.float32)
+        self._pcm_buffer = np.empty_like(self._pcm_float, dtype=np.int16)
+
         # 自定义音视频循环播放相关
         self.curr_state=0
         self.custom_img_cycle = {}
@@ -86,9 +126,9 @@ class BaseAvatar:
         # 文本消息交给 TTS 处理
         self.tts.put_msg_txt(msg,datainfo)
     
-    def put_audio_frame(self,audio_chunk,datainfo:dict={}): #16khz 20ms pcm
-        # 直接把音频块推给音频流（用于 WebRTC / 录制）
-        self.audio_stream.put_audio_frame(audio_chunk,datainfo)
+    def put_audio_frame(self,audio_chunk,datainfo:dict={},generation=None): #16khz 20ms pcm
+        # 直接把音频块推给音频流（用于 WebRTC / 录制）；generation 为 TTS 打断代数，旧代数的帧会被丢弃
+        self.audio_stream.put_audio_frame(audio_chunk,datainfo,generation)
 
     def put_audio_file(self,filebyte,datainfo:dict={}): 
         # 文件音频按 chunk 切片后送入音频流
@@ -117,9 +157,45 @@ class BaseAvatar:
         return stream
 
     def flush_talk(self):
-        # 清空 TTS 和音频流队列，快速打断当前发声
-        self.tts.flush_talk()
-        self.audio_stream.flush_talk()
+        # 取消进行中的 TTS 合成并清空音频流队列，快速打断当前发声
+        generation = self.tts.flush_talk()
+        self.audio_stream.flush_talk(generation)
+
+    def bind_session(self, sessionid):
+        """换绑 sessionid，会话池取出时在事件循环里调用，不做阻塞操作"""
+        self.sessionid = self.config.sessionid = sessionid
+
+    def reset_session(self, sessionid=0):
+        """会话池复用：把播放状态恢复到初始值（不重新加载模型和素材）。
+        要等上一个会话的 TTS 线程退出，会阻塞，在放回池中时（线程池里）调用"""
+        self.bind_session(sessionid)
+        # 上一个会话的 TTS 线程随渲染一起退出，这里等它结束
+        self.tts.stop()
+        self.flush_talk()
+        self.init_customindex()
+        self.speaking = False
+        self.pacer = PacingController(self.config)
+        # 上一个会话停止渲染时残留在队列里的帧
+        for q in (getattr(self, 'res_frame_queue', None), self.audio_stream.output_queue, self.audio_stream.feat_queue):
+            if q is not None:
+                drain_queue(q)
+
+    def close(self):
+        """会话结束时释放资源；调用前渲染线程必须已经停止（HumanPlayer 的轨道已 stop）。
+        返回 TTS 线程是否已退出"""
+        if self.recording:
+            # 合成最终的录制文件并关闭 ffmpeg 管道
+            self.stop_recording()
+        stopped = self.tts.close()
+        self.audio_stream.close()
+        res_frame_queue = getattr(self, 'res_frame_queue', None)
+        if res_frame_queue is not None:
+            drain_queue(res_frame_queue)
+            close_queue(res_frame_queue)
+        self.custom_img_cycle.clear()
+        self.custom_audio_cycle.clear()
+        self.custom_opt.clear()
+        return stopped
 
     def is_speaking(self)->bool:
         return self.speaking
@@ -186,81 +262,132 @@ class BaseAvatar:
             _last_silent_frame = None  # 静音帧缓存
             _last_speaking_frame = None  # 说话帧缓存
         
+        batch_size = self.config.model.batch_size
+        labels = metrics.session_labels(self)
+        paste_back = metrics.PASTE_BACK.labels(*labels)
+        queue_depth = metrics.FRAME_QUEUE_DEPTH.labels(*labels)
         while not quit_event.is_set():
             try:
-                res_frame,idx,audio_frames = self.res_frame_queue.get(block=True, timeout=1)
+                item = self.res_frame_queue.get(block=True, timeout=1)
             except queue.Empty:
                 continue
+            if item is None:
+                # render 退出时的唤醒
+                continue
+            batch = [item]
+            # 取走已就绪的整批帧，一批只做一次跨线程推送
+            while len(batch) < batch_size:
+                try:
+                    item = self.res_frame_queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    break
+                batch.append(item)
+            queue_depth.set(len(batch) + queue_size(self.res_frame_queue))
+
+            video_frames = []
+            batch_audio = []
+            for res_frame,idx,audio_frames in batch:
+                new_frame = frame_view = None
+                # 输出缓冲积压时丢弃纯静音帧（音视频一起丢）
+                if self.pacer.should_drop(video_track, audio_frames[0][1]==1 and audio_frames[1][1]==1):
+                    continue
             
-            if enable_transition:
-                # 检测状态变化
-                current_speaking = not (audio_frames[0][1]!=0 and audio_frames[1][1]!=0)
-                if current_speaking != _last_speaking:
-                    logger.info(f"状态切换：{'说话' if _last_speaking else '静音'} → {'说话' if current_speaking else '静音'}")
-                    _transition_start = time.time()
-                _last_speaking = current_speaking
-
-            if audio_frames[0][1]!=0 and audio_frames[1][1]!=0:  # 静音时使用静态帧或自定义视频
-                self.speaking = False
-                audiotype = audio_frames[0][1]
-                if self.custom_index.get(audiotype) is not None: #有自定义视频
-                    mirindex = self.mirror_index(len(self.custom_img_cycle[audiotype]),self.custom_index[audiotype])
-                    target_frame = self.custom_img_cycle[audiotype][mirindex]
-                    self.custom_index[audiotype] += 1
-                else:
-                    target_frame = self.frame_list_cycle[idx]
-                
                 if enable_transition:
-                    # 说话→静音过渡
-                    if time.time() - _transition_start < _transition_duration and _last_speaking_frame is not None:
-                        alpha = min(1.0, (time.time() - _transition_start) / _transition_duration)
-                        combine_frame = cv2.addWeighted(_last_speaking_frame, 1-alpha, target_frame, alpha, 0)
+                    # 检测状态变化
+                    current_speaking = not (audio_frames[0][1]!=0 and audio_frames[1][1]!=0)
+                    if current_speaking != _last_speaking:
+                        logger.info(f"状态切换：{'说话' if _last_speaking else '静音'} → {'说话' if current_speaking else '静音'}")
+                        _transition_start = time.time()
+                    _last_speaking = current_speaking
+
+                if audio_frames[0][1]!=0 and audio_frames[1][1]!=0:  # 静音时使用静态帧或自定义视频
+                    self.speaking = False
+                    audiotype = audio_frames[0][1]
+                    if self.custom_index.get(audiotype) is not None: #有自定义视频
+                        mirindex = self.mirror_index(len(self.custom_img_cycle[audiotype]),self.custom_index[audiotype])
+                        target_frame = self.custom_img_cycle[audiotype][mirindex]
+                        self.custom_index[audiotype] += 1
+                    else:
+                        target_frame = self.frame_list_cycle[idx]
+                
+                    if enable_transition:
+                        # 说话→静音过渡
+                        if time.time() - _transition_start < _transition_duration and _last_speaking_frame is not None:
+                            alpha = min(1.0, (time.time() - _transition_start) / _transition_duration)
+                            combine_frame = cv2.addWeighted(_last_speaking_frame, 1-alpha, target_frame, alpha, 0)
+                        else:
+                            combine_frame = target_frame
+                        # 缓存静音帧
+                        _last_silent_frame = combine_frame.copy()
                     else:
                         combine_frame = target_frame
-                    # 缓存静音帧
-                    _last_silent_frame = combine_frame.copy()
                 else:
-                    combine_frame = target_frame
-            else:
-                self.speaking = True
-                try:
-                    current_frame = self.paste_back_frame(res_frame,idx)
-                except Exception as e:
-                    logger.warning(f"paste_back_frame error: {e}")
-                    continue
-                if enable_transition:
-                    # 静音→说话过渡
-                    if time.time() - _transition_start < _transition_duration and _last_silent_frame is not None:
-                        alpha = min(1.0, (time.time() - _transition_start) / _transition_duration)
-                        combine_frame = cv2.addWeighted(_last_silent_frame, 1-alpha, current_frame, alpha, 0)
+                    self.speaking = True
+                    try:
+                        t = time.perf_counter()
+                        # 背景拷进 VideoFrame 后只在其像素平面上贴回人脸区域
+                        new_frame, frame_view = output_frame(self.frame_list_cycle[idx])
+                        current_frame = self.paste_back_frame(res_frame,idx,frame_view)
+                        paste_back.observe(time.perf_counter() - t)
+                    except Exception as e:
+                        logger.warning(f"paste_back_frame error: {e}")
+                        continue
+                    if enable_transition:
+                        # 静音→说话过渡
+                        if time.time() - _transition_start < _transition_duration and _last_silent_frame is not None:
+                            alpha = min(1.0, (time.time() - _transition_start) / _transition_duration)
+                            combine_frame = cv2.addWeighted(_last_silent_frame, 1-alpha, current_frame, alpha, 0)
+                        else:
+                            combine_frame = current_frame
+                        # 缓存说话帧
+                        _last_speaking_frame = combine_frame.copy()
                     else:
                         combine_frame = current_frame
-                    # 缓存说话帧
-                    _last_speaking_frame = combine_frame.copy()
-                else:
-                    combine_frame = current_frame
 
-            cv2.putText(combine_frame, "Linly-Talker-Stream", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.3, (128,128,128), 1)
+                if combine_frame is not frame_view:
+                    # 静音帧 / 过渡帧：背景可能是只读 mmap，水印写在 VideoFrame 的平面上
+                    new_frame, frame_view = output_frame(combine_frame)
+                cv2.putText(frame_view, "Linly-Talker-Stream", (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.3, (128,128,128), 1)
            
-            image = combine_frame
-            new_frame = VideoFrame.from_ndarray(image, format="bgr24")
-            # 子线程推送到 WebRTC 队列
-            asyncio.run_coroutine_threadsafe(video_track._queue.put((new_frame,None)), loop)
-            self.record_video_data(combine_frame)
-
-            for audio_frame in audio_frames:
-                frame,type,eventpoint = audio_frame
-                frame = (frame * 32767).astype(np.int16)
-
-                new_frame = AudioFrame(format='s16', layout='mono', samples=frame.shape[0])
-                new_frame.planes[0].update(frame.tobytes())
-                new_frame.sample_rate=16000
-                # 子线程推送到 WebRTC 队列
-                asyncio.run_coroutine_threadsafe(audio_track._queue.put((new_frame,eventpoint)), loop)
-                self.record_audio_data(frame)
+                video_frames.append((new_frame,None))
+                self.record_video_data(frame_view)
+                batch_audio.extend(audio_frames)
+
+            # 子线程直接写入 WebRTC 帧缓冲
+            video_track._queue.put_many(video_frames)
+            self.push_audio_frames(audio_track, batch_audio)
         logger.info('basereal process_frames thread stop') 
 
 
+    def push_audio_frames(self,audio_track,audio_frames):
+        """一批 (frame,type,eventpoint) 统一转 int16 后一次性写入 WebRTC 音频缓冲"""
+        n = len(audio_frames)
+        if n == 0:
+            return
+        if self._pcm_buffer.shape[0] < n:
+            self._pcm_float = np.empty((n, self.chunk), dtype=np.float32)
+            self._pcm_buffer = np.empty_like(self._pcm_float, dtype=np.int16)
+        for i,(frame,_,_) in enumerate(audio_frames):
+            if frame.shape[0] == self.chunk:
+                self._pcm_float[i] = frame
+            else:
+                # 自定义动作音频的最后一片不足 20ms，补零保持帧长和时间戳一致
+                m = min(frame.shape[0], self.chunk)
+                self._pcm_float[i, :m] = frame[:m]
+                self._pcm_float[i, m:] = 0
+        pcm = self._pcm_buffer[:n]
+        np.multiply(self._pcm_float[:n], 32767, out=pcm, casting='unsafe')
+        new_frames = []
+        for i,(_,_,eventpoint) in enumerate(audio_frames):
+            new_frame = AudioFrame(format='s16', layout='mono', samples=self.chunk)
+            new_frame.planes[0].update(pcm[i])
+            new_frame.sample_rate=16000
+            new_frames.append((new_frame,eventpoint))
+        audio_track._queue.put_many(new_frames)
+        self.record_audio_data(pcm)
+
     def start_recording(self):
         """开始录制视频"""
         logger.info(f'[录制] start_recording 被调用, sessionid={self.config.sessionid}')
@@ -10,8 +10,7 @@ import glob
 
 from .audio_stream_handler import ERNeRFAudioStreamHandler
 
-import asyncio
-from av import AudioFrame, VideoFrame
+from av import VideoFrame
 from src.avatars.base import BaseAvatar
 
 from .nerf_triplane.provider import NeRFDataset_Test
@@ -123,20 +122,10 @@ class ERNeRFAvatar(BaseAvatar):
         if self.config.model.ernerf.asr:
             data['auds'] = self.audio_stream.get_next_feat()
 
-        audiotype1 = 0
-        audiotype2 = 0
-        for i in range(2):
-            frame,type,eventpoint = self.audio_stream.get_audio_out()
-            if i==0:
-                audiotype1 = type
-            else:
-                audiotype2 = type
-            frame_int16 = (frame * 32767).astype(np.int16)
-            new_frame = AudioFrame(format='s16', layout='mono', samples=frame_int16.shape[0])
-            new_frame.planes[0].update(frame_int16.tobytes())
-            new_frame.sample_rate=16000
-            asyncio.run_coroutine_threadsafe(audio_track._queue.put((new_frame,eventpoint)), loop)
-            self.record_audio_data(frame_int16)
+        audio_frames = [self.audio_stream.get_audio_out() for _ in range(2)]
+        audiotype1 = audio_frames[0][1]
+        audiotype2 = audio_frames[1][1]
+        self.push_audio_frames(audio_track, audio_frames)
 
         if audiotype1 != 0 and audiotype2 != 0:
             self.speaking = False
@@ -149,14 +138,14 @@ class ERNeRFAvatar(BaseAvatar):
             image_rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
             self.custom_index[audiotype1] += 1
             new_frame = VideoFrame.from_ndarray(image_rgb, format="rgb24")
-            asyncio.run_coroutine_threadsafe(video_track._queue.put((new_frame, None)), loop)
+            video_track._queue.put((new_frame, None))
             self.record_video_data(image)
         else:
             outputs = self.trainer.test_gui_with_data(data, self.W, self.H)
             image = (outputs['image'] * 255).astype(np.uint8)
             if not self.config.model.ernerf.fullbody:
                 new_frame = VideoFrame.from_ndarray(image, format="rgb24")
-                asyncio.run_coroutine_threadsafe(video_track._queue.put((new_frame, None)), loop)
+                video_track._queue.put((new_frame, None))
                 image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
                 self.record_video_data(image_bgr)
             else:
@@ -166,7 +155,7 @@ class ERNeRFAvatar(BaseAvatar):
                 start_y = self.config.model.ernerf.fullbody_offset_y
                 image_fullbody_rgb[start_y:start_y+image.shape[0], start_x:start_x+image.shape[1]] = image
                 new_frame = VideoFrame.from_ndarray(image_fullbody_rgb, format="rgb24")
-                asyncio.run_coroutine_threadsafe(video_track._queue.put((new_frame, None)), loop)
+                video_track._queue.put((new_frame, None))
                 image_fullbody[start_y:start_y+image.shape[0], start_x:start_x+image.shape[1]] = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
                 self.record_video_data(image_fullbody)
 
@@ -192,8 +181,7 @@ class ERNeRFAvatar(BaseAvatar):
                 logger.info(f"------actual avg infer fps:{count/totaltime:.4f}")
                 count=0
                 totaltime=0
-            if video_track._queue.qsize() >= 5:
-                time.sleep(0.04 * video_track._queue.qsize() * 0.8)
+            self.pacer.pace(video_track, 1)
         logger.info('ERNeRFAvatar thread stop')
             
             
\ No newline at end of file
@@ -0,0 +1,188 @@
+"""流水线化的逐会话推理循环
+
+原来的 inference 循环严格串行：CPU 组 batch -> 前向 -> .cpu().numpy() -> 推帧，
+每一步都要等前一步结束。这里拆成三个阶段各自一个线程：
+
+    prefetch:  读取特征/音频帧，在 CPU 上准备第 k+1 批输入（CUDA 下放入锁页内存）
+    compute:   第 k 批前向（可经由 InferenceScheduler 跨会话合并）
+    download:  第 k-1 批在独立 copy stream 上异步拷回锁页内存，后处理后推入 res_frame_queue
+
+阶段之间用深度为 1 的队列衔接（双缓冲），保证输出顺序与输入一致。
+纯 CPU 环境下没有 stream / 锁页内存，退化为线程预取。
+"""
+import queue
+import time
+from queue import Queue
+from threading import Thread
+from typing import Callable
+
+import numpy as np
+import torch
+
+from src.avatars.base import wake_queue
+from src.utils.logging import logger
+
+use_cuda = torch.cuda.is_available()
+
+
+def mirror_index(size, index):
+    turn = index // size
+    res = index % size
+    if turn % 2 == 0:
+        return res
+    else:
+        return size - res - 1
+
+
+def to_pinned_tensor(array: np.ndarray) -> torch.Tensor:
+    """numpy -> torch，CUDA 可用时放入锁页内存，便于 non_blocking 上传"""
+    tensor = torch.from_numpy(np.ascontiguousarray(array))
+    if use_cuda:
+        tensor = tensor.pin_memory()
+    return tensor
+
+
+class _Downloader:
+    """把前向输出异步拷回主机并推入 res_frame_queue"""
+
+    def __init__(self, postprocess_fn: Callable):
+        self.postprocess_fn = postprocess_fn
+        self._host = None
+        self._copy_stream = torch.cuda.Stream() if use_cuda else None
+
+    def to_host(self, output, ready_event):
+        if not isinstance(output, torch.Tensor):
+            return output
+        if not output.is_cuda:
+            return output.numpy()
+        if self._host is None or self._host.shape != output.shape or self._host.dtype != output.dtype:
+            self._host = torch.empty(output.shape, dtype=output.dtype, pin_memory=True)
+        with torch.cuda.stream(self._copy_stream):
+            self._copy_stream.wait_event(ready_event)
+            # 告知缓存分配器该显存正被 copy stream 使用，避免提前复用
+            output.record_stream(self._copy_stream)
+            self._host.copy_(output, non_blocking=True)
+        self._copy_stream.synchronize()
+        return self._host.numpy()
+
+    def frames(self, output, ready_event):
+        return self.postprocess_fn(self.to_host(output, ready_event))
+
+
+def run_inference_pipeline(quit_event, batch_size, length, audio_feat_queue, audio_out_queue, res_frame_queue,
+                           prepare_fn: Callable, infer_fn: Callable, postprocess_fn: Callable, name: str = 'infer',
+                           forward_metric=None):
+    """流水线化的 inference 循环，替代各 avatar 里串行的实现
+
+    Args:
+        length: avatar 帧循环长度，用于镜像下标
+        prepare_fn: (feats, start_index) -> 模型输入 tuple，在预取线程中执行
+        infer_fn: (*inputs) -> 前向输出（GPU tensor / numpy）
+        postprocess_fn: 主机上的前向输出 -> 逐帧可迭代的结果
+        forward_metric: 记录每批前向耗时的直方图序列（metrics.MODEL_FORWARD.labels(...)）
+    """
+    prepared_queue = Queue(1)
+    download_queue = Queue(1)
+
+    def put(q, item):
+        # 下游已满时短轮询，退出信号后尽快返回
+        while not quit_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def prefetch():
+        index = 0
+        while not quit_event.is_set():
+            try:
+                feats = audio_feat_queue.get(block=True, timeout=1)
+            except queue.Empty:
+                continue
+            if feats is None:
+                # render 退出时的唤醒
+                continue
+            is_all_silence = True
+            audio_frames = []
+            for _ in range(batch_size * 2):
+                frame, type_, eventpoint = audio_out_queue.get()
+                audio_frames.append((frame, type_, eventpoint))
+                if type_ == 0:
+                    is_all_silence = False
+            inputs = None if is_all_silence else prepare_fn(feats, index)
+            if not put(prepared_queue, (index, audio_frames, inputs)):
+                break
+            index += batch_size
+        wake_queue(prepared_queue)
+
+    def download():
+        downloader = _Downloader(postprocess_fn)
+        count = 0
+        counttime = 0
+        while not quit_event.is_set():
+            try:
+                item = download_queue.get(block=True, timeout=1)
+            except queue.Empty:
+                continue
+            if item is None:
+                continue
+            index, audio_frames, output, ready_event, forward_time = item
+            if output is None:
+                for i in range(batch_size):
+                    res_frame_queue.put((None, mirror_index(length, index + i), audio_frames[i*2:i*2+2]))
+                continue
+            res_frames = downloader.frames(output, ready_event)
+            if ready_event is not None:
+                # 拷回时已经等到 ready_event，这里取到的是 GPU 上实际的前向耗时
+                forward_time = forward_time.elapsed_time(ready_event) / 1000
+            if forward_metric is not None:
+                forward_metric.observe(forward_time)
+            counttime += forward_time
+            count += batch_size
+            if count >= 100:
+                logger.info(f"------actual avg infer fps:{count/counttime:.4f}")
+                count = 0
+                counttime = 0
+            for i, res_frame in enumerate(res_frames):
+                res_frame_queue.put((res_frame, mirror_index(length, index + i), audio_frames[i*2:i*2+2]))
+
+    prefetch_thread = Thread(target=prefetch, name=f'{name}-prefetch')
+    download_thread = Thread(target=download, name=f'{name}-download')
+    prefetch_thread.start()
+    download_thread.start()
+
+    logger.info('start inference')
+    while not quit_event.is_set():
+        try:
+            item = prepared_queue.get(block=True, timeout=1)
+        except queue.Empty:
+            continue
+        if item is None:
+            continue
+        index, audio_frames, inputs = item
+        output = None
+        ready_event = None
+        forward_time = None
+        if inputs is not None:
+            t = time.perf_counter()
+            start_event = None
+            if use_cuda:
+                start_event = torch.cuda.Event(enable_timing=True)
+                start_event.record()
+            with torch.no_grad():
+                output = infer_fn(*inputs)
+            if start_event is not None and isinstance(output, torch.Tensor) and output.is_cuda:
+                # forward 只是把 kernel 排进队列，耗时在 download 阶段同步后由事件对算出
+                ready_event = torch.cuda.Event(enable_timing=True)
+                ready_event.record()
+                forward_time = start_event
+            else:
+                forward_time = time.perf_counter() - t
+        if not put(download_queue, (index, audio_frames, output, ready_event, forward_time)):
+            break
+    wake_queue(download_queue)
+
+    prefetch_thread.join()
+    download_thread.join()
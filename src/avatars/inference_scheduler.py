@@ -0,0 +1,187 @@
+"""跨会话批量推理调度器
+
+多个会话共享同一个模型时，每个会话各自的 inference 线程都会用自己的
+batch_size 做一次小批量前向，N 个会话就是 N 次串行的小前向。
+调度器把各会话提交的批次在一个很短的等待窗口内合并成一次大前向，
+再按提交顺序把结果切分回各自的调用方。
+"""
+import threading
+import time
+from concurrent.futures import Future
+from queue import Queue, Empty
+from typing import Any, Callable, Dict, List, Sequence, Tuple
+
+import numpy as np
+import torch
+
+from src.utils.logging import logger
+
+
+def _batch_len(x) -> int:
+    return x.shape[0] if hasattr(x, 'shape') else len(x)
+
+
+def _concat(parts: Sequence[Any]):
+    """按 batch 维拼接，兼容 torch.Tensor / np.ndarray / list"""
+    if len(parts) == 1:
+        return parts[0]
+    first = parts[0]
+    if isinstance(first, torch.Tensor):
+        return torch.cat(parts, dim=0)
+    if isinstance(first, np.ndarray):
+        return np.concatenate(parts, axis=0)
+    merged = []
+    for p in parts:
+        merged.extend(p)
+    return merged
+
+
+class InferenceScheduler:
+    """合并多个会话的推理请求，统一做一次前向
+
+    Args:
+        forward_fn: 真正执行前向的函数，入参为按 batch 维拼接后的输入，返回按 batch 维排列的输出
+        max_batch: 单次合并前向的最大样本数
+        max_wait_ms: 收到第一个请求后，最多等待多久凑批
+        name: 调度器名称，用于日志
+    """
+
+    def __init__(self, forward_fn: Callable, max_batch: int = 64, max_wait_ms: float = 10.0, name: str = 'infer'):
+        self.forward_fn = forward_fn
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+
+        self._requests: "Queue[Tuple[tuple, int, Future]]" = Queue()
+        # 放不进上一批的请求，留作下一批的第一个
+        self._carry = None
+        self._quit_event = threading.Event()
+        self._thread = threading.Thread(target=self._worker, name=f'{name}-scheduler', daemon=True)
+        self._thread.start()
+
+        # 统计信息
+        self.batches = 0
+        self.samples = 0
+
+    def infer(self, *inputs):
+        """提交一个批次并阻塞等待结果，返回值与 forward_fn 单独调用时一致"""
+        return self.submit(*inputs).result()
+
+    def submit(self, *inputs) -> Future:
+        future = Future()
+        if self._quit_event.is_set():
+            future.set_exception(RuntimeError(f'{self.name} scheduler stopped'))
+            return future
+        self._requests.put((inputs, _batch_len(inputs[0]), future))
+        return future
+
+    def stop(self, timeout: float = 5.0):
+        """停止调度线程，尚未执行的请求以异常结束，避免调用方一直阻塞"""
+        self._quit_event.set()
+        # 唤醒阻塞在队列上的 _collect
+        self._requests.put(None)
+        self._thread.join(timeout)
+        pending = [self._carry] if self._carry is not None else []
+        self._carry = None
+        while True:
+            try:
+                pending.append(self._requests.get_nowait())
+            except Empty:
+                break
+        for req in pending:
+            if req is not None:
+                req[2].set_exception(RuntimeError(f'{self.name} scheduler stopped'))
+
+    def _collect(self) -> List[Tuple[tuple, int, Future]]:
+        if self._carry is not None:
+            first, self._carry = self._carry, None
+        else:
+            try:
+                first = self._requests.get(block=True, timeout=1)
+            except Empty:
+                return []
+            if first is None:
+                return []
+        pending = [first]
+        total = first[1]
+        deadline = time.perf_counter() + self.max_wait
+        while total < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                req = self._requests.get(block=True, timeout=remaining)
+            except Empty:
+                break
+            if req is None:
+                break
+            if total + req[1] > self.max_batch:
+                # 合并后会超过 max_batch，整体留给下一批（单个请求超过上限时仍单独执行）
+                self._carry = req
+                break
+            pending.append(req)
+            total += req[1]
+        return pending
+
+    def _worker(self):
+        logger.info(f'[{self.name}] inference scheduler start, max_batch={self.max_batch}, max_wait={self.max_wait*1000:.1f}ms')
+        while not self._quit_event.is_set():
+            pending = self._collect()
+            if not pending:
+                continue
+            try:
+                num_inputs = len(pending[0][0])
+                merged = [_concat([req[0][i] for req in pending]) for i in range(num_inputs)]
+                with torch.no_grad():
+                    outputs = self.forward_fn(*merged)
+            except Exception as e:
+                logger.exception(f'[{self.name}] merged forward failed')
+                for _, _, future in pending:
+                    future.set_exception(e)
+                continue
+
+            # 按提交顺序把结果切回各自的请求
+            offset = 0
+            for _, size, future in pending:
+                future.set_result(outputs[offset:offset + size])
+                offset += size
+
+            self.batches += 1
+            self.samples += offset
+            if self.batches % 100 == 0:
+                logger.info(f'[{self.name}] avg merged batch size:{self.samples / self.batches:.2f}')
+                self.batches = 0
+                self.samples = 0
+        logger.info(f'[{self.name}] inference scheduler stop')
+
+
+_schedulers: Dict[int, InferenceScheduler] = {}
+_schedulers_lock = threading.Lock()
+
+
+def get_inference_scheduler(model: Any, forward_fn: Callable, config, name: str = 'infer') -> InferenceScheduler:
+    """获取（必要时创建）与共享模型绑定的进程级调度器
+
+    prepare_avatar_model 加载的模型在所有会话间共享，这里按模型对象复用同一个调度器。
+    """
+    key = id(model)
+    with _schedulers_lock:
+        scheduler = _schedulers.get(key)
+        if scheduler is None:
+            scheduler = InferenceScheduler(
+                forward_fn,
+                max_batch=config.model.infer_max_batch,
+                max_wait_ms=config.model.infer_max_wait_ms,
+                name=name,
+            )
+            _schedulers[key] = scheduler
+        return scheduler
+
+
+def stop_inference_schedulers() -> None:
+    """服务关闭时停止所有共享调度器"""
+    with _schedulers_lock:
+        schedulers = list(_schedulers.values())
+        _schedulers.clear()
+    for scheduler in schedulers:
+        scheduler.stop()
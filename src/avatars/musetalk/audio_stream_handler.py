@@ -5,7 +5,8 @@ import numpy as np
 import queue
 from queue import Queue
 from src.avatars.audio_stream_handler import BaseAudioStreamHandler
-from src.avatars.musetalk.whisper.audio2feature import Audio2Feature
+from src.avatars.musetalk.whisper.audio2feature import Audio2Feature, StreamingAudio2Feature
+from src.avatars.inference_scheduler import get_inference_scheduler
 
 
 class MuseAudioStreamHandler(BaseAudioStreamHandler):
@@ -16,31 +17,43 @@ class MuseAudioStreamHandler(BaseAudioStreamHandler):
     def __init__(self, config, parent, audio_processor: Audio2Feature):
         super().__init__(config, parent)
         self.audio_processor = audio_processor
+        # 默认走原版 encoder（30s 输入）；流式短窗口需要截取位置编码，改用 encode
+        encode = audio_processor.encode if config.model.whisper_stream else audio_processor.encode_full
+        if config.model.shared_infer:
+            # 各会话的 encoder 前向合并成一次
+            self.encode_fn = get_inference_scheduler(audio_processor, encode, config, name='whisper').infer
+        else:
+            self.encode_fn = encode
 
-    def run_step(self):
-        """执行一步音频特征提取"""
-        start_time = time.time()
-        for _ in range(self.batch_size * 2):
-            audio_frame, type, eventpoint = self.get_audio_frame()
-            self.frames.append(audio_frame)
-            self.output_queue.put((audio_frame, type, eventpoint))
-        
-        if len(self.frames) <= self.stride_left_size + self.stride_right_size:
-            return
-        
-        inputs = np.concatenate(self.frames)  # [N * chunk]
-        whisper_feature = self.audio_processor.audio2feat(inputs)
-        # for feature in whisper_feature:
-        #     self.audio_feats.append(feature)        
-        #print(f"processing audio costs {(time.time() - start_time) * 1000}ms, inputs shape:{inputs.shape} whisper_feature len:{len(whisper_feature)}")
+        self.whisper_stream = None
+        if config.model.whisper_stream:
+            window = (self.stride_left_size + self.stride_right_size + self.batch_size * 2) * self.chunk
+            # 窗口尾部至少留出一个 n_fft 的补零，保证末尾帧与 30s 版本一致
+            window_samples = max(int(config.model.whisper_stream_window_s * self.sample_rate),
+                                 window + audio_processor.feature_extractor.n_fft)
+            self.whisper_stream = StreamingAudio2Feature(audio_processor, window_samples, self.encode_fn)
+
+    def audio2feat(self, inputs, offset=None):
+        if self.whisper_stream is not None:
+            return self.whisper_stream(inputs, offset)
+        return self.encode_fn(self.audio_processor.log_mel(inputs))[0]
+
+    def whisper_chunks(self, inputs, offset=None):
+        whisper_feature = self.audio2feat(inputs, offset)
         whisper_chunks = self.audio_processor.feature2chunks(
             feature_array=whisper_feature,
             fps=self.fps / 2,
             batch_size=self.batch_size,
             start=self.stride_left_size / 2
         )
-        #print(f"whisper_chunks len:{len(whisper_chunks)},self.audio_feats len:{len(self.audio_feats)},self.output_queue len:{self.output_queue.qsize()}")
-        #self.audio_feats = self.audio_feats[-(self.stride_left_size + self.stride_right_size):]
-        self.feat_queue.put(whisper_chunks)
-        # discard the old part to save memory
-        self.frames = self.frames[-(self.stride_left_size + self.stride_right_size):]
+        return whisper_chunks
+
+    def extract_features(self, inputs):
+        """提取一个 batch 的 Whisper 特征"""
+        return self.whisper_chunks(inputs, self.frame_offset * self.chunk)
+
+    def silence_feature(self):
+        # 全零窗口与流位置无关，不能写进按位置缓存的 log-mel 帧里
+        if self._silence_feat is None:
+            self._silence_feat = self.whisper_chunks(np.zeros(len(self.frames) * self.chunk, dtype=np.float32))
+        return self._silence_feat
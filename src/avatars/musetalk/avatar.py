@@ -15,20 +15,25 @@ import copy
 import queue
 from queue import Queue
 from threading import Thread, Event
+from functools import partial
 import torch.multiprocessing as mp
 
 from src.avatars.musetalk.utils.utils import get_file_type,get_video_fps,datagen
 #from musetalk.utils.preprocessing import get_landmark_and_bbox,read_imgs,coord_placeholder
-from src.avatars.musetalk.myutil import get_image_blending
+from src.avatars.musetalk.myutil import prepare_blending_alpha,blend_face_inplace
 from src.avatars.musetalk.utils.utils import load_all_model
 from src.avatars.musetalk.whisper.audio2feature import Audio2Feature
 
 from src.avatars.musetalk.audio_stream_handler import MuseAudioStreamHandler
 import asyncio
 from av import AudioFrame, VideoFrame
-from src.avatars.base import BaseAvatar
+from src.avatars.base import BaseAvatar, wake_queue
+from src.avatars.inference_scheduler import get_inference_scheduler
+from src.avatars.inference_pipeline import run_inference_pipeline, mirror_index, to_pinned_tensor
+from src.avatars.avatar_store import open_avatar_bundle
 
 from tqdm import tqdm
+from src.utils import metrics
 from src.utils.logging import logger
 
 def load_model():
@@ -63,6 +68,14 @@ def load_avatar(avatar_id):
     # }
 
     input_latent_list_cycle = torch.load(latents_out_path)  #,weights_only=True
+
+    bundle = open_avatar_bundle(avatar_path)
+    if bundle is not None:
+        # 已编译的 avatar 包：只读 mmap，按需换页，多进程共享
+        mask_alpha_cycle = [prepare_blending_alpha(mask) for mask in bundle.frames('mask')]
+        return (bundle.frames('full_imgs'),mask_alpha_cycle,bundle.load_pickle('coords.pkl'),
+                bundle.load_pickle('mask_coords.pkl'),input_latent_list_cycle)
+
     with open(coords_path, 'rb') as f:
         coord_list_cycle = pickle.load(f)
     input_img_list = glob.glob(os.path.join(full_imgs_path, '*.[jpJP][pnPN]*[gG]'))
@@ -73,7 +86,9 @@ def load_avatar(avatar_id):
     input_mask_list = glob.glob(os.path.join(mask_out_path, '*.[jpJP][pnPN]*[gG]'))
     input_mask_list = sorted(input_mask_list, key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
     mask_list_cycle = read_imgs(input_mask_list)
-    return frame_list_cycle,mask_list_cycle,coord_list_cycle,mask_coords_list_cycle,input_latent_list_cycle
+    # 掩码对每个下标固定不变，加载时一次性转成定点 alpha
+    mask_alpha_cycle = [prepare_blending_alpha(mask) for mask in mask_list_cycle]
+    return frame_list_cycle,mask_alpha_cycle,coord_list_cycle,mask_coords_list_cycle,input_latent_list_cycle
 
 @torch.no_grad()
 def warm_up(batch_size,model):
@@ -94,6 +109,19 @@ def warm_up(batch_size,model):
                               encoder_hidden_states=audio_feature_batch).sample
     vae.decode_latents(pred_latents)
 
+@torch.no_grad()
+def forward(model,whisper_batch,latent_batch):
+    # whisper 特征 + latent -> unet -> vae 解码，便于调度器跨会话合并
+    vae, unet, pe, timesteps, _ = model
+    audio_feature_batch = whisper_batch.to(device=unet.device, non_blocking=True)
+    audio_feature_batch = audio_feature_batch.to(dtype=unet.model.dtype)
+    audio_feature_batch = pe(audio_feature_batch)
+    latent_batch = latent_batch.to(dtype=unet.model.dtype)
+    pred_latents = unet.model(latent_batch, 
+                                timesteps, 
+                                encoder_hidden_states=audio_feature_batch).sample
+    return vae.decode_latents(pred_latents)
+
 def read_imgs(img_list):
     frames = []
     logger.info('reading images...')
@@ -102,93 +130,24 @@ def read_imgs(img_list):
         frames.append(frame)
     return frames
 
-def __mirror_index(size, index):
-    #size = len(self.coord_list_cycle)
-    turn = index // size
-    res = index % size
-    if turn % 2 == 0:
-        return res
-    else:
-        return size - res - 1 
+def prepare_batch(input_latent_list_cycle,batch_size,whisper_chunks,index):
+    # 在预取线程中组好下一批输入
+    length = len(input_latent_list_cycle)
+    whisper_batch = to_pinned_tensor(np.stack(whisper_chunks))
+    latent_batch = []
+    for i in range(batch_size):
+        idx = mirror_index(length,index+i)
+        latent = input_latent_list_cycle[idx]
+        latent_batch.append(latent)
+    latent_batch = torch.cat(latent_batch, dim=0)
+    return whisper_batch, latent_batch
 
-@torch.no_grad()
 def inference(quit_event,batch_size,input_latent_list_cycle,audio_feat_queue,audio_out_queue,res_frame_queue,
-              vae, unet, pe,timesteps): #vae, unet, pe,timesteps
-    
-    # vae, unet, pe = load_diffusion_model()
-    # device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    # timesteps = torch.tensor([0], device=device)
-    # pe = pe.half()
-    # vae.vae = vae.vae.half()
-    # unet.model = unet.model.half()
-    
-    length = len(input_latent_list_cycle)
-    index = 0
-    count=0
-    counttime=0
-    logger.info('start inference')
-    while not quit_event.is_set():
-        starttime=time.perf_counter()
-        try:
-            whisper_chunks = audio_feat_queue.get(block=True, timeout=1)
-        except queue.Empty:
-            continue
-        is_all_silence=True
-        audio_frames = []
-        for _ in range(batch_size*2):
-            frame,type,eventpoint = audio_out_queue.get()
-            audio_frames.append((frame,type,eventpoint))
-            if type==0:
-                is_all_silence=False
-        if is_all_silence:
-            for i in range(batch_size):
-                res_frame_queue.put((None,__mirror_index(length,index),audio_frames[i*2:i*2+2]))
-                index = index + 1
-        else:
-            # print('infer=======')
-            t=time.perf_counter()
-            whisper_batch = np.stack(whisper_chunks)
-            latent_batch = []
-            for i in range(batch_size):
-                idx = __mirror_index(length,index+i)
-                latent = input_latent_list_cycle[idx]
-                latent_batch.append(latent)
-            latent_batch = torch.cat(latent_batch, dim=0)
-            
-            # for i, (whisper_batch,latent_batch) in enumerate(gen):
-            audio_feature_batch = torch.from_numpy(whisper_batch)
-            audio_feature_batch = audio_feature_batch.to(device=unet.device,
-                                                            dtype=unet.model.dtype)
-            audio_feature_batch = pe(audio_feature_batch)
-            latent_batch = latent_batch.to(dtype=unet.model.dtype)
-            # print('prepare time:',time.perf_counter()-t)
-            # t=time.perf_counter()
-
-            pred_latents = unet.model(latent_batch, 
-                                        timesteps, 
-                                        encoder_hidden_states=audio_feature_batch).sample
-            # print('unet time:',time.perf_counter()-t)
-            # t=time.perf_counter()
-            recon = vae.decode_latents(pred_latents)
-            # infer_inqueue.put((whisper_batch,latent_batch,sessionid))
-            # recon,outsessionid = infer_outqueue.get()
-            # if outsessionid != sessionid:
-            #     print('outsessionid:',outsessionid,' mysessionid:',sessionid)
-
-            # print('vae time:',time.perf_counter()-t)
-            #print('diffusion len=',len(recon))
-            counttime += (time.perf_counter() - t)
-            count += batch_size
-            #_totalframe += 1
-            if count>=100:
-                logger.info(f"------actual avg infer fps:{count/counttime:.4f}")
-                count=0
-                counttime=0
-            for i,res_frame in enumerate(recon):
-                #self.__pushmedia(res_frame,loop,audio_track,video_track)
-                res_frame_queue.put((res_frame,__mirror_index(length,index),audio_frames[i*2:i*2+2]))
-                index = index + 1
-            #print('total batch time:',time.perf_counter()-starttime)            
+              infer_fn,forward_metric=None):
+    # vae 解码已在前向内转回 numpy，download 阶段直接透传
+    run_inference_pipeline(quit_event,batch_size,len(input_latent_list_cycle),audio_feat_queue,audio_out_queue,res_frame_queue,
+                           partial(prepare_batch,input_latent_list_cycle,batch_size),infer_fn,lambda recon: recon,name='musetalk',
+                           forward_metric=forward_metric)
     logger.info('musereal inference processor stop')
 
 class MuseTalkAvatar(BaseAvatar):
@@ -206,7 +165,12 @@ class MuseTalkAvatar(BaseAvatar):
         self.res_frame_queue = mp.Queue(self.batch_size*2)
 
         self.vae, self.unet, self.pe, self.timesteps, self.audio_processor = model
-        self.frame_list_cycle,self.mask_list_cycle,self.coord_list_cycle,self.mask_coords_list_cycle, self.input_latent_list_cycle = avatar
+        if config.model.shared_infer:
+            # 多会话共享同一个调度器，合并成一次前向
+            self.infer_fn = get_inference_scheduler(model, partial(forward, model), config, name='musetalk').infer
+        else:
+            self.infer_fn = partial(forward, model)
+        self.frame_list_cycle,self.mask_alpha_cycle,self.coord_list_cycle,self.mask_coords_list_cycle, self.input_latent_list_cycle = avatar
         #self.__loadavatar()
 
         self.audio_stream = MuseAudioStreamHandler(config, self, self.audio_processor)
@@ -251,16 +215,16 @@ class MuseTalkAvatar(BaseAvatar):
         recon = self.vae.decode_latents(pred_latents)
       
 
-    def paste_back_frame(self,pred_frame,idx:int):
+    def paste_back_frame(self,pred_frame,idx:int,ori_frame):
+        # ori_frame 已是背景帧（VideoFrame 平面视图），只在人脸框内融合
         bbox = self.coord_list_cycle[idx]
-        ori_frame = copy.deepcopy(self.frame_list_cycle[idx])
         x1, y1, x2, y2 = bbox
 
         res_frame = cv2.resize(pred_frame.astype(np.uint8),(x2-x1,y2-y1))
-        mask = self.mask_list_cycle[idx]
+        alpha = self.mask_alpha_cycle[idx]
         mask_crop_box = self.mask_coords_list_cycle[idx]
 
-        combine_frame = get_image_blending(ori_frame,res_frame,bbox,mask,mask_crop_box)
+        combine_frame = blend_face_inplace(ori_frame,res_frame,bbox,alpha,mask_crop_box)
         return combine_frame
             
     def render(self,quit_event,loop=None,audio_track=None,video_track=None):
@@ -274,7 +238,7 @@ class MuseTalkAvatar(BaseAvatar):
         infer_quit_event = Event()
         infer_thread = Thread(target=inference, args=(infer_quit_event,self.batch_size,self.input_latent_list_cycle,
                                            self.audio_stream.feat_queue,self.audio_stream.output_queue,self.res_frame_queue,
-                                           self.vae, self.unet, self.pe,self.timesteps)) #mp.Process
+                                           self.infer_fn,metrics.MODEL_FORWARD.labels(*metrics.session_labels(self)))) #mp.Process
         infer_thread.start()
         
         process_quit_event = Event()
@@ -298,9 +262,7 @@ class MuseTalkAvatar(BaseAvatar):
             #     print(f"------actual avg infer fps:{count/totaltime:.4f}")
             #     count=0
             #     totaltime=0
-            if video_track and video_track._queue.qsize()>=1.5*self.config.model.batch_size:
-                logger.debug('sleep qsize=%d',video_track._queue.qsize())
-                time.sleep(0.04*video_track._queue.qsize()*0.8)
+            self.pacer.pace(video_track, self.batch_size)
             # if video_track._queue.qsize()>=5:
             #     print('sleep qsize=',video_track._queue.qsize())
             #     time.sleep(0.04*video_track._queue.qsize()*0.8)
@@ -310,9 +272,12 @@ class MuseTalkAvatar(BaseAvatar):
             #     time.sleep(delay)
         logger.info('musereal thread stop')
 
+        # 退出信号之后立即唤醒阻塞在队列上的线程，不必等 get 超时
         infer_quit_event.set()
+        wake_queue(self.audio_stream.feat_queue)
         infer_thread.join()
 
         process_quit_event.set()
+        wake_queue(self.res_frame_queue)
         process_thread.join()
             
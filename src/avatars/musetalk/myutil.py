@@ -24,4 +24,31 @@ def get_image_blending(image,face,face_box,mask_array,crop_box):
     body[y_s:y_e, x_s:x_e] = cv2.blendLinear(face_large,body[y_s:y_e, x_s:x_e],mask_image,1-mask_image)
 
     #body.paste(face_large, crop_box[:2], mask_image)
-    return body
\ No newline at end of file
+    return body
+
+def prepare_blending_alpha(mask_array):
+    """把 BGR 掩码预处理成定点 alpha（uint16，0~256），avatar 加载时每个下标只算一次"""
+    mask_image = cv2.cvtColor(mask_array,cv2.COLOR_BGR2GRAY)
+    alpha = (mask_image.astype(np.uint16) * 256 + 127) // 255
+    return alpha[:, :, np.newaxis]
+
+
+def blend_face_inplace(image,face,face_box,alpha,crop_box):
+    """与 get_image_blending 等价的定点整数融合，直接写回 image
+
+    face_large 只在人脸框内与原图不同，框外 alpha 融合结果就是原图本身，
+    所以只需在人脸框内做一次 (face*a + body*(256-a) + 128) >> 8。
+    """
+    x, y, x1, y1 = face_box
+    x_s, y_s, x_e, y_e = crop_box
+    body = image[y:y1, x:x1]
+    a = alpha[y-y_s:y1-y_s, x-x_s:x1-x_s]
+
+    blended = np.multiply(face, a, dtype=np.uint16)
+    inv = 256 - a
+    blended += body * inv
+    blended += 128
+    blended >>= 8
+    body[...] = blended
+    return image
+
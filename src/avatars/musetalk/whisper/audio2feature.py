@@ -103,18 +103,51 @@ class Audio2Feature():
             i += 1
         return whisper_chunks
     
-    def audio2feat(self, wav_data): #, weight_dtype=None
-        input_feature = self.feature_extractor(
+    def log_mel(self, wav_data):
+        """30s 补零的 log-mel 输入特征 [1, 80, 3000]"""
+        return self.feature_extractor(
             wav_data,
             return_tensors="pt",
             sampling_rate=16000
         ).input_features
-        input_feature = input_feature.to(device).to(weight_dtype)
-        whisper_feature = self.whisper.encoder(input_feature, output_hidden_states=True).hidden_states
+
+    @torch.no_grad()
+    def encode(self, input_features):
+        """whisper encoder 前向，返回各层 hidden states [N, T/2, layers+1, 384]
+
+        与 whisper.encoder(..., output_hidden_states=True) 相同，但不要求输入为 3000 帧，
+        位置编码只取前 T/2 个，仅供流式短窗口使用（30s 输入时与 encode_full 的一致性
+        见 scripts/check_whisper_encode.py）；输入按 batch 维可合并多个会话。
+        """
+        encoder = self.whisper.encoder
+        input_features = input_features.to(device=device, dtype=weight_dtype)
+        inputs_embeds = torch.nn.functional.gelu(encoder.conv1(input_features))
+        inputs_embeds = torch.nn.functional.gelu(encoder.conv2(inputs_embeds))
+        inputs_embeds = inputs_embeds.permute(0, 2, 1)
+        hidden_states = inputs_embeds + encoder.embed_positions.weight[:inputs_embeds.shape[1]]
+        encoder_states = []
+        for encoder_layer in encoder.layers:
+            encoder_states.append(hidden_states)
+            layer_outputs = encoder_layer(hidden_states, None, layer_head_mask=None)
+            hidden_states = layer_outputs[0] if isinstance(layer_outputs, tuple) else layer_outputs
+        encoder_states.append(encoder.layer_norm(hidden_states))
+        return torch.stack(encoder_states, dim=2).cpu().numpy()
+
+    @torch.no_grad()
+    def encode_full(self, input_features):
+        """原版 whisper encoder 前向（输入须为 30s 的 3000 帧），返回 [N, 1500, layers+1, 384]
+
+        非流式路径使用，输入按 batch 维可合并多个会话。
+        """
+        input_features = input_features.to(device).to(weight_dtype)
+        whisper_feature = self.whisper.encoder(input_features, output_hidden_states=True).hidden_states
         #print(f"input_feature shape:{input_feature.shape}, whisper_feature shape:{whisper_feature[0].shape}, whisper_feature len:{len(whisper_feature)}")
         whisper_feature = torch.stack(whisper_feature, dim=2)
         #print(f"stacked whisper_feature shape:{whisper_feature.shape}")
-        return whisper_feature.squeeze(0).cpu().numpy()
+        return whisper_feature.cpu().numpy()
+
+    def audio2feat(self, wav_data): #, weight_dtype=None
+        return self.encode_full(self.log_mel(wav_data))[0]
 
     # def audio2feat(self,audio_path):
     #     # get the sample rate of the audio
@@ -131,6 +164,85 @@ class Audio2Feature():
     #     concatenated_array = np.concatenate(embed_list, axis=0)
     #     return concatenated_array
 
+class StreamingAudio2Feature():
+    """单会话的流式 whisper 特征
+
+    audio2feat 每步都把约 1s 的滑动窗口补零到 30s，encoder 计算 1500 个位置，
+    真正用到的只有窗口对应的几十个。流式模式下：
+
+    - log-mel：窗口尾部补零到固定长度 window_samples。whisper 的 log-mel 逐帧只依赖
+      本帧的 400 个采样，归一化用的最大值来自真实音频，因此结果与 30s 版本的前若干帧一致；
+      不受窗口边缘影响的帧按在音频流中的绝对位置缓存，与上一步重叠的部分不再重算。
+    - encoder：只在固定长度的短窗口上前向。注意力不再覆盖 30s 里剩余的静音段，
+      特征与 audio2feat 存在细微差异。
+
+    固定长度保证各会话输入形状一致，encode_fn 可以是跨会话合并的调度器。
+    """
+    def __init__(self, audio_processor: Audio2Feature, window_samples, encode_fn=None):
+        fe = audio_processor.feature_extractor
+        self.n_fft = fe.n_fft
+        self.hop = fe.hop_length
+        # 补零长度对齐到 encoder 的两倍下采样
+        align = self.hop * 2
+        self.window_samples = (window_samples + align - 1) // align * align
+        self.num_frames = self.window_samples // self.hop
+        self.window = torch.hann_window(self.n_fft)
+        self.mel_filters = torch.from_numpy(fe.mel_filters).to(torch.float32)
+        self.encode_fn = encode_fn or audio_processor.encode
+        # 帧中心在音频流中的绝对采样位置 -> log10 mel 列（未归一化）
+        self._cache = {}
+
+    def reset(self):
+        self._cache.clear()
+
+    def _raw_log_mel(self, padded, frames):
+        # padded 已按 stft(center=True) 两侧反射填充 n_fft/2，帧 t 对应 padded[t*hop : t*hop+n_fft]
+        segs = torch.stack([padded[t * self.hop:t * self.hop + self.n_fft] for t in frames]) * self.window
+        magnitudes = torch.fft.rfft(segs, n=self.n_fft, dim=1).abs() ** 2
+        mel_spec = self.mel_filters.T @ magnitudes.T
+        return torch.clamp(mel_spec, min=1e-10).log10()
+
+    def log_mel(self, wav_data, offset=None):
+        """固定长度短窗口的 log-mel [1, 80, num_frames]
+
+        Args:
+            offset: 窗口首个采样在音频流中的绝对位置；None 表示不使用缓存
+        """
+        wav_len = min(len(wav_data), self.window_samples)
+        waveform = torch.zeros(self.window_samples, dtype=torch.float32)
+        waveform[:wav_len] = torch.from_numpy(np.asarray(wav_data[:wav_len], dtype=np.float32))
+        half = self.n_fft // 2
+        padded = torch.nn.functional.pad(waveform[None, None], (half, half), mode='reflect')[0, 0]
+
+        # 完全落在补零区的帧恒为 log10(1e-10)
+        log_spec = torch.full((self.mel_filters.shape[1], self.num_frames), -10.0)
+        last = min(self.num_frames, (wav_len + half) // self.hop + 1)
+        missing = []
+        for t in range(last):
+            interior = t * self.hop - half > 0 and t * self.hop + half <= wav_len
+            key = offset + t * self.hop if offset is not None and interior else None
+            col = self._cache.get(key) if key is not None else None
+            if col is None:
+                missing.append((t, key))
+            else:
+                log_spec[:, t] = col
+        if missing:
+            cols = self._raw_log_mel(padded, [t for t, _ in missing])
+            for j, (t, key) in enumerate(missing):
+                log_spec[:, t] = cols[:, j]
+                if key is not None:
+                    self._cache[key] = cols[:, j].clone()
+        if offset is not None:
+            self._cache = {k: v for k, v in self._cache.items() if k >= offset}
+
+        log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
+        log_spec = (log_spec + 4.0) / 4.0
+        return log_spec[None]
+
+    def __call__(self, wav_data, offset=None):
+        """返回与 audio2feat 相同布局的特征 [num_frames/2, layers+1, 384]"""
+        return self.encode_fn(self.log_mel(wav_data, offset))[0]
+
 if __name__ == "__main__":
     audio_processor = Audio2Feature(model_path="../../models/whisper/whisper_tiny.pt")
     audio_path = "./test.mp3"
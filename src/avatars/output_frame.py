@@ -0,0 +1,20 @@
+"""输出帧直接在 VideoFrame 上合成
+
+process_frames 原先每帧 copy.deepcopy 整张背景帧，贴回人脸、加水印后再
+VideoFrame.from_ndarray，背景被完整复制了两次。from_ndarray 本身已经把背景拷进
+VideoFrame 的像素平面，这里直接返回该平面的 ndarray 视图，人脸区域（bbox / 融合框）
+和水印只写进这块视图，省掉一次整图拷贝和分配。
+
+avatar 的背景帧可能是只读 mmap、并在会话间共享，始终只读不写。
+"""
+import numpy as np
+from av import VideoFrame
+
+
+def output_frame(background: np.ndarray):
+    """由背景帧生成 bgr24 VideoFrame，返回 (frame, 可写的 HxWx3 平面视图)"""
+    frame = VideoFrame.from_ndarray(background, format="bgr24")
+    plane = frame.planes[0]
+    height, width = background.shape[:2]
+    view = np.frombuffer(plane, np.uint8).reshape(height, plane.line_size)[:, :width * 3]
+    return frame, view.reshape(height, width, 3)
@@ -0,0 +1,149 @@
+"""音视频节奏控制
+
+render 循环原来在 WebRTC 视频队列超过阈值时按 0.04*qsize*0.8 睡眠，
+阈值各 avatar 不一致，队列深度（即端到端延迟）会在空和上限 100 帧之间来回摆动。
+这里用一个 PI 控制器把视频队列深度稳定在目标缓冲（毫秒）附近：
+
+- pace：render 循环每产出一批帧调用一次，按深度误差调节下一批的产出间隔；
+- 丢帧：缓冲超过上限时，process_frames 丢弃整段静音帧（音视频一起丢，不影响同步，也听不出来）；
+- 补帧：视频帧到了发送时刻仍未就绪时，发送端重复上一帧保持时间轴连续，
+  之后到达的新帧丢掉同样数量，使视频重新对齐音频。
+
+同时统计队列深度、发送抖动和音频进入 render 到对应视频帧发出的延迟，
+以及产出帧率和负载（产出一批帧的耗时 / 这批帧的时长，>= 1 表示跟不上实时），供准入控制估算容量。
+"""
+import threading
+import time
+from collections import deque
+
+from src.utils.logging import logger
+
+
+class PacingController:
+    """单会话的 PI 节奏控制器"""
+
+    def __init__(self, config):
+        pacing = config.pacing
+        self.frame_ms = 1000.0 / config.video.fps
+        # 0 表示自动：按每次产出的帧数（半个 batch）确定，批量产出的间隙里偶发欠载由补帧兜底
+        self._auto_target = not pacing.target_buffer_ms
+        self.max_buffer_ms = pacing.max_buffer_ms
+        self._set_target(pacing.target_buffer_ms or 5 * self.frame_ms)
+        self.kp = pacing.kp
+        self.ki = pacing.ki
+        self.drop = pacing.drop_silence
+        self.duplicate = pacing.duplicate
+
+        self._lock = threading.Lock()
+        self._integral = 0.
+        self._last = None
+        # (累计产出帧数, 产出时刻)，用于计算端到端延迟
+        self._produced = deque()
+        self._produced_count = 0
+        self._sent_count = 0
+        self._debt = 0
+        self._last_sent = None
+
+        self.depth_ms = 0.
+        self.jitter_ms = 0.
+        self.lag_ms = 0.
+        self.dropped = 0
+        self.duplicated = 0
+        self.fps = 0.
+        self.load = 0.
+        self._last_pace = None
+
+    def _set_target(self, target_ms):
+        self.target_ms = target_ms
+        self.max_ms = max(self.max_buffer_ms, target_ms * 2)
+
+    def pace(self, video_track, frames: int):
+        """render 循环每产出 frames 个视频帧调用一次，必要时睡眠"""
+        now = time.perf_counter()
+        if self._auto_target and self._last is None:
+            self._set_target(max(frames // 2, 5) * self.frame_ms)
+        with self._lock:
+            self._produced_count += frames
+            self._produced.append((self._produced_count, now))
+        if self._last_pace is not None and now > self._last_pace:
+            fps = frames / (now - self._last_pace)
+            self.fps = fps if not self.fps else self.fps + (fps - self.fps) / 8
+        self._last_pace = now
+        depth = video_track._queue.qsize() if video_track else 0
+        self.depth_ms = depth * self.frame_ms
+        if self._last is None:
+            self._last = now
+            return
+
+        period_ms = frames * self.frame_ms
+        error = self.depth_ms - self.target_ms
+        dt = now - self._last
+        # 积分项限幅，防止长时间欠载/积压后的过冲
+        limit = period_ms / max(self.ki, 1e-6)
+        self._integral = min(max(self._integral + error * dt, -limit), limit)
+        correction = self.kp * error + self.ki * self._integral
+
+        work_ms = dt * 1000
+        self.load += (work_ms / period_ms - self.load) / 8
+        delay_ms = min(max(period_ms + correction - work_ms, 0.), period_ms * 4)
+        if delay_ms > 0:
+            time.sleep(delay_ms / 1000)
+        self._last = time.perf_counter()
+
+    def should_drop(self, video_track, silent: bool) -> bool:
+        """缓冲超过上限时丢弃静音帧，丢弃的帧按已发送计入延迟统计"""
+        if not (self.drop and silent and video_track):
+            return False
+        if video_track._queue.qsize() * self.frame_ms <= self.max_ms:
+            return False
+        with self._lock:
+            self.dropped += 1
+            self._advance(time.perf_counter())
+        return True
+
+    def on_video_duplicated(self):
+        with self._lock:
+            self.duplicated += 1
+            self._debt += 1
+
+    def repay_duplicate(self) -> bool:
+        """有未抵消的重复帧时返回 True，调用方应丢弃一帧"""
+        with self._lock:
+            if self._debt <= 0:
+                return False
+            self._debt -= 1
+            self._advance(time.perf_counter())
+            return True
+
+    def on_video_sent(self):
+        now = time.perf_counter()
+        with self._lock:
+            if self._last_sent is not None:
+                interval_ms = (now - self._last_sent) * 1000
+                # RFC 3550 风格的平滑抖动
+                self.jitter_ms += (abs(interval_ms - self.frame_ms) - self.jitter_ms) / 16
+            self._last_sent = now
+            self._advance(now)
+            if self._sent_count % 250 == 0:
+                logger.info(f'[pacing] depth:{self.depth_ms:.0f}ms target:{self.target_ms:.0f}ms '
+                            f'jitter:{self.jitter_ms:.1f}ms lag:{self.lag_ms:.0f}ms '
+                            f'dropped:{self.dropped} duplicated:{self.duplicated}')
+
+    def _advance(self, now):
+        self._sent_count += 1
+        while self._produced and self._produced[0][0] < self._sent_count:
+            self._produced.popleft()
+        if self._produced:
+            self.lag_ms = (now - self._produced[0][1]) * 1000
+
+    def stats(self) -> dict:
+        return {
+            'depth_ms': self.depth_ms,
+            'target_ms': self.target_ms,
+            'jitter_ms': self.jitter_ms,
+            'lag_ms': self.lag_ms,
+            'dropped': self.dropped,
+            'duplicated': self.duplicated,
+            'fps': self.fps,
+            'load': self.load,
+        }
@@ -18,8 +18,7 @@ from queue import Queue
 from threading import Thread, Event
 import torch.nn.functional as F
 
-import asyncio
-from av import AudioFrame, VideoFrame
+from av import VideoFrame
 from src.avatars.base import BaseAvatar
 from src.utils.logging import logger
 
@@ -213,24 +212,11 @@ class TalkingGaussianAvatar(BaseAvatar):
         每次调用渲染一帧
         """
         # 每次渲染对应 2 个音频块（25fps 视频, 50fps 音频）
-        audiotype1 = 0
-        audiotype2 = 0
-        
-        for i in range(2):
-            frame, type, eventpoint = self.audio_stream.get_audio_out()
-            if i == 0:
-                audiotype1 = type
-            else:
-                audiotype2 = type
-            
-            # 音频推送到 WebRTC
-            frame_int16 = (frame * 32767).astype(np.int16)
-            new_frame = AudioFrame(format='s16', layout='mono', samples=frame_int16.shape[0])
-            new_frame.planes[0].update(frame_int16.tobytes())
-            new_frame.sample_rate = 16000
-            asyncio.run_coroutine_threadsafe(audio_track._queue.put((new_frame, eventpoint)), loop)
-            
-            self.record_audio_data(frame_int16)
+        audio_frames = [self.audio_stream.get_audio_out() for _ in range(2)]
+        audiotype1 = audio_frames[0][1]
+        audiotype2 = audio_frames[1][1]
+        # 音频推送到 WebRTC
+        self.push_audio_frames(audio_track, audio_frames)
         
         if audiotype1 != 0 and audiotype2 != 0:  # 全为静音数据
             self.speaking = False
@@ -244,7 +230,7 @@ class TalkingGaussianAvatar(BaseAvatar):
             self.custom_index[audiotype1] += 1
             
             new_frame = VideoFrame.from_ndarray(image_rgb, format="rgb24")
-            asyncio.run_coroutine_threadsafe(video_track._queue.put((new_frame, None)), loop)
+            video_track._queue.put((new_frame, None))
             
             self.record_video_data(image)
         else:
@@ -321,7 +307,7 @@ class TalkingGaussianAvatar(BaseAvatar):
             #     image = image_fullbody
             
             new_frame = VideoFrame.from_ndarray(image, format="rgb24")
-            asyncio.run_coroutine_threadsafe(video_track._queue.put((new_frame, None)), loop)
+            video_track._queue.put((new_frame, None))
             
             image_bgr = cv2.cvtColor(image, cv2.COLOR_RGB2BGR)
             self.record_video_data(image_bgr)
@@ -360,8 +346,7 @@ class TalkingGaussianAvatar(BaseAvatar):
                 count = 0
                 totaltime = 0
             
-            if video_track._queue.qsize() >= 5:
-                time.sleep(0.04 * video_track._queue.qsize() * 0.8)
+            self.pacer.pace(video_track, 1)
         
         logger.info('TalkingGaussian render thread stopped')
     
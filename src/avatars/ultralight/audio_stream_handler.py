@@ -26,20 +26,8 @@ class HubertAudioStreamHandler(BaseAudioStreamHandler):
         self.audio_processor = audio_processor
         self.audio_feat_length = audio_feat_length
 
-    def run_step(self):
-        """执行一步音频特征提取"""
-        start_time = time.time()
-        
-        for _ in range(self.batch_size * 2):
-            audio_frame, type, eventpoint = self.get_audio_frame()
-            self.frames.append(audio_frame)
-            self.output_queue.put((audio_frame, type, eventpoint))
-        
-        if len(self.frames) <= self.stride_left_size + self.stride_right_size:
-            return
-        
-        inputs = np.concatenate(self.frames)  # [N * chunk]
-
+    def extract_features(self, inputs):
+        """提取一个 batch 的 Hubert 特征"""
         mel = self.audio_processor.get_hubert_from_16k_speech(inputs)
         mel_chunks = self.audio_processor.feature2chunks(
             feature_array=mel,
@@ -48,7 +36,4 @@ class HubertAudioStreamHandler(BaseAudioStreamHandler):
             audio_feat_length=self.audio_feat_length,
             start=self.stride_left_size / 2
         )
-
-        self.feat_queue.put(mel_chunks)
-        self.frames = self.frames[-(self.stride_left_size + self.stride_right_size):]
-        #print(f"Processing audio costs {(time.time() - start_time) * 1000}ms")
+        return mel_chunks
@@ -16,13 +16,18 @@ import copy
 import queue
 from queue import Queue
 from threading import Thread, Event
+from functools import partial
 import torch.multiprocessing as mp
 
 
 from src.avatars.ultralight.audio_stream_handler import HubertAudioStreamHandler
 import asyncio
 from av import AudioFrame, VideoFrame
-from src.avatars.base import BaseAvatar
+from src.avatars.base import BaseAvatar, wake_queue
+from src.avatars.inference_scheduler import get_inference_scheduler
+from src.avatars.inference_pipeline import run_inference_pipeline, mirror_index, to_pinned_tensor
+from src.avatars.avatar_store import open_avatar_bundle
+from src.utils import metrics
 
 #from imgcache import ImgCache
 
@@ -57,6 +62,11 @@ def load_avatar(avatar_id):
     
     model = Model(6, 'hubert').to(device)  # 假设Model是你自定义的类
     model.load_state_dict(torch.load(f"{avatar_path}/ultralight.pth"))
+
+    bundle = open_avatar_bundle(avatar_path)
+    if bundle is not None:
+        # 已编译的 avatar 包：只读 mmap，按需换页，多进程共享
+        return model.eval(),bundle.frames('full_imgs'),bundle.frames('face_imgs'),bundle.load_pickle('coords.pkl')
     
     with open(coords_path, 'rb') as f:
         coord_list_cycle = pickle.load(f)
@@ -79,6 +89,14 @@ def warm_up(batch_size,avatar,modelres):
     mel_batch = torch.ones(batch_size, 16, 32, 32).to(device)
     model(img_batch, mel_batch)
 
+@torch.no_grad()
+def forward(model, img_batch, mel_batch):
+    # CPU(锁页) tensor 输入 -> 模型前向 -> 留在显存上的输出，拷回由推理流水线的 download 阶段完成
+    return model(img_batch.to(device, non_blocking=True), mel_batch.to(device, non_blocking=True))
+
+def postprocess(pred):
+    return pred.transpose(0, 2, 3, 1) * 255.
+
 def read_imgs(img_list):
     frames = []
     logger.info('reading images...')
@@ -121,90 +139,31 @@ def read_lms(lms_list):
         land_marks.append(file_landmarks)  # Add the file's landmarks to the overall list
     return land_marks
 
-def __mirror_index(size, index):
-    #size = len(self.coord_list_cycle)
-    turn = index // size
-    res = index % size
-    if turn % 2 == 0:
-        return res
-    else:
-        return size - res - 1 
-
-
-def inference(quit_event, batch_size, face_list_cycle, audio_feat_queue, audio_out_queue, res_frame_queue, model):
+def prepare_batch(face_list_cycle, batch_size, mel_batch, index):
+    # 在预取线程中组好下一批输入
     length = len(face_list_cycle)
-    index = 0
-    count = 0
-    counttime = 0
-    logger.info('start inference')
-
-    while not quit_event.is_set():
-        starttime=time.perf_counter()
-        try:
-            mel_batch = audio_feat_queue.get(block=True, timeout=1)
-        except queue.Empty:
-            continue
-        is_all_silence=True
-        audio_frames = []
-        for _ in range(batch_size*2):
-            frame,type_,eventpoint = audio_out_queue.get()
-            audio_frames.append((frame,type_,eventpoint))
-            if type_==0:
-                is_all_silence=False
-        if is_all_silence:
-            for i in range(batch_size):
-                res_frame_queue.put((None,__mirror_index(length,index),audio_frames[i*2:i*2+2]))
-                index = index + 1
-        else:
-            t = time.perf_counter()
-            img_batch = []
-
-            for i in range(batch_size):
-                idx = __mirror_index(length, index + i)
-                #face = face_list_cycle[idx]
-                crop_img = face_list_cycle[idx] #face[ymin:ymax, xmin:xmax]
-#                h, w = crop_img.shape[:2]
-                #crop_img = cv2.resize(crop_img, (168, 168), cv2.INTER_AREA)
-                #crop_img_ori = crop_img.copy()
-                img_real_ex = crop_img[4:164, 4:164].copy()
-                img_real_ex_ori = img_real_ex.copy()
-                img_masked = cv2.rectangle(img_real_ex_ori,(5,5,150,145),(0,0,0),-1)
-    
-                img_masked = img_masked.transpose(2,0,1).astype(np.float32)
-                img_real_ex = img_real_ex.transpose(2,0,1).astype(np.float32)
-    
-                img_real_ex_T = torch.from_numpy(img_real_ex / 255.0)
-                img_masked_T = torch.from_numpy(img_masked / 255.0)
-                img_concat_T = torch.cat([img_real_ex_T, img_masked_T], axis=0)[None]
-                img_batch.append(img_concat_T)
-
-            reshaped_mel_batch = [arr.reshape(16, 32, 32) for arr in mel_batch]
-            mel_batch = torch.stack([torch.from_numpy(arr) for arr in reshaped_mel_batch])
-            img_batch = torch.stack(img_batch).squeeze(1)
-
-
-            with torch.no_grad():
-                pred = model(img_batch.cuda(),mel_batch.cuda())
-            pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
-
-            counttime += (time.perf_counter() - t)
-            count += batch_size
-            if count >= 100:
-                logger.info(f"------actual avg infer fps:{count / counttime:.4f}")
-                count = 0
-                counttime = 0
-            for i,res_frame in enumerate(pred):
-                #self.__pushmedia(res_frame,loop,audio_track,video_track)
-                res_frame_queue.put((res_frame,__mirror_index(length,index),audio_frames[i*2:i*2+2]))
-                index = index + 1
-
-#            for i, pred_frame in enumerate(pred):
-#                pred_frame_uint8 = np.array(pred_frame, dtype=np.uint8)
-#                res_frame_queue.put((pred_frame_uint8, __mirror_index(length, index), audio_frames[i * 2:i * 2 + 2]))
-#                index = (index + 1) % length
-
-        #print('total batch time:', time.perf_counter() - starttime)
-
+    img_batch = []
+    for i in range(batch_size):
+        idx = mirror_index(length, index + i)
+        crop_img = face_list_cycle[idx] #face[ymin:ymax, xmin:xmax]
+        img_real_ex = crop_img[4:164, 4:164].copy()
+        img_real_ex_ori = img_real_ex.copy()
+        img_masked = cv2.rectangle(img_real_ex_ori,(5,5,150,145),(0,0,0),-1)
+
+        img_masked = img_masked.transpose(2,0,1).astype(np.float32)
+        img_real_ex = img_real_ex.transpose(2,0,1).astype(np.float32)
+        img_batch.append(np.concatenate([img_real_ex, img_masked], axis=0))
+
+    img_batch = to_pinned_tensor(np.stack(img_batch) / np.float32(255.0))
+    mel_batch = to_pinned_tensor(np.stack([arr.reshape(16, 32, 32) for arr in mel_batch]))
+    return img_batch, mel_batch
+
+
+def inference(quit_event, batch_size, face_list_cycle, audio_feat_queue, audio_out_queue, res_frame_queue, infer_fn,
+              forward_metric=None):
+    run_inference_pipeline(quit_event, batch_size, len(face_list_cycle), audio_feat_queue, audio_out_queue, res_frame_queue,
+                           partial(prepare_batch, face_list_cycle, batch_size), infer_fn, postprocess, name='ultralight',
+                           forward_metric=forward_metric)
     logger.info('lightreal inference processor stop')
 
 
@@ -224,6 +183,11 @@ class UltralightAvatar(BaseAvatar):
         #self.__loadavatar()
         audio_processor = model
         self.model,self.frame_list_cycle,self.face_list_cycle,self.coord_list_cycle = avatar
+        if config.model.shared_infer:
+            # 多会话共享同一个调度器，合并成一次前向
+            self.infer_fn = get_inference_scheduler(self.model, partial(forward, self.model), config, name='ultralight').infer
+        else:
+            self.infer_fn = partial(forward, self.model)
 
         self.audio_stream = HubertAudioStreamHandler(config, self, audio_processor, audio_feat_length=[4, 4])
         self.audio_stream.warm_up()
@@ -234,9 +198,9 @@ class UltralightAvatar(BaseAvatar):
     # def __del__(self):
     #     logger.info(f'lightreal({self.sessionid}) delete')
 
-    def paste_back_frame(self,pred_frame,idx:int):
+    def paste_back_frame(self,pred_frame,idx:int,combine_frame):
+        # combine_frame 已是背景帧（VideoFrame 平面视图），只写人脸框
         bbox = self.coord_list_cycle[idx]
-        combine_frame = copy.deepcopy(self.frame_list_cycle[idx])
         x1, y1, x2, y2 = bbox
 
         crop_img = self.face_list_cycle[idx]
@@ -257,7 +221,7 @@ class UltralightAvatar(BaseAvatar):
         
         infer_quit_event = Event()
         infer_thread = Thread(target=inference, args=(infer_quit_event,self.batch_size,self.face_list_cycle,self.audio_stream.feat_queue,self.audio_stream.output_queue,self.res_frame_queue,
-                                           self.model,))  #mp.Process
+                                           self.infer_fn,metrics.MODEL_FORWARD.labels(*metrics.session_labels(self))))  #mp.Process
         infer_thread.start()
         
         process_quit_event = Event()
@@ -278,9 +242,7 @@ class UltralightAvatar(BaseAvatar):
             # if video_track._queue.qsize()>=2*self.config.model.batch_size:
             #     print('sleep qsize=',video_track._queue.qsize())
             #     time.sleep(0.04*video_track._queue.qsize()*0.8)
-            if video_track and video_track._queue.qsize()>=5:
-                logger.debug('sleep qsize=%d',video_track._queue.qsize())
-                time.sleep(0.04*video_track._queue.qsize()*0.8)
+            self.pacer.pace(video_track, self.batch_size)
                 
             # delay = _starttime+_totalframe*0.04-time.perf_counter() #40ms
             # if delay > 0:
@@ -288,10 +250,13 @@ class UltralightAvatar(BaseAvatar):
         #self.render_event.clear() #end infer process render
         logger.info('lightreal thread stop')
 
+        # 退出信号之后立即唤醒阻塞在队列上的线程，不必等 get 超时
         infer_quit_event.set()
+        wake_queue(self.audio_stream.feat_queue)
         infer_thread.join()
 
         process_quit_event.set()
+        wake_queue(self.res_frame_queue)
         process_thread.join()
             
 
@@ -11,6 +11,7 @@ from queue import Queue
 
 from src.avatars.audio_stream_handler import BaseAudioStreamHandler
 from src.avatars.wav2lip import audio
+from src.avatars.wav2lip.streaming_mel import StreamingMelExtractor
 
 
 class LipAudioStreamHandler(BaseAudioStreamHandler):
@@ -19,38 +20,16 @@ class LipAudioStreamHandler(BaseAudioStreamHandler):
     用于 Wav2Lip Avatar 模型，提取 Mel 频谱特征用于唇形同步。
     """
 
-    def run_step(self):
-        """执行一步音频特征提取"""
-        ############################################## extract audio feature ##############################################
-        # get a frame of audio
-        for _ in range(self.batch_size * 2):
-            frame, type, eventpoint = self.get_audio_frame()
-            self.frames.append(frame)
-            # put to output
-            self.output_queue.put((frame, type, eventpoint))
-        # context not enough, do not run network.
-        if len(self.frames) <= self.stride_left_size + self.stride_right_size:
-            return
-        
-        inputs = np.concatenate(self.frames)  # [N * chunk]
-        mel = audio.melspectrogram(inputs)
-        #print(mel.shape[0],mel.shape,len(mel[0]),len(self.frames))
-        # cut off stride
-        left = max(0, self.stride_left_size * 80 / 50)
-        right = min(len(mel[0]), len(mel[0]) - self.stride_right_size * 80 / 50)
-        mel_idx_multiplier = 80. * 2 / self.fps 
-        mel_step_size = 16
-        i = 0
-        mel_chunks = []
-        while i < (len(self.frames) - self.stride_left_size - self.stride_right_size) / 2:
-            start_idx = int(left + i * mel_idx_multiplier)
-            #print(start_idx)
-            if start_idx + mel_step_size > len(mel[0]):
-                mel_chunks.append(mel[:, len(mel[0]) - mel_step_size:])
-            else:
-                mel_chunks.append(mel[:, start_idx : start_idx + mel_step_size])
-            i += 1
-        self.feat_queue.put(mel_chunks)
-        
-        # discard the old part to save memory
-        self.frames = self.frames[-(self.stride_left_size + self.stride_right_size):]
+    def __init__(self, config, parent=None):
+        super().__init__(config, parent)
+        self.mel_extractor = StreamingMelExtractor(self.fps, self.stride_left_size, self.stride_right_size, self.chunk)
+
+    def extract_features(self, inputs):
+        """提取一个 batch 的 Mel 特征，只计算被引用的帧并复用与上一步重叠的帧"""
+        return self.mel_extractor(inputs, self.frame_offset * self.chunk)
+
+    def silence_feature(self):
+        # 全零窗口与流位置无关，不能写进按位置缓存的帧里
+        if self._silence_feat is None:
+            self._silence_feat = self.mel_extractor(np.zeros(len(self.frames) * self.chunk, dtype=np.float32))
+        return self._silence_feat
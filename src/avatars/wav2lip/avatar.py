@@ -16,6 +16,7 @@ import copy
 import queue
 from queue import Queue
 from threading import Thread, Event
+from functools import partial
 import torch.multiprocessing as mp
 
 
@@ -23,11 +24,15 @@ from src.avatars.wav2lip.audio_stream_handler import LipAudioStreamHandler
 import asyncio
 from av import AudioFrame, VideoFrame
 from src.avatars.wav2lip.models import Wav2Lip
-from src.avatars.base import BaseAvatar
+from src.avatars.base import BaseAvatar, wake_queue
+from src.avatars.inference_scheduler import get_inference_scheduler
+from src.avatars.inference_pipeline import run_inference_pipeline, mirror_index, to_pinned_tensor
+from src.avatars.avatar_store import open_avatar_bundle
 
 #from imgcache import ImgCache
 
 from tqdm import tqdm
+from src.utils import metrics
 from src.utils.logging import logger
 
 device = "cuda" if torch.cuda.is_available() else ("mps" if (hasattr(torch.backends, "mps") and torch.backends.mps.is_available()) else "cpu")
@@ -59,6 +64,11 @@ def load_avatar(avatar_id):
     full_imgs_path = f"{avatar_path}/full_imgs" 
     face_imgs_path = f"{avatar_path}/face_imgs" 
     coords_path = f"{avatar_path}/coords.pkl"
+
+    bundle = open_avatar_bundle(avatar_path)
+    if bundle is not None:
+        # 已编译的 avatar 包：只读 mmap，按需换页，多进程共享
+        return bundle.frames('full_imgs'),bundle.frames('face_imgs'),bundle.load_pickle('coords.pkl')
     
     with open(coords_path, 'rb') as f:
         coord_list_cycle = pickle.load(f)
@@ -80,6 +90,16 @@ def warm_up(batch_size,model,modelres):
     mel_batch = torch.ones(batch_size, 1, 80, 16).to(device)
     model(mel_batch, img_batch)
 
+@torch.no_grad()
+def forward(model,mel_batch,img_batch):
+    # CPU(锁页) tensor 输入 -> 模型前向 -> 留在显存上的输出，拷回由推理流水线的 download 阶段完成
+    img_batch = img_batch.to(device, non_blocking=True)
+    mel_batch = mel_batch.to(device, non_blocking=True)
+    return model(mel_batch, img_batch)
+
+def postprocess(pred):
+    return pred.transpose(0, 2, 3, 1) * 255.
+
 def read_imgs(img_list):
     frames = []
     logger.info('reading images...')
@@ -88,83 +108,28 @@ def read_imgs(img_list):
         frames.append(frame)
     return frames
 
-def __mirror_index(size, index):
-    #size = len(self.coord_list_cycle)
-    turn = index // size
-    res = index % size
-    if turn % 2 == 0:
-        return res
-    else:
-        return size - res - 1 
-
-def inference(quit_event,batch_size,face_list_cycle,audio_feat_queue,audio_out_queue,res_frame_queue,model):
-    
-    #model = load_model("./models/wav2lip.pth")
-    # input_face_list = glob.glob(os.path.join(face_imgs_path, '*.[jpJP][pnPN]*[gG]'))
-    # input_face_list = sorted(input_face_list, key=lambda x: int(os.path.splitext(os.path.basename(x))[0]))
-    # face_list_cycle = read_imgs(input_face_list)
-    
-    #input_latent_list_cycle = torch.load(latents_out_path)
+def prepare_batch(face_list_cycle,batch_size,mel_batch,index):
+    # 在预取线程中组好下一批输入
     length = len(face_list_cycle)
-    index = 0
-    count=0
-    counttime=0
-    logger.info('start inference')
-    while not quit_event.is_set():
-        starttime=time.perf_counter()
-        mel_batch = []
-        try:
-            mel_batch = audio_feat_queue.get(block=True, timeout=1)
-        except queue.Empty:
-            continue
-            
-        is_all_silence=True
-        audio_frames = []
-        for _ in range(batch_size*2):
-            frame,type,eventpoint = audio_out_queue.get()
-            audio_frames.append((frame,type,eventpoint))
-            if type==0:
-                is_all_silence=False
-
-        if is_all_silence:
-            for i in range(batch_size):
-                res_frame_queue.put((None,__mirror_index(length,index),audio_frames[i*2:i*2+2]))
-                index = index + 1
-        else:
-            # print('infer=======')
-            t=time.perf_counter()
-            img_batch = []
-            for i in range(batch_size):
-                idx = __mirror_index(length,index+i)
-                face = face_list_cycle[idx]
-                img_batch.append(face)
-            img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch)
-
-            img_masked = img_batch.copy()
-            img_masked[:, face.shape[0]//2:] = 0
-
-            img_batch = np.concatenate((img_masked, img_batch), axis=3) / 255.
-            mel_batch = np.reshape(mel_batch, [len(mel_batch), mel_batch.shape[1], mel_batch.shape[2], 1])
-            
-            img_batch = torch.FloatTensor(np.transpose(img_batch, (0, 3, 1, 2))).to(device)
-            mel_batch = torch.FloatTensor(np.transpose(mel_batch, (0, 3, 1, 2))).to(device)
-
-            with torch.no_grad():
-                pred = model(mel_batch, img_batch)
-            pred = pred.cpu().numpy().transpose(0, 2, 3, 1) * 255.
-
-            counttime += (time.perf_counter() - t)
-            count += batch_size
-            #_totalframe += 1
-            if count>=100:
-                logger.info(f"------actual avg infer fps:{count/counttime:.4f}")
-                count=0
-                counttime=0
-            for i,res_frame in enumerate(pred):
-                #self.__pushmedia(res_frame,loop,audio_track,video_track)
-                res_frame_queue.put((res_frame,__mirror_index(length,index),audio_frames[i*2:i*2+2]))
-                index = index + 1
-            #print('total batch time:',time.perf_counter()-starttime)            
+    img_batch = []
+    for i in range(batch_size):
+        idx = mirror_index(length,index+i)
+        face = face_list_cycle[idx]
+        img_batch.append(face)
+    img_batch, mel_batch = np.asarray(img_batch), np.asarray(mel_batch, dtype=np.float32)
+
+    img_masked = img_batch.copy()
+    img_masked[:, face.shape[0]//2:] = 0
+
+    img_batch = np.concatenate((img_masked, img_batch), axis=3).astype(np.float32) / 255.
+    img_batch = to_pinned_tensor(np.transpose(img_batch, (0, 3, 1, 2)))
+    mel_batch = to_pinned_tensor(mel_batch[:, None])
+    return mel_batch, img_batch
+
+def inference(quit_event,batch_size,face_list_cycle,audio_feat_queue,audio_out_queue,res_frame_queue,infer_fn,forward_metric=None):
+    run_inference_pipeline(quit_event,batch_size,len(face_list_cycle),audio_feat_queue,audio_out_queue,res_frame_queue,
+                           partial(prepare_batch,face_list_cycle,batch_size),infer_fn,postprocess,name='wav2lip',
+                           forward_metric=forward_metric)
     logger.info('lipreal inference processor stop')
 
 class Wav2LipAvatar(BaseAvatar):
@@ -183,6 +148,11 @@ class Wav2LipAvatar(BaseAvatar):
         #self.__loadavatar()
         self.model = model
         self.frame_list_cycle,self.face_list_cycle,self.coord_list_cycle = avatar
+        if config.model.shared_infer:
+            # 多会话共享同一个调度器，合并成一次前向
+            self.infer_fn = get_inference_scheduler(model, partial(forward, model), config, name='wav2lip').infer
+        else:
+            self.infer_fn = partial(forward, model)
 
         self.audio_stream = LipAudioStreamHandler(config, self)
         self.audio_stream.warm_up()
@@ -192,9 +162,9 @@ class Wav2LipAvatar(BaseAvatar):
     # def __del__(self):
     #     logger.info(f'lipreal({self.sessionid}) delete')
 
-    def paste_back_frame(self,pred_frame,idx:int):
+    def paste_back_frame(self,pred_frame,idx:int,combine_frame):
+        # combine_frame 已是背景帧（VideoFrame 平面视图），只写人脸框
         bbox = self.coord_list_cycle[idx]
-        combine_frame = copy.deepcopy(self.frame_list_cycle[idx])
         #combine_frame = copy.deepcopy(self.imagecache.get_img(idx))
         y1, y2, x1, x2 = bbox
         res_frame = cv2.resize(pred_frame.astype(np.uint8),(x2-x1,y2-y1))
@@ -213,7 +183,7 @@ class Wav2LipAvatar(BaseAvatar):
         infer_quit_event = Event()
         infer_thread = Thread(target=inference, args=(infer_quit_event,self.batch_size,self.face_list_cycle,
                                            self.audio_stream.feat_queue,self.audio_stream.output_queue,self.res_frame_queue,
-                                           self.model,))  #mp.Process
+                                           self.infer_fn,metrics.MODEL_FORWARD.labels(*metrics.session_labels(self))))  #mp.Process
         infer_thread.start()
         
         process_quit_event = Event()
@@ -234,9 +204,7 @@ class Wav2LipAvatar(BaseAvatar):
             # if video_track._queue.qsize()>=2*self.config.model.batch_size:
             #     print('sleep qsize=',video_track._queue.qsize())
             #     time.sleep(0.04*video_track._queue.qsize()*0.8)
-            if video_track and video_track._queue.qsize()>=5:
-                logger.debug('sleep qsize=%d',video_track._queue.qsize())
-                time.sleep(0.04*video_track._queue.qsize()*0.8)
+            self.pacer.pace(video_track, self.batch_size)
                 
             # delay = _starttime+_totalframe*0.04-time.perf_counter() #40ms
             # if delay > 0:
@@ -244,9 +212,12 @@ class Wav2LipAvatar(BaseAvatar):
         #self.render_event.clear() #end infer process render
         logger.info('lipreal thread stop')
 
+        # 退出信号之后立即唤醒阻塞在队列上的线程，不必等 get 超时
         infer_quit_event.set()
+        wake_queue(self.audio_stream.feat_queue)
         infer_thread.join()
 
         process_quit_event.set()
+        wake_queue(self.res_frame_queue)
         process_thread.join()
             
\ No newline at end of file
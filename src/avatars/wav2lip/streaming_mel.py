@@ -0,0 +1,130 @@
+"""Wav2Lip 流式 Mel 特征
+
+LipAudioStreamHandler 原来每步都对整个窗口（左 stride + 新的 2*batch_size 帧 + 右 stride）
+做一次 preemphasis + librosa.stft + mel，得到的 mel 帧大部分没有被 mel_chunks 用到，
+与上一步重叠的部分也全部重算。
+
+这里只计算 mel_chunks 实际引用到的帧，并按帧在音频流中的绝对位置缓存已算过的列，
+下一步窗口里位置相同的帧直接复用。输出与 audio.melspectrogram 切块后的结果一致：
+
+- preemphasis 是一阶 FIR，y[n] 只依赖 x[n-1]，窗口内的样本已经带着所需的上文，
+  只有窗口第 0 个样本与批量实现一样按 y[0]=x[0] 处理；
+- stft 按 librosa 的 center=True 分帧（边缘零填充），hann 窗，逐帧 rfft。
+
+窗口每步前移 2*batch_size*chunk 个采样，只有它是 hop_size 的整数倍时（如 batch_size 为 5 的倍数），
+相邻两步的帧网格才对齐、缓存才能命中；否则退化为只算被引用的帧。
+"""
+import numpy as np
+from scipy import signal
+
+from src.avatars.wav2lip import audio
+from src.avatars.wav2lip.hparams import hparams as hp
+
+MEL_STEP_SIZE = 16
+
+
+class StreamingMelExtractor:
+    """按需计算并缓存 mel 帧，产出与批量实现相同的 16 帧 mel 窗口"""
+
+    def __init__(self, fps: int, stride_left_size: int, stride_right_size: int, chunk: int):
+        self.fps = fps
+        self.stride_left_size = stride_left_size
+        self.stride_right_size = stride_right_size
+        self.chunk = chunk
+        self.hop = audio.get_hop_size()
+        self.n_fft = hp.n_fft
+        window = signal.get_window('hann', hp.win_size, fftbins=True)
+        # 与 librosa 一致，窗长不足 n_fft 时居中补零
+        pad = (self.n_fft - hp.win_size) // 2
+        self.window = np.pad(window, (pad, self.n_fft - hp.win_size - pad))
+        # 帧中心在音频流中的绝对采样位置 -> mel 列
+        self._cache = {}
+
+    def reset(self):
+        self._cache.clear()
+
+    def _needed_frames(self, num_frames: int, num_mel: int):
+        left = max(0, self.stride_left_size * 80 / 50)
+        mel_idx_multiplier = 80. * 2 / self.fps
+        starts = []
+        i = 0
+        while i < (num_frames - self.stride_left_size - self.stride_right_size) / 2:
+            start_idx = int(left + i * mel_idx_multiplier)
+            if start_idx + MEL_STEP_SIZE > num_mel:
+                start_idx = num_mel - MEL_STEP_SIZE
+            starts.append(start_idx)
+            i += 1
+        return starts
+
+    def _preemphasis(self, wav: np.ndarray, begin: int, end: int) -> np.ndarray:
+        """只对 wav[begin:end] 做 preemphasis，结果与整段 lfilter 相同"""
+        x = wav[begin:end].astype(np.float64)
+        if not hp.preemphasize:
+            return x
+        y = x.copy()
+        y[1:] -= hp.preemphasis * x[:-1]
+        if begin > 0:
+            y[0] -= hp.preemphasis * wav[begin - 1]
+        return y
+
+    def _compute(self, wav: np.ndarray, frames) -> np.ndarray:
+        """计算窗口内若干 stft 帧的 mel 列，frames 为帧下标（升序）"""
+        half = self.n_fft // 2
+        lo = max(0, frames[0] * self.hop - half)
+        hi = min(len(wav), frames[-1] * self.hop + half)
+        y = self._preemphasis(wav, lo, hi)
+        # center=True：帧 t 覆盖 [t*hop - n_fft/2, t*hop + n_fft/2)，越界部分零填充
+        pad_left = half - min(half, frames[0] * self.hop)
+        pad_right = max(0, frames[-1] * self.hop + half - len(wav))
+        y = np.pad(y, (pad_left, pad_right))
+        base = frames[0] * self.hop - half
+        idx = np.asarray(frames) * self.hop - half - base
+        segs = np.stack([y[s:s + self.n_fft] for s in idx]) * self.window
+        spec = np.abs(np.fft.rfft(segs, n=self.n_fft, axis=1)).T
+        S = audio._amp_to_db(audio._linear_to_mel(spec)) - hp.ref_level_db
+        if hp.signal_normalization:
+            return audio._normalize(S)
+        return S
+
+    def __call__(self, wav: np.ndarray, offset: int = None):
+        """
+        Args:
+            wav: 拼接后的音频窗口 [N * chunk]
+            offset: 窗口首个采样在音频流中的绝对位置；None 表示不使用缓存
+        Returns:
+            mel_chunks，与 LipAudioStreamHandler 原批量实现相同
+        """
+        num_frames = len(wav) // self.chunk
+        num_mel = 1 + len(wav) // self.hop
+        starts = self._needed_frames(num_frames, num_mel)
+        if not starts:
+            return []
+        needed = sorted({t for s in starts for t in range(s, s + MEL_STEP_SIZE)})
+
+        columns = {}
+        missing = []
+        for t in needed:
+            # 窗口边缘受零填充 / y[0]=x[0] 影响的帧与位置无关，不入缓存
+            interior = t * self.hop > self.n_fft // 2 and t * self.hop + self.n_fft // 2 <= len(wav)
+            key = offset + t * self.hop if offset is not None and interior else None
+            col = self._cache.get(key) if key is not None else None
+            if col is None:
+                missing.append((t, key))
+            else:
+                columns[t] = col
+        if missing:
+            mel = self._compute(wav, [t for t, _ in missing])
+            for j, (t, key) in enumerate(missing):
+                columns[t] = mel[:, j]
+                if key is not None:
+                    self._cache[key] = mel[:, j]
+
+        if offset is not None:
+            # 只保留落在下一步窗口内的帧
+            keep_from = offset + len(wav) - (self.stride_left_size + self.stride_right_size) * self.chunk
+            self._cache = {k: v for k, v in self._cache.items() if k >= keep_from}
+
+        mel_chunks = []
+        for s in starts:
+            mel_chunks.append(np.stack([columns[t] for t in range(s, s + MEL_STEP_SIZE)], axis=1))
+        return mel_chunks
@@ -6,7 +6,7 @@ from pathlib import Path
 from typing import Optional, Dict, Any
 from .schema import (
     Config, AppConfig, ModelConfig, TTSConfig, ASRConfig, LLMConfig,
-    AudioConfig, VideoConfig, CustomVideoConfig, ERNeRfConfig, TalkingGaussianConfig
+    AudioConfig, VideoConfig, PacingConfig, AdmissionConfig, CustomVideoConfig, ERNeRfConfig, TalkingGaussianConfig
 )
 
 
@@ -95,6 +95,8 @@ def dict_to_config(config_dict: Dict) -> Config:
     llm_config = LLMConfig(**config_dict.get('llm', {}))
     audio_config = AudioConfig(**config_dict.get('audio', {}))
     video_config = VideoConfig(**config_dict.get('video', {}))
+    pacing_config = PacingConfig(**config_dict.get('pacing', {}))
+    admission_config = AdmissionConfig(**config_dict.get('admission', {}))
     custom_video_config = CustomVideoConfig(**config_dict.get('custom_video', {}))
 
     return Config(
@@ -105,6 +107,8 @@ def dict_to_config(config_dict: Dict) -> Config:
         llm=llm_config,
         audio=audio_config,
         video=video_config,
+        pacing=pacing_config,
+        admission=admission_config,
         custom_video=custom_video_config,
     )
 
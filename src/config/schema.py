@@ -15,7 +15,14 @@ class AppConfig:
     """应用配置"""
     listenport: int = 8010
     listenhost: str = "0.0.0.0"  # 监听地址：0.0.0.0 允许外部访问，127.0.0.1 仅本地
-    max_session: int = 1
+    max_session: int = 1  # 同时在线会话上限，准入控制估算的容量不会超过该值
+    session_pool: int = 0  # 预热会话池大小，0 为关闭（每次 /offer 现场创建）
+    session_pool_recycle: bool = True  # 会话断开后重置放回池中，而不是丢弃重建
+    # 多进程：workers > 1 时主进程只做路由，每个 worker 进程各自加载模型
+    workers: int = 1
+    worker_port: int = 0  # 第一个 worker 的本地端口，0 为 listenport + 1，之后依次递增
+    worker_gpus: List[int] = field(default_factory=list)  # 按 worker 序号轮流分配的 GPU，空为不指定
+    metrics: bool = True  # 记录各阶段耗时直方图，GET /metrics 输出 Prometheus 文本格式
     
     # SSL/HTTPS 配置
     ssl: bool = False  # 主开关：true 启用 HTTPS，false 使用 HTTP
@@ -139,6 +146,15 @@ class ModelConfig:
     avatar_id: str = "avator_1"
     batch_size: int = 16
     model_path: str = "./models"
+
+    # 跨会话批量推理（wav2lip / musetalk / ultralight）
+    shared_infer: bool = False  # 多会话共享一次合并前向
+    infer_max_batch: int = 64  # 合并前向的最大样本数
+    infer_max_wait_ms: float = 10.0  # 凑批最长等待时间
+
+    # MuseTalk whisper 流式特征：短窗口 encoder + 重叠 log-mel 复用
+    whisper_stream: bool = False
+    whisper_stream_window_s: float = 2.0  # encoder 输入的固定窗口长度（秒）
     
     # 模型专属配置
     ernerf: ERNeRfConfig = field(default_factory=ERNeRfConfig)
@@ -148,10 +164,18 @@ class ModelConfig:
 @dataclass
 class TTSConfig:
     """TTS 配置"""
-    type: str = "edgetts"  # edgetts | azuretts | fishtts | gpt-sovits | cosyvoice | tencent | doubao | indextts2 | xtts
+    type: str = "edgetts"  # edgetts | azuretts | fishtts | gpt-sovits | cosyvoice | tencent | doubao | indextts2 | xtts | mock
     ref_file: str = "zh-CN-YunxiaNeural"
     ref_text: Optional[str] = None
     tts_server: str = "http://127.0.0.1:9880"
+    lookahead: int = 2  # 同时合成的句子数（含当前句），1 为逐句串行
+    server_concurrency: int = 0  # 自建服务（tts_server）同时处理的请求数上限，所有会话共享，0 不限制
+    cache_mb: float = 64  # 合成结果内存缓存上限（MB），0 关闭缓存
+    cache_dir: Optional[str] = None  # 磁盘缓存目录，为空时只用内存
+    cache_disk_mb: float = 512  # 磁盘缓存上限（MB）
+    cache_warmup: List[str] = field(default_factory=list)  # 启动时预先合成的固定话术
+    # mock 引擎参数：first_byte_ms / chunk_ms / rtf / sample_rate / chars_per_second
+    mock: Dict[str, Any] = field(default_factory=dict)
 
 
 @dataclass
@@ -170,6 +194,9 @@ class LLMConfig:
     api_key: str = ""
     base_url: str = "https://dashscope.aliyuncs.com/compatible-mode/v1"
     model: str = "qwen-plus"
+    adaptive_chunking: bool = True  # 首段提前送 TTS，之后逐段加长；False 为等标点且满 10 字
+    chunk_language: str = "auto"  # auto | cjk | latin
+    chunk_policy: Dict[str, Dict[str, Any]] = field(default_factory=dict)  # 按语言覆盖 src/llm/base.py 的 CHUNK_POLICIES
 
 
 @dataclass
@@ -191,6 +218,30 @@ class VideoConfig:
     fps: int = 25
 
 
+@dataclass
+class PacingConfig:
+    """WebRTC 输出节奏控制"""
+    target_buffer_ms: float = 0  # 视频队列目标缓冲，0 表示按 batch 时长自动确定
+    max_buffer_ms: float = 1500  # 超过后丢弃静音帧
+    kp: float = 0.5  # 比例系数
+    ki: float = 0.1  # 积分系数
+    drop_silence: bool = True  # 积压时丢弃静音帧
+    duplicate: bool = True  # 欠载时重复上一帧
+
+
+@dataclass
+class AdmissionConfig:
+    """新会话准入控制（按实测的单会话负载、帧率和显存估算容量）"""
+    enabled: bool = True
+    target_load: float = 0.85  # 预测加入新会话后的负载上限（1 为刚好跟上实时）
+    min_fps_ratio: float = 0.9  # 任一会话产出帧率低于 video.fps * ratio 时视为已降级
+    max_lag_ms: float = 1000  # 任一会话音频到视频发出的延迟超过该值时视为已降级
+    gpu_reserve_mb: float = 1024  # 为显存碎片 / 峰值预留的空间
+    window_s: float = 60  # 负载取最近 window_s 秒内的峰值，避免按静默时段的低负载放入过多会话
+    queue_timeout_s: float = 0  # >0 时满载的 /offer 排队等待，0 为立即拒绝
+    retry_after_s: int = 5  # 拒绝时返回的 Retry-After
+
+
 @dataclass
 class CustomVideoConfig:
     """自定义视频配置"""
@@ -207,6 +258,8 @@ class Config:
     llm: LLMConfig = field(default_factory=LLMConfig)
     audio: AudioConfig = field(default_factory=AudioConfig)
     video: VideoConfig = field(default_factory=VideoConfig)
+    pacing: PacingConfig = field(default_factory=PacingConfig)
+    admission: AdmissionConfig = field(default_factory=AdmissionConfig)
     custom_video: CustomVideoConfig = field(default_factory=CustomVideoConfig)
     
     # 其他动态配置
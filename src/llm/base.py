@@ -2,10 +2,14 @@
 
 from __future__ import annotations
 
+import math
+import threading
 import time
 from abc import ABC, abstractmethod
-from typing import TYPE_CHECKING, Generator, Optional
+from dataclasses import dataclass, replace
+from typing import TYPE_CHECKING, Callable, Generator, Optional
 
+from src.utils import metrics
 from src.utils.logging import logger
 
 if TYPE_CHECKING:
@@ -49,6 +53,167 @@ class TextStreamProcessor:
             callback(self.buffer)
             self.buffer = ""
 
+    def cancel(self) -> None:
+        """回复中途出错时调用，丢弃缓冲"""
+        self.buffer = ""
+
+
+@dataclass
+class ChunkPolicy:
+    """
+    自适应分段参数，长度单位：CJK 按字数，拉丁文本按词数。
+    首段尽早送出让数字人先开口，之后逐段加长，句子越长 TTS 的韵律越自然。
+    """
+    delimiters: str
+    first_min: int  # 首段遇到标点时的最小长度
+    first_max: int  # 首段迟迟没有标点时，达到该长度就在词边界切出
+    first_deadline_ms: float  # 首个 token 之后超过该时间，首段满 first_min 即送出（不等标点）
+    min_length: int  # 第二段的最小长度
+    max_length: int  # 最小长度增长的上限
+    growth: float  # 每送出一段，最小长度乘以该系数
+
+
+CHUNK_POLICIES = {
+    "cjk": ChunkPolicy(SENTENCE_DELIMITERS + "?、", first_min=2, first_max=12, first_deadline_ms=400,
+                       min_length=10, max_length=40, growth=1.5),
+    "latin": ChunkPolicy(",.!?;:", first_min=2, first_max=8, first_deadline_ms=400,
+                         min_length=6, max_length=30, growth=1.5),
+}
+
+
+def _is_cjk(char: str) -> bool:
+    return "\u3040" <= char <= "\u30ff" or "\u3400" <= char <= "\u9fff" or "\uac00" <= char <= "\ud7af"
+
+
+def count_units(text: str, delimiters: str = "") -> int:
+    """混合文本的长度：CJK 按字计数，拉丁文本按词计数（连续的非空白、非 CJK、非标点字符算一个词）"""
+    units = 0
+    in_word = False
+    for char in text:
+        if _is_cjk(char):
+            units += 1
+            in_word = False
+        elif char.isspace() or char in delimiters:
+            in_word = False
+        elif not in_word:
+            units += 1
+            in_word = True
+    return units
+
+
+class AdaptiveTextStreamProcessor(TextStreamProcessor):
+    """
+    自适应分段：首段按时间 / 长度阈值提前送给 TTS，之后的分段逐步加长。
+
+    长度按 count_units 计算，中英混排时 CJK 字和拉丁词一起计数。language 为 auto 时
+    每一段按当前缓冲里是否有 CJK 字符选择 cjk / latin 参数，而不是由首个 token 决定整条回复。
+    首段的 first_deadline_ms 由定时器检查，LLM 停顿、没有新 token 时也会按时送出。
+    process_chunk / flush 与定时器在不同线程，状态由锁保护。
+    """
+
+    def __init__(self, language: str = "auto", overrides: Optional[dict] = None):
+        super().__init__()
+        self.language = language
+        self.overrides = overrides or {}
+        self.policies = {
+            name: replace(policy, **self.overrides.get(name, {})) for name, policy in CHUNK_POLICIES.items()
+        }
+        self.start_time: Optional[float] = None
+        # 首段送出的时间（相对首个 token），用于定位首包延迟
+        self.first_fragment_ms: Optional[float] = None
+        self.sent = 0
+        self._lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+
+    def _policy(self, text: str) -> ChunkPolicy:
+        language = self.language
+        if language == "auto":
+            language = "cjk" if any(_is_cjk(c) for c in text) else "latin"
+        return self.policies[language]
+
+    def _min_length(self, policy: ChunkPolicy) -> int:
+        """第 2 段起的最小长度：从 min_length 开始每段乘以 growth，不超过 max_length"""
+        if self.sent == 0:
+            return policy.first_min
+        return min(math.ceil(policy.min_length * policy.growth ** (self.sent - 1)), policy.max_length)
+
+    def _emit(self, fragment: str, callback) -> None:
+        if not fragment.strip():
+            return
+        if self.sent == 0:
+            self.first_fragment_ms = (time.perf_counter() - self.start_time) * 1000
+            self._cancel_timer()
+        self.sent += 1
+        callback(fragment)
+
+    def _emit_first_early(self, policy: ChunkPolicy, callback) -> None:
+        # 优先在已有的标点后切；否则切在最后一个 CJK 字之后或空格处，避免把拉丁单词切成两半
+        buffer = self.buffer
+        cut = max(buffer.rfind(d) for d in policy.delimiters) + 1
+        if cut <= 0:
+            for i in range(len(buffer) - 1, -1, -1):
+                if _is_cjk(buffer[i]):
+                    cut = i + 1
+                    break
+                if buffer[i].isspace():
+                    cut = i
+                    break
+        if cut <= 0:
+            return
+        self.buffer = buffer[cut:].lstrip()
+        self._emit(buffer[:cut], callback)
+
+    def _check_first(self, callback) -> None:
+        if self.sent != 0 or not self.buffer:
+            return
+        policy = self._policy(self.buffer)
+        units = count_units(self.buffer, policy.delimiters)
+        elapsed_ms = (time.perf_counter() - self.start_time) * 1000
+        if units >= policy.first_max or (elapsed_ms >= policy.first_deadline_ms and units >= policy.first_min):
+            self._emit_first_early(policy, callback)
+
+    def _on_deadline(self, callback) -> None:
+        with self._lock:
+            self._timer = None
+            self._check_first(callback)
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def process_chunk(self, text: str, callback: Callable[[str], None]) -> None:
+        if not text:
+            return
+        with self._lock:
+            if self.start_time is None:
+                self.start_time = time.perf_counter()
+                deadline_s = self._policy(text).first_deadline_ms / 1000
+                self._timer = threading.Timer(deadline_s, self._on_deadline, args=(callback,))
+                self._timer.daemon = True
+                self._timer.start()
+
+            for char in text:
+                self.buffer += char
+                policy = self._policy(self.buffer)
+                if char in policy.delimiters and count_units(self.buffer, policy.delimiters) >= self._min_length(policy):
+                    fragment, self.buffer = self.buffer, ""
+                    self._emit(fragment, callback)
+
+            self._check_first(callback)
+
+    def flush(self, callback: Callable[[str], None]) -> None:
+        with self._lock:
+            self._cancel_timer()
+            if self.buffer:
+                fragment, self.buffer = self.buffer, ""
+                self._emit(fragment, callback)
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancel_timer()
+            self.buffer = ""
+
 
 class BaseLLM(ABC):
     """所有 LLM 引擎的基类"""
@@ -73,6 +238,12 @@ class BaseLLM(ABC):
             logger.error(f"Error loading prompt: {e}, using default")
             return DEFAULT_SYSTEM_PROMPT
     
+    def _create_text_processor(self) -> TextStreamProcessor:
+        llm_config = getattr(self.config, "llm", None)
+        if llm_config is None or not llm_config.adaptive_chunking:
+            return TextStreamProcessor()
+        return AdaptiveTextStreamProcessor(llm_config.chunk_language, llm_config.chunk_policy)
+
     @abstractmethod
     def chat_stream(self, message: str, system_prompt: Optional[str] = None) -> Generator[str, None, None]:
         """流式调用 LLM，子类必须实现"""
@@ -81,10 +252,12 @@ class BaseLLM(ABC):
     def generate_response(self, message: str, avatar_stream: Optional["BaseAvatar"] = None) -> str:
         """生成完整响应并推送到 avatar"""
         start_time = time.perf_counter()
-        text_processor = TextStreamProcessor()
+        text_processor = self._create_text_processor()
         full_response = ""
         
         target_avatar = avatar_stream or self.parent
+        tts = getattr(target_avatar, "tts", None)
+        labels = metrics.session_labels(target_avatar) if target_avatar is not None else ("", "")
         
         def send_to_avatar(text: str) -> None:
             if target_avatar:
@@ -98,7 +271,11 @@ class BaseLLM(ABC):
                 if first_chunk:
                     first_chunk_time = time.perf_counter()
                     logger.info(f"Time to first chunk: {first_chunk_time - start_time:.3f}s")
+                    metrics.LLM_FIRST_TOKEN.labels(*labels).observe(first_chunk_time - start_time)
                     first_chunk = False
+                    if tts is not None:
+                        # TTS 输出本次回复的第一帧时统计 首 token -> 首帧音频 的延迟
+                        tts.mark_reply_start(first_chunk_time)
                 
                 full_response += chunk
                 
@@ -110,9 +287,14 @@ class BaseLLM(ABC):
             
             total_time = time.perf_counter()
             logger.info(f"Total LLM response time: {total_time - start_time:.3f}s")
+            metrics.LLM_RESPONSE.labels(*labels).observe(total_time - start_time)
+            if getattr(text_processor, "first_fragment_ms", None) is not None:
+                logger.info(f"First token to first TTS fragment: {text_processor.first_fragment_ms:.0f}ms, "
+                            f"fragments: {text_processor.sent}")
             
             return full_response
             
         except Exception as e:
+            text_processor.cancel()
             logger.error(f"Error in generate_response: {e}")
             raise
@@ -0,0 +1,198 @@
+"""
+新会话准入控制
+
+会话不设上限地加入时，GPU / CPU 饱和后所有会话的帧率会一起崩掉。这里按实测的单会话开销估算容量：
+
+- 负载：PacingController.load（产出一批帧的耗时 / 这批帧的时长），多个会话共享 GPU 时
+  负载近似随会话数线性增长，按最近 window_s 秒的峰值预测再加一个会话后的负载；
+- 降级：已有会话产出帧率低于 video.fps * min_fps_ratio 或音视频延迟超过 max_lag_ms 时不再接入；
+- 显存：启动时记录基线占用，按（当前占用 - 基线）/ 已构建会话数 估算单会话显存，预留 gpu_reserve_mb；
+- 上限：不超过 app.max_session。
+
+满载时 /offer 立即返回 503 + Retry-After，或在 queue_timeout_s 内按先来先到排队。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from collections import deque
+
+import torch
+
+from src.utils.logging import logger
+
+_SAMPLE_INTERVAL_S = 1.0
+_SETTLE_S = 5.0  # 新会话开始渲染后多久才参与降级判断（帧率 / 延迟统计需要时间收敛）
+_QUEUE_POLL_S = 0.2
+
+
+def _gpu_memory():
+    """返回 (已用, 空闲) 字节数，没有 CUDA 时返回 None。"""
+    if not torch.cuda.is_available():
+        return None
+    free, total = torch.cuda.mem_get_info()
+    return total - free, free
+
+
+class AdmissionController:
+    def __init__(self, config, sessions: dict, pool=None):
+        self.config = config
+        self.opt = config.admission
+        self.sessions = sessions  # state.avatar_streams，包括正在建立中的会话（值为 None）
+        self.pool = pool
+        self._lock = threading.Lock()
+        # 采样线程和 /offer（事件循环）都会调用 sample，_seen / _loads 只能串行修改
+        self._sample_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._waiters: deque = deque()
+
+        self._baseline_used = None
+        self._loads: deque = deque()  # (时间, 所有会话中的最大负载)
+        self._seen: dict = {}  # sessionid -> 开始渲染的时间
+        self._sampled_at = 0.
+        self._capacity = config.app.max_session
+        self._limits = {"max_session": config.app.max_session}
+        self._snapshot = {}
+
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def start(self) -> None:
+        """在构建任何会话之前调用，记录显存基线并启动后台采样。"""
+        mem = _gpu_memory()
+        self._baseline_used = mem[0] if mem else None
+        self._thread = threading.Thread(target=self._run, name='admission', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.wait(_SAMPLE_INTERVAL_S):
+            try:
+                self.sample()
+            except Exception:
+                logger.exception('[admission] 采样失败')
+
+    def sample(self) -> None:
+        with self._sample_lock:
+            self._sample()
+
+    def _sample(self) -> None:
+        now = time.monotonic()
+        opt = self.opt
+        rendering = {}
+        for sessionid, avatar_stream in list(self.sessions.items()):
+            if avatar_stream is not None and avatar_stream.pacer.fps > 0:
+                rendering[sessionid] = avatar_stream.pacer.stats()
+        for sessionid in list(self._seen):
+            if sessionid not in rendering:
+                del self._seen[sessionid]
+        for sessionid in rendering:
+            self._seen.setdefault(sessionid, now)
+
+        n = len(rendering)
+        if n:
+            self._loads.append((now, max(s['load'] for s in rendering.values())))
+        while self._loads and now - self._loads[0][0] > opt.window_s:
+            self._loads.popleft()
+        peak_load = max((load for _, load in self._loads), default=0.)
+
+        limits = {"max_session": self.config.app.max_session}
+        if n and peak_load > 0:
+            limits["load"] = int(n * opt.target_load / peak_load)
+
+        min_fps = self.config.video.fps * opt.min_fps_ratio
+        degraded = [
+            sessionid for sessionid, s in rendering.items()
+            if now - self._seen[sessionid] >= _SETTLE_S and (s['fps'] < min_fps or s['lag_ms'] > opt.max_lag_ms)
+        ]
+        if degraded:
+            limits["degraded"] = n
+
+        per_session_mb = gpu_free_mb = None
+        mem = _gpu_memory()
+        if mem is not None and self._baseline_used is not None:
+            used, free = mem
+            gpu_free_mb = free / 2**20
+            built = sum(1 for s in self.sessions.values() if s is not None)
+            if self.pool is not None:
+                built += self.pool.stats()["idle"]
+            if built:
+                per_session_mb = max(used - self._baseline_used, 0) / built / 2**20
+            headroom_mb = gpu_free_mb - opt.gpu_reserve_mb
+            if headroom_mb <= 0:
+                limits["gpu_memory"] = n
+            elif per_session_mb:
+                limits["gpu_memory"] = n + int(headroom_mb / per_session_mb)
+
+        bottleneck = min(limits, key=limits.get)
+        with self._lock:
+            if limits[bottleneck] != self._capacity:
+                logger.info(f'[admission] 容量 {self._capacity} -> {limits[bottleneck]} ({bottleneck})')
+            self._capacity = limits[bottleneck]
+            self._limits = limits
+            self._sampled_at = now
+            self._snapshot = {
+                "bottleneck": bottleneck,
+                "rendering": n,
+                "peak_load": round(peak_load, 3),
+                "min_fps": round(min((s['fps'] for s in rendering.values()), default=0.), 1),
+                "max_lag_ms": round(max((s['lag_ms'] for s in rendering.values()), default=0.), 1),
+                "degraded_sessions": degraded,
+                "gpu_free_mb": round(gpu_free_mb, 1) if gpu_free_mb is not None else None,
+                "gpu_mb_per_session": round(per_session_mb, 1) if per_session_mb is not None else None,
+            }
+
+    def try_admit(self) -> bool:
+        if not self.opt.enabled:
+            return True
+        if time.monotonic() - self._sampled_at > _SAMPLE_INTERVAL_S:
+            self.sample()
+        with self._lock:
+            return len(self.sessions) < self._capacity
+
+    async def admit(self) -> bool:
+        """/offer 调用：返回 True 时调用方必须在下一次 await 之前登记会话。"""
+        if not self._waiters and self.try_admit():
+            self.admitted += 1
+            return True
+        if self.opt.queue_timeout_s <= 0:
+            self.rejected += 1
+            return False
+        token = object()
+        self._waiters.append(token)
+        deadline = time.monotonic() + self.opt.queue_timeout_s
+        try:
+            while time.monotonic() < deadline:
+                await asyncio.sleep(_QUEUE_POLL_S)
+                if self._waiters[0] is token and self.try_admit():
+                    self.admitted += 1
+                    self.queued += 1
+                    return True
+        finally:
+            self._waiters.remove(token)
+        self.rejected += 1
+        return False
+
+    @property
+    def retry_after(self) -> int:
+        return self.opt.retry_after_s
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.opt.enabled,
+                "capacity": self._capacity,
+                "sessions": len(self.sessions),
+                "limits": dict(self._limits),
+                **self._snapshot,
+                "waiting": len(self._waiters),
+                "admitted": self.admitted,
+                "queued": self.queued,
+                "rejected": self.rejected,
+            }
@@ -10,11 +10,15 @@ import json
 import argparse
 import torch.multiprocessing as mp
 
+from src.utils import metrics
 from src.utils.logging import logger
 from src.config.loader import load_config
 from src.avatars.factory import prepare_avatar_model
 from src.server.state import state
+from src.server.session_pool import SessionPool
+from src.server.admission import AdmissionController
 from src.server.server import create_app, run_server
+from src.server.supervisor import run_supervisor
 
 
 def main():
@@ -33,11 +37,32 @@ def main():
         default="config/config.yaml",
         help="path to config file (e.g., config/config.yaml)"
     )
+    parser.add_argument(
+        '--worker',
+        type=int,
+        default=None,
+        help="worker index, set by the supervisor when app.workers > 1"
+    )
     args = parser.parse_args()
     
     # 加载配置
     state.config = load_config(config_file=args.config)
     logger.info(f"已加载配置: {state.config}")
+    metrics.enabled = state.config.app.metrics
+    
+    # 多进程模式：主进程不加载模型，只启动 worker 并转发请求
+    if args.worker is None and state.config.app.workers > 1:
+        run_supervisor(state.config, args.config)
+        return
+    if args.worker is not None:
+        # worker 只对主进程提供服务
+        app_config = state.config.app
+        state.worker_index = args.worker
+        state.num_workers = app_config.workers
+        app_config.listenport = (app_config.worker_port or app_config.listenport + 1) + args.worker
+        app_config.listenhost = '127.0.0.1'
+        app_config.ssl = False
+        app_config.ssl_cert = app_config.ssl_key = None
     
     # 加载自定义视频配置
     state.config.customopt = []
@@ -50,6 +75,13 @@ def main():
     state.model, state.avatar = prepare_avatar_model(state.config)
     logger.info("模型加载完成")
     
+    # 后台预热会话池，/offer 直接取用
+    state.session_pool = SessionPool(state.config, state.model, state.avatar)
+    # 准入控制在构建会话之前启动，记录显存基线
+    state.admission = AdmissionController(state.config, state.avatar_streams, state.session_pool)
+    state.admission.start()
+    state.session_pool.start()
+    
     # 创建并运行应用
     app = create_app()
     run_server(app, state.config)
@@ -0,0 +1,144 @@
+"""
+会话生命周期
+
+连接断开（failed / closed）、建连超时或服务关闭时，按固定顺序回收一个会话的全部资源：
+
+1. 从 state 中移除会话和 RTCPeerConnection；
+2. 停止 HumanPlayer 的音视频轨道，join 渲染线程（推理、帧处理线程随之退出，TTS 线程收到同一个 quit_event）。
+   先于 pc.close() 在线程池中完成，否则 aiortc 关闭 sender 时会在事件循环里 join 渲染线程；
+3. 删除该会话的 LLM 实例（对话历史）；
+4. 放回会话池（reset_session），或者 BaseAvatar.close()：结束录制、等待 TTS 线程退出、
+   关闭跨进程队列、释放自定义动作素材；
+5. 关闭 RTCPeerConnection，删除该会话的 /metrics 序列。
+
+回收在线程池中执行，同一会话重复触发只回收一次。/health 的 lifecycle 中给出会话计数、
+回收耗时以及进程 RSS / 线程数，配合 scripts/soak_sessions.py 检查长时间运行后是否泄漏。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from src.llm.service import remove_session as remove_llm_session
+from src.server.state import state
+from src.utils import metrics
+from src.utils.logging import logger
+
+_CONNECT_TIMEOUT_S = 30  # offer 之后迟迟没有建立连接的会话按断开处理
+_HISTORY = 1000
+
+
+def process_stats() -> dict:
+    """当前进程的常驻内存和线程数"""
+    try:
+        with open('/proc/self/statm') as f:
+            rss = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        # 没有 /proc 时（macOS）退化为峰值 RSS，单位为字节
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {"rss_mb": round(rss / 2**20, 1), "threads": threading.active_count()}
+
+
+@dataclass
+class _Session:
+    sessionid: int
+    avatar_stream: object
+    pc: object
+    player: object
+    opened: float = field(default_factory=time.perf_counter)
+    watchdog: asyncio.Task | None = None
+
+
+class SessionLifecycle:
+    def __init__(self):
+        self._sessions: dict[int, _Session] = {}
+        self.opened = 0
+        self.closed = 0
+        self.recycled = 0
+        self.stuck_threads = 0  # 回收后仍未退出的 TTS 线程
+        self.closing = 0  # 正在回收的会话
+        self._close_ms: deque[float] = deque(maxlen=_HISTORY)
+
+    def open(self, sessionid: int, avatar_stream, pc, player) -> None:
+        session = _Session(sessionid, avatar_stream, pc, player)
+        session.watchdog = asyncio.ensure_future(self._connect_watchdog(session))
+        self._sessions[sessionid] = session
+        self.opened += 1
+
+    async def _connect_watchdog(self, session: _Session) -> None:
+        await asyncio.sleep(_CONNECT_TIMEOUT_S)
+        if session.pc.connectionState != "connected":
+            logger.warning(f'[lifecycle] session {session.sessionid} 建连超时 ({session.pc.connectionState})')
+            await self.close(session.sessionid)
+
+    async def close(self, sessionid: int) -> None:
+        """回收会话，可以重复调用"""
+        session = self._sessions.pop(sessionid, None)
+        if session is None:
+            return
+        start = time.perf_counter()
+        if session.watchdog is not None and session.watchdog is not asyncio.current_task():
+            session.watchdog.cancel()
+        state.remove_session(sessionid)
+        state.remove_peer_connection(session.pc)
+        self.closing += 1
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self._teardown, session)
+            await session.pc.close()
+            metrics.remove_session(sessionid)
+        finally:
+            self.closing -= 1
+        close_ms = (time.perf_counter() - start) * 1000
+        self._close_ms.append(close_ms)
+        self.closed += 1
+        logger.info(f'[lifecycle] session {sessionid} closed in {close_ms:.0f}ms, '
+                    f'lived {time.perf_counter() - session.opened:.0f}s, {process_stats()}')
+
+    def _teardown(self, session: _Session) -> None:
+        avatar_stream = session.avatar_stream
+        try:
+            # 轨道全部停止后渲染线程收到退出信号，在这里（线程池中）等它结束
+            session.player.audio.stop()
+            session.player.video.stop()
+            session.player.join()
+        except Exception:
+            logger.exception(f'[lifecycle] session {session.sessionid} 停止渲染失败')
+        remove_llm_session(session.sessionid)
+        if avatar_stream is None:
+            return
+        pool = state.session_pool
+        try:
+            if pool is not None and pool.release(avatar_stream):
+                self.recycled += 1
+                return
+            if not avatar_stream.close():
+                self.stuck_threads += 1
+        except Exception:
+            logger.exception(f'[lifecycle] session {session.sessionid} 释放资源失败')
+
+    async def close_all(self) -> None:
+        await asyncio.gather(*(self.close(sessionid) for sessionid in list(self._sessions)))
+
+    def stats(self) -> dict:
+        close_ms = np.array(self._close_ms) if self._close_ms else np.zeros(1)
+        return {
+            "sessions": len(self._sessions),
+            "closing": self.closing,
+            "opened": self.opened,
+            "closed": self.closed,
+            "recycled": self.recycled,
+            "stuck_threads": self.stuck_threads,
+            "close_ms_p95": round(float(np.percentile(close_ms, 95)), 1),
+            **process_stats(),
+        }
+
+
+lifecycle = SessionLifecycle()
@@ -4,6 +4,7 @@ from .chat import human, interrupt_talk, is_speaking, clear_history
 from .audio import humanaudio, asr
 from .video import set_audiotype, record, download_record
 from .health import health_check
+from .metrics import metrics_handler
 
 __all__ = [
     'offer',
@@ -17,4 +18,5 @@ __all__ = [
     'record',
     'download_record',
     'health_check',
+    'metrics_handler',
 ]
@@ -3,7 +3,7 @@ import json
 from aiohttp import web
 import asyncio
 
-from src.llm.service import llm_response
+from src.llm.service import llm_response, clear_session_history
 from src.utils.logging import logger
 from src.server.state import state
 
@@ -3,6 +3,11 @@ import json
 from aiohttp import web
 
 from src.server.state import state
+from src.server.lifecycle import lifecycle
+from src.tts.base import reply_latency_stats
+from src.tts.cache import cache_stats
+from src.tts.connection import connection_stats
+from src.tts.dispatcher import dispatch_stats
 
 
 async def health_check(request):
@@ -12,7 +17,16 @@ async def health_check(request):
         text=json.dumps(
             {
                 "code": 0, 
-                "ready": state.server_ready
+                "ready": state.server_ready,
+                "worker": state.worker_index,
+                "sessions": len(state.avatar_streams),
+                "tts_connections": connection_stats(),
+                "tts_cache": cache_stats(),
+                "tts_dispatch": dispatch_stats(),
+                "reply_latency": reply_latency_stats(),
+                "session_pool": state.session_pool.stats() if state.session_pool is not None else None,
+                "capacity": state.admission.stats() if state.admission is not None else None,
+                "lifecycle": lifecycle.stats(),
             }
         ),
     )
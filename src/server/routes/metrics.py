@@ -0,0 +1,39 @@
+"""Prometheus 指标路由"""
+from aiohttp import web
+
+from src.server.lifecycle import lifecycle
+from src.server.state import state
+from src.tts.cache import cache_stats
+from src.tts.connection import connection_stats
+from src.tts.dispatcher import dispatch_stats
+from src.utils import metrics
+
+
+def _snapshot_gauges():
+    """/health 中的统计在抓取时转换成 gauge"""
+    pacers = [
+        (dict(zip(metrics.SESSION_LABELS, metrics.session_labels(avatar))), avatar.pacer.stats())
+        for avatar in list(state.avatar_streams.values())
+        if avatar is not None
+    ]
+    lines = []
+    lines += metrics.stats_gauges("linly_pacer", pacers)
+    lines += metrics.stats_gauges("linly_tts_connection", [({"endpoint": k}, v) for k, v in connection_stats().items()])
+    lines += metrics.stats_gauges("linly_tts_dispatch", [({"endpoint": k}, v) for k, v in dispatch_stats().items()])
+    lines += metrics.stats_gauges("linly_tts_cache", [({}, cache_stats())])
+    if state.session_pool is not None:
+        lines += metrics.stats_gauges("linly_session_pool", [({}, state.session_pool.stats())])
+    if state.admission is not None:
+        lines += metrics.stats_gauges("linly_admission", [({}, state.admission.stats())])
+    lines += metrics.stats_gauges("linly_lifecycle", [({}, lifecycle.stats())])
+    return lines
+
+
+async def metrics_handler(request):
+    """Prometheus 文本格式的指标"""
+    return web.Response(
+        text=metrics.render(_snapshot_gauges()),
+        content_type="text/plain",
+        charset="utf-8",
+        headers={"X-Prometheus-Format": "0.0.4"},
+    )
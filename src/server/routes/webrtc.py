@@ -7,58 +7,81 @@ from aiohttp import web
 from aiortc import RTCPeerConnection, RTCSessionDescription, RTCIceServer, RTCConfiguration
 from aiortc.rtcrtpsender import RTCRtpSender
 import asyncio
+import time
 
 from src.utils.webrtc import HumanPlayer
 from src.avatars.factory import create_avatar
 from src.utils.logging import logger
 from src.server.state import state
-from src.server.utils import randN
+from src.server.lifecycle import lifecycle
 
 
 async def offer(request):
     """处理 WebRTC offer 请求"""
+    start = time.perf_counter()
     params = await request.json()
     offer = RTCSessionDescription(sdp=params["sdp"], type=params["type"])
     
-    sessionid = randN(6)
+    admission = state.admission
+    if admission is not None and not await admission.admit():
+        logger.warning('session rejected, admission=%s', admission.stats())
+        return web.Response(
+            status=503,
+            headers={"Retry-After": str(admission.retry_after)},
+            content_type="application/json",
+            text=json.dumps({"code": -1, "msg": "server at capacity", "retry_after": admission.retry_after}),
+        )
+    
+    sessionid = state.new_sessionid()
     state.add_session(sessionid, None)
     logger.info('sessionid=%d, session num=%d', sessionid, len(state.avatar_streams))
     
-    # 创建 avatar 可能耗时，放线程池
-    avatar_stream = await asyncio.get_event_loop().run_in_executor(
-        None, create_avatar, state.config, state.model, state.avatar, sessionid
-    )
+    pool = state.session_pool
+    avatar_stream = pool.claim(sessionid) if pool is not None else None
+    if avatar_stream is None:
+        # 池中没有预热好的会话，现场创建（耗时，放线程池）
+        try:
+            avatar_stream = await asyncio.get_event_loop().run_in_executor(
+                None, create_avatar, state.config, state.model, state.avatar, sessionid
+            )
+        except Exception:
+            state.remove_session(sessionid)
+            raise
     state.add_session(sessionid, avatar_stream)
     
     ice_server = RTCIceServer(urls='stun:stun.miwifi.com:3478')
     pc = RTCPeerConnection(configuration=RTCConfiguration(iceServers=[ice_server]))
     state.add_peer_connection(pc)
 
+    player = HumanPlayer(avatar_stream)
+    lifecycle.open(sessionid, avatar_stream, pc, player)
+
     @pc.on("connectionstatechange")
     async def on_connectionstatechange():
         logger.info("Connection state is %s" % pc.connectionState)
-        if pc.connectionState == "failed":
-            await pc.close()
-            state.remove_peer_connection(pc)
-            state.remove_session(sessionid)
-        if pc.connectionState == "closed":
-            state.remove_peer_connection(pc)
-            state.remove_session(sessionid)
+        if pc.connectionState in ("failed", "closed"):
+            await lifecycle.close(sessionid)
 
-    player = HumanPlayer(state.avatar_streams[sessionid])
-    audio_sender = pc.addTrack(player.audio)
-    video_sender = pc.addTrack(player.video)
-    
-    capabilities = RTCRtpSender.getCapabilities("video")
-    preferences = list(filter(lambda x: x.name == "H264", capabilities.codecs))
-    preferences += list(filter(lambda x: x.name == "VP8", capabilities.codecs))
-    preferences += list(filter(lambda x: x.name == "rtx", capabilities.codecs))
-    transceiver = pc.getTransceivers()[1]
-    transceiver.setCodecPreferences(preferences)
+    try:
+        audio_sender = pc.addTrack(player.audio)
+        video_sender = pc.addTrack(player.video)
+        
+        capabilities = RTCRtpSender.getCapabilities("video")
+        preferences = list(filter(lambda x: x.name == "H264", capabilities.codecs))
+        preferences += list(filter(lambda x: x.name == "VP8", capabilities.codecs))
+        preferences += list(filter(lambda x: x.name == "rtx", capabilities.codecs))
+        transceiver = pc.getTransceivers()[1]
+        transceiver.setCodecPreferences(preferences)
 
-    await pc.setRemoteDescription(offer)
-    answer = await pc.createAnswer()
-    await pc.setLocalDescription(answer)
+        await pc.setRemoteDescription(offer)
+        answer = await pc.createAnswer()
+        await pc.setLocalDescription(answer)
+    except Exception:
+        # SDP 协商失败，会话随之回收
+        await lifecycle.close(sessionid)
+        raise
+    if pool is not None:
+        pool.record_answer((time.perf_counter() - start) * 1000)
 
     return web.Response(
         content_type="application/json",
@@ -8,14 +8,27 @@ import aiohttp_cors
 
 from src.utils.logging import logger
 from src.server.state import state
+from src.server.lifecycle import lifecycle
 from src.server import routes
+from src.tts.base import shutdown_tts_loop
+from src.avatars.inference_scheduler import stop_inference_schedulers
 
 
 async def on_shutdown(app):
     """服务器关闭时的清理操作"""
+    # 先按会话回收（停止渲染线程、结束录制），再关闭剩余的连接
+    await lifecycle.close_all()
     coros = [pc.close() for pc in state.pcs]
     await asyncio.gather(*coros)
     state.pcs.clear()
+    if state.session_pool is not None:
+        state.session_pool.shutdown()
+    if state.admission is not None:
+        state.admission.stop()
+    # 共享 TTS 事件循环 / 推理调度线程的 join 会阻塞，放到线程池里执行
+    loop = asyncio.get_running_loop()
+    await loop.run_in_executor(None, shutdown_tts_loop)
+    await loop.run_in_executor(None, stop_inference_schedulers)
 
 
 def create_app():
@@ -35,6 +48,7 @@ def create_app():
     app.router.add_post("/is_speaking", routes.is_speaking)
     app.router.add_post("/clear_history", routes.clear_history)
     app.router.add_get("/health", routes.health_check)
+    app.router.add_get("/metrics", routes.metrics_handler)
     app.router.add_get("/download/{filename}", routes.download_record)
     # 前端静态资源托管
     app.router.add_static('/', path='web')
@@ -0,0 +1,148 @@
+"""
+预热会话池
+
+create_avatar 要 deepcopy 配置、创建 TTS 引擎、重新读取自定义动作素材、跑音频特征 warm_up，
+ERNeRF / TalkingGaussian 还有额外的预热步骤，放在 /offer 里会直接拖慢 SDP answer。
+
+- 启动后在后台线程预先构建 session_pool 个会话，/offer 直接取一个（O(1)）并换绑 sessionid；
+- 每次取走后在后台补齐，构建串行执行，避免和正在推流的会话抢 GPU；
+- 会话断开后在回收线程里用 reset_session（等 TTS 线程退出、init_customindex 等）重置后放回池中，
+  排队中的构建任务随之跳过，而不是重建；池中的会话都是干净的，取出时只换绑 sessionid；
+- 记录命中 / 未命中、构建耗时和 /offer 到 answer 的耗时，供 /health 展示。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from src.avatars.base import BaseAvatar
+from src.avatars.factory import create_avatar
+from src.utils.logging import logger
+
+_HISTORY = 1000  # 统计耗时分位数的样本数
+
+
+def _percentile(samples, q) -> float:
+    return round(float(np.percentile(np.array(samples), q)), 1) if samples else 0.0
+
+
+class SessionPool:
+    def __init__(self, config, model, avatar):
+        self.config = config
+        self.model = model
+        self.avatar = avatar
+        self.size = max(0, config.app.session_pool)
+        self._lock = threading.Lock()
+        self._idle: deque[BaseAvatar] = deque()
+        self._building = 0  # 已提交（排队 + 正在构建）的构建任务数
+        self._in_progress = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='session-pool')
+
+        self.hits = 0
+        self.misses = 0
+        self.built = 0
+        self.recycled = 0
+        self.build_failures = 0
+        self._build_ms: deque[float] = deque(maxlen=_HISTORY)
+        self._answer_ms: deque[float] = deque(maxlen=_HISTORY)
+
+    def start(self) -> None:
+        if self.size:
+            logger.info(f'[session pool] 预热 {self.size} 个会话')
+            self._refill()
+
+    def _refill(self) -> None:
+        with self._lock:
+            need = self.size - len(self._idle) - self._building
+            self._building += max(need, 0)
+        for _ in range(need):
+            self._executor.submit(self._build)
+
+    def _build(self) -> None:
+        with self._lock:
+            if len(self._idle) >= self.size:
+                # 排队期间已有断开的会话放回池中，不必再构建
+                self._building -= 1
+                return
+            self._in_progress = True
+        start = time.perf_counter()
+        try:
+            # sessionid 在取出时换绑
+            avatar_stream = create_avatar(self.config, self.model, self.avatar, 0)
+        except Exception:
+            logger.exception('[session pool] 预热会话失败')
+            with self._lock:
+                self._building -= 1
+                self._in_progress = False
+                self.build_failures += 1
+            return
+        with self._lock:
+            self._building -= 1
+            self._in_progress = False
+            self.built += 1
+            self._build_ms.append((time.perf_counter() - start) * 1000)
+            self._idle.append(avatar_stream)
+
+    def claim(self, sessionid: int) -> BaseAvatar | None:
+        """取一个已预热的会话并换绑 sessionid，池空时返回 None（由调用方现场创建）。
+        在事件循环里调用，不做阻塞操作：重置已在 release 时完成。"""
+        with self._lock:
+            avatar_stream = self._idle.popleft() if self._idle else None
+            if avatar_stream is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        self._refill()
+        if avatar_stream is not None:
+            avatar_stream.bind_session(sessionid)
+        return avatar_stream
+
+    def release(self, avatar_stream: BaseAvatar) -> bool:
+        """会话结束后重置并放回池中，调用前渲染线程必须已经停止；池已满或仍在录制时丢弃。
+        reset_session 会等 TTS 线程退出，只在线程池里调用（见 SessionLifecycle._teardown）。"""
+        if not self.config.app.session_pool_recycle or avatar_stream is None or avatar_stream.recording:
+            return False
+        with self._lock:
+            if len(self._idle) + self._in_progress >= self.size:
+                return False
+        try:
+            avatar_stream.reset_session()
+        except Exception:
+            logger.exception('[session pool] 重置会话失败，丢弃')
+            return False
+        with self._lock:
+            if len(self._idle) + self._in_progress >= self.size:
+                return False
+            self._idle.append(avatar_stream)
+            self.recycled += 1
+        return True
+
+    def record_answer(self, ms: float) -> None:
+        with self._lock:
+            self._answer_ms.append(ms)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            claims = self.hits + self.misses
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "building": self._building,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / claims if claims else 0.0,
+                "built": self.built,
+                "recycled": self.recycled,
+                "build_failures": self.build_failures,
+                "build_ms_p50": _percentile(self._build_ms, 50),
+                "answer_ms_p50": _percentile(self._answer_ms, 50),
+                "answer_ms_p95": _percentile(self._answer_ms, 95),
+            }
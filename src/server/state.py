@@ -1,5 +1,6 @@
 """全局状态管理"""
 from typing import Dict, Set
+from src.server.utils import randN
 from src.avatars.base import BaseAvatar
 from aiortc import RTCPeerConnection
 
@@ -18,9 +19,22 @@ class ServerState:
         self.config = None
         self.model = None
         self.avatar = None
+        self.session_pool = None  # 预热会话池，见 src/server/session_pool.py
+        self.admission = None  # 新会话准入控制，见 src/server/admission.py
         
         # 服务状态
         self.server_ready = False
+        
+        # 多进程模式下本进程的 worker 序号，sessionid % num_workers == worker_index
+        self.worker_index = 0
+        self.num_workers = 1
+    
+    def new_sessionid(self) -> int:
+        """生成未被占用的 sessionid，多进程模式下保证能按 sessionid 路由回本 worker"""
+        while True:
+            sessionid = randN(6)
+            if sessionid % self.num_workers == self.worker_index and sessionid not in self.avatar_streams:
+                return sessionid
     
     def add_session(self, sessionid: int, avatar_stream: BaseAvatar = None):
         """添加会话"""
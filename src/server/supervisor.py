@@ -0,0 +1,300 @@
+# Linly-Talker-Stream (https://github.com/Kedreamix/Linly-Talker-Stream). Copyright [Linly-talker-stream@kedreamix]. Apache-2.0.
+
+"""
+多进程模式（app.workers > 1）
+
+单进程里所有会话的渲染、推理、帧处理和 TTS 线程共用一个 GIL。多进程模式下：
+
+- 主进程不加载模型，只启动 workers 个 worker 子进程（各自预加载 state.model / state.avatar，
+  可按 worker_gpus 绑定不同 GPU），并对外提供和单进程相同的 HTTP 接口；
+- worker 只监听 127.0.0.1，生成的 sessionid 满足 sessionid % workers == worker 序号，
+  主进程按请求里的 sessionid 直接算出所属 worker 并转发，不需要维护会话表；
+- /offer 按负载选择 worker：每秒拉取各 worker 的 /health，优先会话数（含正在建立的）最少、
+  其次负载最低的 worker，worker 返回 503（准入控制拒绝）时依次尝试下一个；
+- worker 异常退出后自动重启，其上的会话随之失效；
+- /metrics 合并各 worker 的指标，每条序列加上 worker 标签。
+"""
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+
+import aiohttp
+import aiohttp_cors
+from aiohttp import web
+
+from src.utils.logging import logger
+from src.server.routes import download_record
+from src.server.server import run_server
+
+_POLL_INTERVAL_S = 1.0
+_STOP_TIMEOUT_S = 10
+# 按 sessionid 转发的接口
+_SESSION_ROUTES = [
+    "/human", "/humanaudio", "/asr", "/set_audiotype", "/record",
+    "/interrupt_talk", "/is_speaking", "/clear_history",
+]
+_FORWARD_HEADERS = ("Content-Type", "Retry-After", "Content-Disposition")
+_MULTIPART_SESSIONID = re.compile(rb'name="sessionid"\r\n(?:[^\r\n]+\r\n)*\r\n(-?\d+)')
+_METRIC_SAMPLE = re.compile(r'([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (.*)')
+
+
+def merge_metrics(texts: dict) -> str:
+    """合并各 worker 的 Prometheus 文本（{worker 序号: 文本}），同名指标的 HELP / TYPE 只保留一份"""
+    families: dict[str, dict] = {}
+    for index, text in texts.items():
+        family = None
+        for line in text.splitlines():
+            if line.startswith("# HELP ") or line.startswith("# TYPE "):
+                _, kind, name, rest = line.split(" ", 3)
+                family = families.setdefault(name, {"HELP": None, "TYPE": None, "samples": []})
+                family[kind] = family[kind] or line
+                continue
+            match = _METRIC_SAMPLE.match(line)
+            if match is None or family is None:
+                continue
+            name, labels, value = match.groups()
+            labels = f'worker="{index}",{labels}' if labels else f'worker="{index}"'
+            family["samples"].append(f"{name}{{{labels}}} {value}")
+    lines = []
+    for family in families.values():
+        lines.extend(line for line in (family["HELP"], family["TYPE"]) if line)
+        lines.extend(family["samples"])
+    return "\n".join(lines) + "\n"
+
+
+class Worker:
+    def __init__(self, index: int, port: int, gpu=None):
+        self.index = index
+        self.port = port
+        self.gpu = gpu
+        self.url = f"http://127.0.0.1:{port}"
+        self.proc = None
+        self.health = None  # 最近一次 /health，None 表示未就绪
+        self.sessions = 0
+        self.pending = 0  # 已转发、尚未返回的 /offer
+        self.restarts = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.health is not None and self.health.get("ready", False)
+
+    def load_key(self):
+        capacity = (self.health or {}).get("capacity") or {}
+        active = self.sessions + self.pending
+        full = capacity.get("capacity") is not None and active >= capacity["capacity"]
+        return full, active, capacity.get("peak_load", 0.0)
+
+    def stats(self) -> dict:
+        return {
+            "port": self.port,
+            "gpu": self.gpu,
+            "pid": self.proc.pid if self.proc else None,
+            "ready": self.ready,
+            "sessions": self.sessions,
+            "pending": self.pending,
+            "restarts": self.restarts,
+            "capacity": (self.health or {}).get("capacity"),
+        }
+
+
+class Supervisor:
+    def __init__(self, config, config_file: str):
+        self.config = config
+        self.config_file = config_file
+        app = config.app
+        base_port = app.worker_port or app.listenport + 1
+        gpus = app.worker_gpus
+        self.workers = [
+            Worker(i, base_port + i, gpus[i % len(gpus)] if gpus else None)
+            for i in range(app.workers)
+        ]
+        self.http = None
+        self._poll_task = None
+
+    # ---------- worker 进程 ----------
+
+    def spawn(self, worker: Worker) -> None:
+        env = dict(os.environ)
+        if worker.gpu is not None:
+            env["CUDA_VISIBLE_DEVICES"] = str(worker.gpu)
+        app_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+        worker.proc = subprocess.Popen(
+            [sys.executable, app_path, "--config", self.config_file, "--worker", str(worker.index)],
+            env=env,
+        )
+        worker.health = None
+        worker.sessions = 0
+        logger.info(f"[supervisor] worker {worker.index} pid={worker.proc.pid} port={worker.port} gpu={worker.gpu}")
+
+    def stop_workers(self) -> None:
+        for worker in self.workers:
+            if worker.proc is not None and worker.proc.poll() is None:
+                worker.proc.terminate()
+        for worker in self.workers:
+            if worker.proc is None:
+                continue
+            try:
+                worker.proc.wait(_STOP_TIMEOUT_S)
+            except subprocess.TimeoutExpired:
+                worker.proc.kill()
+
+    async def _poll(self) -> None:
+        while True:
+            for worker in self.workers:
+                if worker.proc.poll() is not None:
+                    logger.error(f"[supervisor] worker {worker.index} 退出 (code={worker.proc.returncode})，重启")
+                    worker.restarts += 1
+                    self.spawn(worker)
+                    continue
+                try:
+                    async with self.http.get(f"{worker.url}/health", timeout=aiohttp.ClientTimeout(total=2)) as resp:
+                        worker.health = await resp.json()
+                    worker.sessions = worker.health.get("sessions", 0)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    # 启动中（加载模型）或无响应
+                    worker.health = None
+            await asyncio.sleep(_POLL_INTERVAL_S)
+
+    async def on_startup(self, app) -> None:
+        self.http = aiohttp.ClientSession()
+        self._poll_task = asyncio.ensure_future(self._poll())
+
+    async def on_shutdown(self, app) -> None:
+        self._poll_task.cancel()
+        await self.http.close()
+        await asyncio.get_running_loop().run_in_executor(None, self.stop_workers)
+
+    # ---------- 路由 ----------
+
+    async def _forward(self, worker: Worker, request, body: bytes) -> web.Response:
+        headers = {h: request.headers[h] for h in ("Content-Type",) if h in request.headers}
+        async with self.http.request(request.method, worker.url + request.path_qs, data=body, headers=headers) as resp:
+            data = await resp.read()
+            return web.Response(
+                status=resp.status,
+                body=data,
+                headers={h: resp.headers[h] for h in _FORWARD_HEADERS if h in resp.headers},
+            )
+
+    async def offer(self, request):
+        body = await request.read()
+        candidates = sorted((w for w in self.workers if w.ready), key=Worker.load_key)
+        rejected = None
+        for worker in candidates:
+            worker.pending += 1
+            try:
+                resp = await self._forward(worker, request, body)
+            except aiohttp.ClientError:
+                logger.exception(f"[supervisor] 转发 /offer 到 worker {worker.index} 失败")
+                continue
+            finally:
+                worker.pending -= 1
+            if resp.status != 503:
+                if resp.status == 200:
+                    # 下一次拉取 /health 之前先按本地计数
+                    worker.sessions += 1
+                return resp
+            rejected = resp
+        if rejected is not None:
+            return rejected
+        return web.Response(
+            status=503,
+            headers={"Retry-After": str(self.config.admission.retry_after_s)},
+            content_type="application/json",
+            text=json.dumps({"code": -1, "msg": "no worker available"}),
+        )
+
+    @staticmethod
+    def _sessionid(request, body: bytes) -> int:
+        if request.content_type == "application/json":
+            return int(json.loads(body or b"{}").get("sessionid", 0))
+        if request.content_type == "multipart/form-data":
+            match = _MULTIPART_SESSIONID.search(body)
+            return int(match.group(1)) if match else 0
+        return 0
+
+    async def forward_session(self, request):
+        body = await request.read()
+        try:
+            sessionid = self._sessionid(request, body)
+        except (ValueError, TypeError):
+            sessionid = 0
+        worker = self.workers[sessionid % len(self.workers)]
+        try:
+            return await self._forward(worker, request, body)
+        except aiohttp.ClientError as e:
+            return web.Response(
+                status=502,
+                content_type="application/json",
+                text=json.dumps({"code": -1, "msg": f"worker {worker.index} unavailable: {e}"}),
+            )
+
+    async def metrics(self, request):
+        async def fetch(worker):
+            try:
+                async with self.http.get(f"{worker.url}/metrics", timeout=aiohttp.ClientTimeout(total=5)) as resp:
+                    return worker.index, await resp.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return worker.index, None
+
+        results = await asyncio.gather(*(fetch(w) for w in self.workers if w.ready))
+        return web.Response(
+            text=merge_metrics({index: text for index, text in results if text is not None}),
+            content_type="text/plain",
+            charset="utf-8",
+        )
+
+    async def health_check(self, request):
+        return web.Response(
+            content_type="application/json",
+            text=json.dumps(
+                {
+                    "code": 0,
+                    "ready": all(w.ready for w in self.workers),
+                    "sessions": sum(w.sessions for w in self.workers),
+                    "workers": [w.stats() for w in self.workers],
+                }
+            ),
+        )
+
+
+def create_front_app(supervisor: Supervisor):
+    """主进程的 aiohttp 应用，接口和单进程模式一致"""
+    app = web.Application(client_max_size=1024**2*100)
+    app.on_startup.append(supervisor.on_startup)
+    app.on_shutdown.append(supervisor.on_shutdown)
+
+    app.router.add_post("/offer", supervisor.offer)
+    for path in _SESSION_ROUTES:
+        app.router.add_post(path, supervisor.forward_session)
+    app.router.add_get("/health", supervisor.health_check)
+    app.router.add_get("/metrics", supervisor.metrics)
+    # 录制文件写在共享的 data/records 下，主进程直接提供下载
+    app.router.add_get("/download/{filename}", download_record)
+    app.router.add_static('/', path='web')
+
+    cors = aiohttp_cors.setup(app, defaults={
+        "*": aiohttp_cors.ResourceOptions(
+            allow_credentials=True,
+            expose_headers="*",
+            allow_headers="*",
+        )
+    })
+    for route in list(app.router.routes()):
+        cors.add(route)
+
+    return app
+
+
+def run_supervisor(config, config_file: str):
+    """启动 worker 子进程，并在 listenport 上运行转发前端"""
+    supervisor = Supervisor(config, config_file)
+    for worker in supervisor.workers:
+        supervisor.spawn(worker)
+    try:
+        run_server(create_front_app(supervisor), config)
+    finally:
+        supervisor.stop_workers()
@@ -6,12 +6,26 @@ TTS 基类模块
 
 from __future__ import annotations
 
+import asyncio
+import concurrent.futures
+import contextvars
 import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 from queue import Queue
 from threading import Thread
-from typing import TYPE_CHECKING
+from typing import TYPE_CHECKING, Any, Coroutine
 
+import numpy as np
+
+from src.tts.cache import CachedAudio, cache_key, get_tts_cache
+from src.tts.connection import close_idle_websockets
+from src.tts.dispatcher import dispatch, server_gate
+from src.tts.resampler import StreamingResampler
+from src.utils import metrics
 from src.utils.logging import logger
 
 if TYPE_CHECKING:
@@ -23,15 +37,181 @@ class State(Enum):
     PAUSE = 1
 
 
+_loop_lock = threading.Lock()
+_loop: asyncio.AbstractEventLoop | None = None
+_loop_thread: Thread | None = None
+
+
+def get_tts_loop() -> asyncio.AbstractEventLoop:
+    """进程内所有会话共享的 TTS 事件循环，首次调用时在守护线程中启动。"""
+    global _loop, _loop_thread
+    with _loop_lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            _loop_thread = Thread(target=_loop.run_forever, name="tts-loop", daemon=True)
+            _loop_thread.start()
+        return _loop
+
+
+def shutdown_tts_loop(timeout: float = 5.0) -> None:
+    """取消未完成的合成任务，停止并关闭共享事件循环。"""
+    global _loop, _loop_thread
+    with _loop_lock:
+        loop, thread = _loop, _loop_thread
+        _loop = _loop_thread = None
+    if loop is None or loop.is_closed():
+        return
+
+    async def _cancel_all():
+        tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await close_idle_websockets()
+        await loop.shutdown_asyncgens()
+
+    try:
+        asyncio.run_coroutine_threadsafe(_cancel_all(), loop).result(timeout)
+    except Exception:
+        logger.exception("tts loop shutdown")
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(timeout)
+    if not loop.is_running():
+        loop.close()
+    logger.info("tts loop stopped")
+
+
+_DONE = object()
+# 最近的回复 LLM 首 token -> 首帧音频 延迟（ms），所有会话共享
+_reply_latencies: "deque[float]" = deque(maxlen=1000)
+
+
+def reply_latency_stats() -> dict | None:
+    if not _reply_latencies:
+        return None
+    values = np.array(_reply_latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(float(np.percentile(values, 50)), 1),
+        "p95_ms": round(float(np.percentile(values, 95)), 1),
+        "max_ms": round(float(values.max()), 1),
+    }
+# 当前正在合成的句子；用 ContextVar 而不是 threading.local，
+# 这样提交到共享事件循环的协程里输出的帧也能归到所属句子
+_current_job: "contextvars.ContextVar[_SentenceJob | None]" = contextvars.ContextVar(
+    "tts_current_job", default=None
+)
+# 当前句子的录制（写入缓存用），同样需要跟随协程
+_current_recording: "contextvars.ContextVar[_Recording | None]" = contextvars.ContextVar(
+    "tts_current_recording", default=None
+)
+
+
+class _SentenceJob:
+    """
+    正在合成的一句。
+    预取模式下合成线程把音频帧写入 frames，process_tts 按句子顺序取出转发；
+    direct 为 True（逐句串行）时帧直接输出。generation 为入队时的打断代数，随帧一起下发。
+    first 表示回复的第一句（入队时会话没有在合成 / 排队的句子），共享服务调度时优先。
+    """
+
+    def __init__(self, msg: tuple[str, dict], generation: int, direct: bool = False, first: bool = False):
+        self.msg = msg
+        self.generation = generation
+        self.direct = direct
+        self.first = first
+        self.frames: "Queue[Any]" = Queue()
+        self.futures: list[concurrent.futures.Future] = []
+        self.cancelled = False
+        self.created = time.perf_counter()
+        self.first_frame_at: float | None = None
+
+    def cancel(self) -> None:
+        self.cancelled = True
+        for fut in list(self.futures):
+            fut.cancel()
+
+
+class _Recording:
+    """记录一句合成输出的帧和事件状态；mute 为 True 时只录制不输出（缓存预热）。"""
+
+    def __init__(self, mute: bool = False):
+        self.mute = mute
+        self.frames: list[np.ndarray] = []
+        self.marks: list[str] = []
+        # 引擎合成中途出错（见 BaseTTS.mark_failed），音频不完整
+        self.failed = False
+
+    def add(self, frame, eventpoint: dict) -> None:
+        self.frames.append(np.array(frame, dtype=np.float32))
+        self.marks.append(eventpoint.get("status", ""))
+
+    def complete(self) -> bool:
+        # 只缓存完整合成的句子：没有出错，有 start，且以 end 结束
+        return not self.failed and len(self.frames) > 1 and "start" in self.marks and self.marks[-1] == "end"
+
+
+class _SentenceFrames:
+    """
+    一句流式音频的分帧输出：重采样后按 20ms 切帧推给 put_audio_frame，首帧标记 start；
+    finish() 冲刷滤波器尾部，不足一帧的剩余样本补零成整帧，最后补一个 end 帧。
+    """
+
+    def __init__(self, tts: "BaseTTS", msg: tuple[str, dict], sr_orig: int | None):
+        self.tts = tts
+        self.text, self.textevent = msg
+        self.first = True
+        self.resampler = None
+        if sr_orig is not None:
+            self.resampler = StreamingResampler(sr_orig, tts.sample_rate, tts.chunk)
+
+    def push_pcm16(self, data: bytes | None) -> None:
+        """喂入 16bit 小端 PCM 字节。"""
+        if data:
+            self._put(self.resampler.frames(self.resampler.push_pcm16(data)))
+
+    def push(self, samples: np.ndarray, sample_rate: int | None = None) -> None:
+        """喂入 float32 样本；sample_rate 和之前不同时换一个重采样器。"""
+        if sample_rate is not None and (self.resampler is None or self.resampler.sr_orig != sample_rate):
+            self.resampler = StreamingResampler(sample_rate, self.tts.sample_rate, self.tts.chunk)
+        self._put(self.resampler.frames(self.resampler.process(samples)))
+
+    def finish(self) -> None:
+        if self.resampler is not None:
+            self._put(self.resampler.flush_frames(pad=True))
+        eventpoint = {"status": "end", "text": self.text}
+        eventpoint.update(**self.textevent)
+        self.tts.put_audio_frame(np.zeros(self.tts.chunk, np.float32), eventpoint)
+
+    def _put(self, frames: list[np.ndarray]) -> None:
+        for frame in frames:
+            eventpoint = {}
+            if self.first:
+                eventpoint = {"status": "start", "text": self.text}
+                eventpoint.update(**self.textevent)
+                self.first = False
+            self.tts.put_audio_frame(frame, eventpoint)
+
+
 class BaseTTS:
     """
     所有 TTS 引擎的基类，负责：
     - 统一的消息队列
     - 统一的渲染线程（process_tts）
     - 统一的采样率 / chunk 配置
-    具体引擎只需要实现 txt_to_audio。
+    - 合成结果缓存（相同引擎 + 音色 + 文本直接回放）
+    - 打断：flush_talk 取消进行中的合成，每次打断代数 generation 加一
+    具体引擎只需要实现 txt_to_audio，并通过 self.put_audio_frame 输出音频帧；
+    流式下载时用 self.is_cancelled() 判断是否已被打断，尽早退出。
     """
 
+    # 引擎内部有共享的合成状态（如单个 synthesizer + 回调）时设为 1，不做预取
+    max_lookahead: int | None = None
+    # 请求发往自建的 tts_server（多会话共享）时设为 True，开启 server_concurrency 后统一调度
+    shared_server: bool = False
+    # 输出帧不带 start / end 事件、无法判断句子是否完整合成时设为 False，不走缓存也不预热
+    cacheable: bool = True
+
     def __init__(self, config, parent: "BaseAvatar"):
         self.config = config
         self.parent = parent
@@ -43,41 +223,316 @@ class BaseTTS:
         self.chunk = self.sample_rate // self.fps
 
         # 文本消息队列
-        self.msgqueue: "Queue[tuple[str, dict]]" = Queue()
+        # (text, textevent, 是否回复首句)
+        self.msgqueue: "Queue[tuple[str, dict, bool]]" = Queue()
         self.state: State = State.RUNNING
 
-    def flush_talk(self) -> None:
-        """清空队列并暂停当前说话状态。"""
+        # 预取：最多 lookahead 句同时合成，音频仍按顺序输出
+        lookahead = max(1, config.tts.lookahead)
+        if self.max_lookahead is not None:
+            lookahead = min(lookahead, self.max_lookahead)
+        self.lookahead = lookahead
+        self._jobs_lock = threading.Lock()
+        self._jobs: "deque[_SentenceJob]" = deque()
+        # 打断代数：每次 flush_talk 加一，音频帧带上所属句子的代数，下游据此丢弃旧帧
+        self.generation = 0
+
+        self.cache = get_tts_cache(config) if self.cacheable else None
+        self.gate = server_gate(config) if self.shared_server else None
+        # mark_reply_start 记录的 LLM 首 token 时间，输出该回复的第一帧音频时清空
+        self._reply_start: float | None = None
+        self._thread: Thread | None = None
+
+    def submit_coroutine(self, coro: Coroutine[Any, Any, Any]) -> concurrent.futures.Future:
+        """把协程提交到共享事件循环，立即返回 Future。"""
+        job = _current_job.get()
+        recording = _current_recording.get()
+        if job is not None or recording is not None:
+            coro = self._bind_context(job, recording, coro)
+        fut = asyncio.run_coroutine_threadsafe(coro, get_tts_loop())
+        if job is not None:
+            # 记到所属句子上，flush_talk 时一并取消
+            job.futures.append(fut)
+            if job.cancelled:
+                fut.cancel()
+        return fut
+
+    @staticmethod
+    async def _bind_context(
+        job: _SentenceJob | None, recording: _Recording | None, coro: Coroutine[Any, Any, Any]
+    ) -> Any:
+        # Task 有独立的 context，这里设置不会影响同一事件循环上的其它句子
+        _current_job.set(job)
+        _current_recording.set(recording)
+        return await coro
+
+    def run_coroutine(self, coro: Coroutine[Any, Any, Any]) -> Any:
+        """在共享事件循环上执行协程并等待结果（供 txt_to_audio 等同步入口使用）。"""
+        return self.submit_coroutine(coro).result()
+
+    def flush_talk(self) -> int:
+        """清空队列、取消进行中的合成（包括网络请求所在的协程），返回新的打断代数。"""
+        self.msgqueue.queue.clear()
+        with self._jobs_lock:
+            self.state = State.PAUSE
+            self.generation += 1
+            generation = self.generation
+            jobs = list(self._jobs)
+            self._jobs.clear()
+        for job in jobs:
+            job.cancel()
+        return generation
+
+    def stop(self, timeout: float = 5.0) -> bool:
+        """取消合成并等待 process_tts 线程退出（render 的 quit_event 需已设置），返回线程是否已退出。
+        停止后可以再次 render（会话池复用）。"""
+        self.flush_talk()
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return True
+        # 唤醒阻塞在 msgqueue.get 上的线程，不必等 get 超时
+        self.msgqueue.put(None)
+        thread.join(timeout)
         self.msgqueue.queue.clear()
-        self.state = State.PAUSE
+        if thread.is_alive():
+            logger.warning(f"tts thread {thread.name} did not stop in {timeout}s")
+            return False
+        return True
+
+    def close(self) -> bool:
+        """会话结束时调用，引擎持有 SDK 连接等资源时覆盖此方法释放；返回 TTS 线程是否已退出。"""
+        return self.stop()
+
+    def is_cancelled(self) -> bool:
+        """当前句子是否已被打断。"""
+        job = _current_job.get()
+        if job is not None:
+            return job.cancelled
+        return self.state != State.RUNNING
+
+    def put_audio_frame(self, frame, eventpoint: dict | None = None) -> None:
+        """引擎输出 20ms 音频帧的统一出口，预取模式下先缓存到所属句子。"""
+        if eventpoint is None:
+            eventpoint = {}
+        recording = _current_recording.get()
+        if recording is not None:
+            recording.add(frame, eventpoint)
+            if recording.mute:
+                return
+        job = _current_job.get()
+        if job is not None and job.first_frame_at is None:
+            job.first_frame_at = time.perf_counter()
+            metrics.TTS_FIRST_FRAME.labels(*metrics.session_labels(self.parent)).observe(
+                job.first_frame_at - job.created
+            )
+        if job is None:
+            self._output(frame, eventpoint, self.generation)
+        elif job.cancelled:
+            return
+        elif job.direct:
+            self._output(frame, eventpoint, job.generation, job)
+        else:
+            job.frames.put((frame, eventpoint))
+
+    def sentence_frames(self, msg: tuple[str, dict], sr_orig: int | None = None) -> _SentenceFrames:
+        """流式引擎输出一句音频：喂入原始采样率 sr_orig 的样本，结束时调用 finish()。"""
+        return _SentenceFrames(self, msg, sr_orig)
+
+    def mark_failed(self) -> None:
+        """引擎合成当前句子出错（如下载中途断开）时调用，截断的音频不写入缓存。"""
+        recording = _current_recording.get()
+        if recording is not None:
+            recording.failed = True
+
+    def mark_reply_start(self, first_token_time: float) -> None:
+        """LLM 开始输出一条回复时调用，用于统计首 token 到首帧音频的延迟。"""
+        self._reply_start = first_token_time
+
+    def _output(self, frame, eventpoint: dict, generation: int, job: _SentenceJob | None = None) -> None:
+        reply_start = self._reply_start
+        # 只统计回复开始之后才开始合成的句子，避免把上一条回复的尾音算进来
+        if reply_start is not None and job is not None and job.created >= reply_start:
+            self._reply_start = None
+            latency_ms = (time.perf_counter() - reply_start) * 1000
+            _reply_latencies.append(latency_ms)
+            metrics.REPLY_FIRST_AUDIO.labels(*metrics.session_labels(self.parent)).observe(latency_ms / 1000)
+            logger.info(f"LLM first token to first audio frame: {latency_ms:.0f}ms")
+        self.parent.put_audio_frame(frame, eventpoint, generation)
 
     def put_msg_txt(self, msg: str, datainfo: dict | None = None) -> None:
         """外部入口：放入一条待合成的文本消息。"""
         if datainfo is None:
             datainfo = {}
         if len(msg) > 0:
-            self.msgqueue.put((msg, datainfo))
+            first = self.msgqueue.empty() and not self._jobs
+            self.msgqueue.put((msg, datainfo, first))
 
     def render(self, quit_event) -> None:
         """启动独立线程持续消费队列，调用具体引擎的 txt_to_audio。"""
-        process_thread = Thread(target=self.process_tts, args=(quit_event,))
-        process_thread.start()
+        self._thread = Thread(target=self.process_tts, args=(quit_event,), name=f"tts-{self.parent.sessionid}")
+        self._thread.start()
+        if self.cache is not None and self.config.tts.cache_warmup and self.max_lookahead != 1:
+            # 引擎支持并发合成时在后台预热，不阻塞第一句回复
+            Thread(target=self.warm_up_cache, args=(self.config.tts.cache_warmup,), daemon=True).start()
 
     def process_tts(self, quit_event) -> None:
         """循环从队列中取消息，并调用 txt_to_audio。"""
+        if self.cache is not None and self.config.tts.cache_warmup and self.max_lookahead == 1:
+            # 引擎内部有共享合成状态，预热只能和正常合成串行
+            self.warm_up_cache(self.config.tts.cache_warmup)
+        if self.lookahead > 1:
+            self._process_tts_lookahead(quit_event)
+            logger.info("ttsreal thread stop")
+            return
         while not quit_event.is_set():
             try:
-                msg: tuple[str, dict] = self.msgqueue.get(block=True, timeout=1)
-                self.state = State.RUNNING
+                item = self.msgqueue.get(block=True, timeout=1)
             except queue.Empty:
                 continue
-            self.txt_to_audio(msg)
+            if item is None:
+                # stop() 的唤醒
+                continue
+            text, textevent, first = item
+            with self._jobs_lock:
+                self.state = State.RUNNING
+                job = _SentenceJob((text, textevent), self.generation, direct=True, first=first)
+                self._jobs.append(job)
+            self._synthesize(job)
+            with self._jobs_lock:
+                if job in self._jobs:
+                    self._jobs.remove(job)
         logger.info("ttsreal thread stop")
 
+    def _synthesize(self, job: _SentenceJob) -> None:
+        token = _current_job.set(job)
+        try:
+            if not job.cancelled:
+                self.synthesize_cached(job.msg)
+        except concurrent.futures.CancelledError:
+            pass
+        except Exception:
+            logger.exception("tts synthesize")
+        finally:
+            _current_job.reset(token)
+            if not job.direct:
+                job.frames.put(_DONE)
+
+    def _process_tts_lookahead(self, quit_event) -> None:
+        """预取模式：后续句子提前并发合成，当前句的帧到达即转发，后面的句子缓存到轮到为止。"""
+        executor = ThreadPoolExecutor(max_workers=self.lookahead, thread_name_prefix="tts-lookahead")
+        try:
+            while not quit_event.is_set():
+                with self._jobs_lock:
+                    pending = len(self._jobs)
+                    head = self._jobs[0] if self._jobs else None
+
+                if pending < self.lookahead:
+                    try:
+                        item = self.msgqueue.get(block=head is None, timeout=1)
+                    except queue.Empty:
+                        item = None
+                    if item is not None:
+                        text, textevent, first = item
+                        with self._jobs_lock:
+                            self.state = State.RUNNING
+                            job = _SentenceJob((text, textevent), self.generation, first=first)
+                            self._jobs.append(job)
+                        executor.submit(self._synthesize, job)
+                        continue
+                if head is None:
+                    continue
+
+                try:
+                    item = head.frames.get(timeout=0.02)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    with self._jobs_lock:
+                        if self._jobs and self._jobs[0] is head:
+                            self._jobs.popleft()
+                elif not head.cancelled:
+                    self._output(*item, head.generation, head)
+        finally:
+            with self._jobs_lock:
+                jobs = list(self._jobs)
+                self._jobs.clear()
+            for job in jobs:
+                job.cancel()
+            executor.shutdown(wait=False)
+
+    def cache_params(self) -> dict:
+        """参与缓存 key 的合成参数；引擎有额外影响音色的参数时覆盖此方法。"""
+        tts = self.config.tts
+        return {
+            "ref_text": tts.ref_text,
+            "tts_server": tts.tts_server,
+            "sample_rate": self.sample_rate,
+            "chunk": self.chunk,
+        }
+
+    def _cache_key(self, text: str) -> str:
+        return cache_key(type(self).__name__, self.config.tts.ref_file, text, self.cache_params())
+
+    def synthesize_cached(self, msg: tuple[str, dict]) -> None:
+        """txt_to_audio 外加缓存：命中时直接回放缓存的 PCM，未命中时边合成边录制，完整合成后写入缓存。"""
+        if self.cache is None:
+            self._dispatch_txt_to_audio(msg)
+            return
+        text, textevent = msg
+        key = self._cache_key(text)
+        entry = self.cache.get(key)
+        if entry is not None:
+            for frame, mark in zip(entry.pcm, entry.marks):
+                if self.is_cancelled():
+                    return
+                eventpoint = {}
+                if mark:
+                    eventpoint = {"status": mark, "text": text}
+                    eventpoint.update(**textevent)
+                self.put_audio_frame(frame, eventpoint)
+            return
+        self._record(msg, key, mute=False)
+
+    def _dispatch_txt_to_audio(self, msg: tuple[str, dict]) -> None:
+        """调用引擎合成；共享自建服务时先排队拿到名额，排队期间被打断则不再请求。"""
+        if self.gate is None:
+            self.txt_to_audio(msg)
+            return
+        job = _current_job.get()
+        first = job is not None and job.first
+        with dispatch(self.gate, self.parent.sessionid, first, self.is_cancelled) as granted:
+            if granted:
+                self.txt_to_audio(msg)
+
+    def _record(self, msg: tuple[str, dict], key: str, mute: bool) -> None:
+        recording = _Recording(mute)
+        token = _current_recording.set(recording)
+        try:
+            self._dispatch_txt_to_audio(msg)
+        finally:
+            _current_recording.reset(token)
+        if recording.complete() and not self.is_cancelled():
+            self.cache.put(key, CachedAudio(np.stack(recording.frames), recording.marks))
+
+    def warm_up_cache(self, phrases: list[str]) -> None:
+        """预先合成一组固定话术写入缓存（不输出到数字人），每个进程只预热一次。"""
+        if self.cache is None:
+            return
+        for text in self.cache.claim_warmup(phrases):
+            key = self._cache_key(text)
+            if self.cache.contains(key):
+                continue
+            try:
+                self._record((text, {}), key, mute=True)
+            except Exception:
+                logger.exception(f"tts cache warm up: {text}")
+        logger.info(f"tts cache warm up done: {self.cache.stats()}")
+
     def txt_to_audio(self, msg: tuple[str, dict]):
         """
         子类必须实现：
             msg: (text, textevent)
-        内部负责把音频分帧后，通过 parent.put_audio_frame(...) 推给上层。
+        内部负责把音频分帧后，通过 self.put_audio_frame(...) 推给上层。
+        开启预取时会在多个线程里并发调用，合成过程中的状态不要放在实例属性上。
         """
         raise NotImplementedError
\ No newline at end of file
@@ -0,0 +1,204 @@
+"""
+TTS 音频缓存
+
+问候语、兜底回复以及 /human type=echo 发送的固定话术会反复合成。
+这里按 (引擎, 音色, 文本, 参数) 的内容哈希缓存解码后的 16k float32 PCM：
+
+- 内存层：按字节数限额的 LRU；
+- 磁盘层（可选）：cache_dir 下每条一个 .npz，进程重启后仍可命中，按总字节数淘汰最旧的文件；
+- 只缓存 PCM 和每帧的事件状态（start / end），回放时按本次的 text / textevent 重新生成 eventpoint。
+
+进程内所有会话共享一个缓存实例。
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.utils.logging import logger
+
+
+@dataclass
+class CachedAudio:
+    pcm: np.ndarray  # [n_frames, chunk] float32
+    marks: list  # 每帧的事件状态，'' 表示无事件
+
+    @property
+    def nbytes(self) -> int:
+        return self.pcm.nbytes
+
+
+def cache_key(engine: str, voice: str, text: str, params: dict) -> str:
+    raw = json.dumps([engine, voice, text, params], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class TTSAudioCache:
+    def __init__(self, max_bytes: int, cache_dir: str | None = None, max_disk_bytes: int = 0):
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CachedAudio]" = OrderedDict()
+        self._bytes = 0
+        self._disk_bytes = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk_bytes = sum(
+                os.path.getsize(os.path.join(cache_dir, f))
+                for f in os.listdir(cache_dir) if f.endswith(".npz")
+            )
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.puts = 0
+        self.evictions = 0
+        # 已预热过的短语，避免多个会话重复预热
+        self._warmed: set[str] = set()
+
+    def get(self, key: str) -> CachedAudio | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    def contains(self, key: str) -> bool:
+        """是否已缓存（不计入命中率）。"""
+        with self._lock:
+            if key in self._entries:
+                return True
+        return bool(self.cache_dir) and os.path.exists(self._path(key))
+
+    def claim_warmup(self, phrases: list[str]) -> list[str]:
+        """返回尚未被其它会话预热的短语，并登记为已预热。"""
+        with self._lock:
+            todo = [p for p in dict.fromkeys(phrases) if p and p not in self._warmed]
+            self._warmed.update(todo)
+            return todo
+
+    def put(self, key: str, entry: CachedAudio) -> None:
+        if entry.nbytes > self.max_bytes:
+            return
+        with self._lock:
+            self.puts += 1
+            self._insert(key, entry)
+        self._save(key, entry)
+
+    def _insert(self, key: str, entry: CachedAudio) -> None:
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old.nbytes
+        self._entries[key] = entry
+        self._bytes += entry.nbytes
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.npz")
+
+    def _load(self, key: str) -> CachedAudio | None:
+        if not self.cache_dir:
+            return None
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                entry = CachedAudio(data["pcm"], [str(m) for m in data["marks"]])
+            os.utime(path)  # 按访问时间淘汰
+            return entry
+        except Exception:
+            logger.exception(f"[tts cache] 读取失败: {path}")
+            return None
+
+    def _save(self, key: str, entry: CachedAudio) -> None:
+        if not self.cache_dir:
+            return
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        tmp = path + ".tmp.npz"
+        try:
+            np.savez(tmp[:-4], pcm=entry.pcm, marks=np.array(entry.marks))
+            os.replace(tmp, path)
+        except Exception:
+            logger.exception(f"[tts cache] 写入失败: {path}")
+            return
+        with self._lock:
+            self._disk_bytes += os.path.getsize(path)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.endswith(".npz")]
+        files.sort(key=os.path.getmtime)
+        for path in files:
+            if self._disk_bytes <= self.max_disk_bytes * 0.9:
+                break
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                self._disk_bytes -= size
+            except OSError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "disk_bytes": self._disk_bytes,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+                "puts": self.puts,
+                "evictions": self.evictions,
+            }
+
+
+_cache: TTSAudioCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache(config) -> TTSAudioCache | None:
+    """按配置创建进程共享的缓存，cache_mb <= 0 时返回 None（关闭缓存）。"""
+    global _cache
+    tts = config.tts
+    if tts.cache_mb <= 0:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSAudioCache(
+                int(tts.cache_mb * 1024 * 1024),
+                tts.cache_dir or None,
+                int(tts.cache_disk_mb * 1024 * 1024),
+            )
+            logger.info(f"[tts cache] 内存 {tts.cache_mb}MB, 磁盘目录 {tts.cache_dir or '未启用'}")
+        return _cache
+
+
+def cache_stats() -> dict | None:
+    return _cache.stats() if _cache is not None else None
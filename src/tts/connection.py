@@ -0,0 +1,207 @@
+"""
+TTS 网络连接复用
+
+HTTP 引擎（gpt-sovits / fish / xtts / cosyvoice / tencent）原来每句 requests.post 一次，
+WebSocket 引擎（cosyvoice_api / doubao）每句重新握手，TLS 下首包前要多花 100~300ms。
+
+- http_session(url)：按 scheme://host:port 共享的 requests.Session，连接池 + keep-alive；
+- websocket_pool(uri, headers)：按 uri + 鉴权头共享的 WebSocket 连接池，
+  一次合成任务租用一条连接，任务正常结束后归还复用，取消或失败的连接直接关闭；
+- connection_stats()：各端点的请求数、新建连接数、复用次数、失败数等，供 /health 展示。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from urllib.parse import urlsplit
+
+import requests
+import websockets
+from requests.adapters import HTTPAdapter
+
+from src.utils.logging import logger
+
+HTTP_POOL_SIZE = 16  # 每个端点保持的 keep-alive 连接数
+WS_POOL_SIZE = 4  # 每个端点保留的空闲 WebSocket 连接数
+WS_IDLE_TIMEOUT_S = 30.0  # 空闲超过该时长的连接不再复用（服务端通常会主动断开）
+
+_lock = threading.Lock()
+
+
+def server_endpoint(url: str) -> str:
+    """scheme://host:port，连接池和统计都按它区分端点。"""
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class _CountingSession(requests.Session):
+    """统计请求数 / 失败数的 Session，连接数从 urllib3 连接池读取。"""
+
+    def __init__(self, endpoint: str, pool_size: int):
+        super().__init__()
+        self.endpoint = endpoint
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+        self._adapter = adapter
+        self.requests = 0
+        self.errors = 0
+
+    def request(self, *args, **kwargs):
+        self.requests += 1
+        try:
+            response = super().request(*args, **kwargs)
+        except Exception:
+            self.errors += 1
+            raise
+        if response.status_code >= 400:
+            self.errors += 1
+        return response
+
+    def stats(self) -> dict:
+        pools = self._adapter.poolmanager.pools
+        opened = sum(pools[key].num_connections for key in pools.keys())
+        return {
+            "type": "http",
+            "requests": self.requests,
+            "errors": self.errors,
+            "opened": opened,
+            "reused": max(self.requests - self.errors - opened, 0),
+        }
+
+
+_http_sessions: dict[str, _CountingSession] = {}
+
+
+def http_session(url: str) -> requests.Session:
+    """返回该端点共享的 Session，响应体读完（或用 with 关闭）后连接回到池中。"""
+    endpoint = server_endpoint(url)
+    with _lock:
+        session = _http_sessions.get(endpoint)
+        if session is None:
+            session = _http_sessions[endpoint] = _CountingSession(endpoint, HTTP_POOL_SIZE)
+        return session
+
+
+class WebSocketLease:
+    """一次租用：ws 为连接本身，reused 表示是否复用的旧连接；出错时把 reusable 置 False。"""
+
+    def __init__(self, ws, reused: bool):
+        self.ws = ws
+        self.reused = reused
+        self.reusable = True
+
+
+class WebSocketPool:
+    """单个端点的 WebSocket 连接池，只在共享 TTS 事件循环上使用。"""
+
+    def __init__(self, uri: str, headers: dict | None, pool_size: int, idle_timeout: float):
+        self.uri = uri
+        self.headers = headers or {}
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+        self._idle: list[tuple[object, float]] = []
+        self.opened = 0
+        self.reused = 0
+        self.failed = 0
+        self.discarded = 0
+        self.in_use = 0
+
+    async def _open(self):
+        try:
+            ws = await websockets.connect(self.uri, extra_headers=self.headers, ping_interval=None)
+        except Exception:
+            self.failed += 1
+            raise
+        self.opened += 1
+        return ws
+
+    async def _acquire(self) -> WebSocketLease:
+        now = time.monotonic()
+        while self._idle:
+            ws, since = self._idle.pop()
+            if ws.open and now - since < self.idle_timeout:
+                self.reused += 1
+                return WebSocketLease(ws, reused=True)
+            self.discarded += 1
+            asyncio.ensure_future(ws.close())
+        return WebSocketLease(await self._open(), reused=False)
+
+    def _release(self, lease: WebSocketLease) -> None:
+        ws = lease.ws
+        if lease.reusable and ws.open and len(self._idle) < self.pool_size:
+            self._idle.append((ws, time.monotonic()))
+        else:
+            if not lease.reusable:
+                self.discarded += 1
+            # 取消时不能再 await，关闭放到后台
+            asyncio.ensure_future(ws.close())
+
+    @asynccontextmanager
+    async def connection(self) -> AsyncIterator[WebSocketLease]:
+        lease = await self._acquire()
+        self.in_use += 1
+        try:
+            yield lease
+        except BaseException:
+            # 任务中途取消 / 出错时连接上可能还有残留消息，不再复用
+            lease.reusable = False
+            raise
+        finally:
+            self.in_use -= 1
+            self._release(lease)
+
+    def stats(self) -> dict:
+        return {
+            "type": "websocket",
+            "opened": self.opened,
+            "reused": self.reused,
+            "failed": self.failed,
+            "discarded": self.discarded,
+            "in_use": self.in_use,
+            "idle": len(self._idle),
+        }
+
+
+_ws_pools: dict[tuple, WebSocketPool] = {}
+
+
+def websocket_pool(uri: str, headers: dict | None = None) -> WebSocketPool:
+    """返回该端点 + 鉴权头共享的连接池（按事件循环区分，连接不能跨循环使用）。"""
+    key = (id(asyncio.get_running_loop()), uri, tuple(sorted((headers or {}).items())))
+    with _lock:
+        pool = _ws_pools.get(key)
+        if pool is None:
+            pool = _ws_pools[key] = WebSocketPool(uri, headers, WS_POOL_SIZE, WS_IDLE_TIMEOUT_S)
+            logger.info(f"[tts] websocket pool created: {uri}")
+        return pool
+
+
+async def close_idle_websockets() -> None:
+    """关闭当前事件循环上所有空闲连接（事件循环关闭前调用）。"""
+    loop_id = id(asyncio.get_running_loop())
+    with _lock:
+        pools = [pool for key, pool in _ws_pools.items() if key[0] == loop_id]
+    for pool in pools:
+        idle, pool._idle = pool._idle, []
+        await asyncio.gather(*(ws.close() for ws, _ in idle), return_exceptions=True)
+
+
+def connection_stats() -> dict:
+    """各端点连接统计，key 为端点地址。"""
+    with _lock:
+        stats = {endpoint: session.stats() for endpoint, session in _http_sessions.items()}
+        for pool in _ws_pools.values():
+            endpoint = server_endpoint(pool.uri)
+            if endpoint in stats and stats[endpoint]["type"] == "websocket":
+                # 同一端点不同鉴权头的池合并展示
+                for k, v in pool.stats().items():
+                    if k != "type":
+                        stats[endpoint][k] += v
+            else:
+                stats[endpoint] = pool.stats()
+        return stats
@@ -0,0 +1,163 @@
+"""
+多会话共享自建 TTS 服务时的请求调度
+
+gpt-sovits / cosyvoice / xtts / fish 等自建服务通常只有一两张卡，
+多个会话各自逐句请求时服务端会被压垮，先开口的会话还会一直抢占。
+
+- 每个 tts_server 端点一个 ServerGate，同时进行的合成请求不超过 server_concurrency；
+- 等待中的请求按会话轮转（round-robin），一个会话连续多句也不会饿死其它会话；
+- 回复的第一句（会话当前没有在合成 / 排队的句子）优先，尽快开口；
+- 记录每个请求的排队等待时间，供 /health 展示。
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+import numpy as np
+
+from src.tts.connection import server_endpoint
+from src.utils.logging import logger
+
+_WAIT_SLICE_S = 0.05  # 等待期间检查是否已被打断的间隔
+_WAIT_HISTORY = 1000  # 统计等待时间分位数的样本数
+
+
+class _Request:
+    __slots__ = ("session", "granted", "event")
+
+    def __init__(self, session):
+        self.session = session
+        self.granted = False
+        self.event = threading.Event()
+
+
+class ServerGate:
+    """单个服务端点的并发闸门：最多 limit 个请求同时合成，其余按优先级 + 会话轮转排队。"""
+
+    def __init__(self, endpoint: str, limit: int):
+        self.endpoint = endpoint
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._active = 0
+        # 优先级 0（回复首句）/ 1（其余句子），各自按会话轮转
+        self._waiting: tuple[OrderedDict, OrderedDict] = (OrderedDict(), OrderedDict())
+        self._num_waiting = 0
+
+        self.requests = 0
+        self.cancelled = 0
+        self.max_waiting = 0
+        self._waits: deque[float] = deque(maxlen=_WAIT_HISTORY)
+        self._first_waits: deque[float] = deque(maxlen=_WAIT_HISTORY)
+
+    def _grant_locked(self) -> None:
+        while self._active < self.limit and self._num_waiting:
+            for queues in self._waiting:
+                if queues:
+                    session, pending = next(iter(queues.items()))
+                    req = pending.popleft()
+                    if pending:
+                        # 该会话还有句子，排到本优先级的队尾
+                        queues.move_to_end(session)
+                    else:
+                        del queues[session]
+                    break
+            self._num_waiting -= 1
+            self._active += 1
+            req.granted = True
+            req.event.set()
+
+    def _remove_locked(self, req: _Request, priority: int) -> None:
+        queues = self._waiting[priority]
+        pending = queues.get(req.session)
+        if pending is not None and req in pending:
+            pending.remove(req)
+            if not pending:
+                del queues[req.session]
+            self._num_waiting -= 1
+
+    def acquire(self, session, first: bool, cancelled: Callable[[], bool]) -> bool:
+        """排队等待合成名额，等待期间被打断时放弃排队并返回 False。"""
+        priority = 0 if first else 1
+        req = _Request(session)
+        start = time.perf_counter()
+        with self._lock:
+            self.requests += 1
+            self._waiting[priority].setdefault(session, deque()).append(req)
+            self._num_waiting += 1
+            self.max_waiting = max(self.max_waiting, self._num_waiting)
+            self._grant_locked()
+        while not req.event.wait(_WAIT_SLICE_S):
+            if cancelled():
+                with self._lock:
+                    if not req.granted:
+                        self._remove_locked(req, priority)
+                        self.cancelled += 1
+                        return False
+                break
+        wait_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            self._waits.append(wait_ms)
+            if first:
+                self._first_waits.append(wait_ms)
+        return True
+
+    def release(self) -> None:
+        with self._lock:
+            self._active -= 1
+            self._grant_locked()
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits = np.array(self._waits) if self._waits else np.zeros(1)
+            first_waits = np.array(self._first_waits) if self._first_waits else np.zeros(1)
+            return {
+                "limit": self.limit,
+                "active": self._active,
+                "waiting": self._num_waiting,
+                "max_waiting": self.max_waiting,
+                "requests": self.requests,
+                "cancelled": self.cancelled,
+                "wait_ms_p50": round(float(np.percentile(waits, 50)), 1),
+                "wait_ms_p95": round(float(np.percentile(waits, 95)), 1),
+                "first_wait_ms_p95": round(float(np.percentile(first_waits, 95)), 1),
+            }
+
+
+_gates: dict[str, ServerGate] = {}
+_gates_lock = threading.Lock()
+
+
+def server_gate(config) -> ServerGate | None:
+    """返回 tts_server 端点共享的闸门，server_concurrency <= 0 时不做调度。"""
+    limit = config.tts.server_concurrency
+    if limit <= 0:
+        return None
+    endpoint = server_endpoint(config.tts.tts_server)
+    with _gates_lock:
+        gate = _gates.get(endpoint)
+        if gate is None:
+            gate = _gates[endpoint] = ServerGate(endpoint, limit)
+            logger.info(f"[tts dispatch] {endpoint} 最多 {limit} 个并发请求")
+        return gate
+
+
+@contextmanager
+def dispatch(gate: ServerGate, session, first: bool, cancelled: Callable[[], bool]) -> Iterator[bool]:
+    """占用一个合成名额；yield 是否拿到名额（排队时被打断为 False）。"""
+    if not gate.acquire(session, first, cancelled):
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        gate.release()
+
+
+def dispatch_stats() -> dict:
+    with _gates_lock:
+        return {endpoint: gate.stats() for endpoint, gate in _gates.items()}
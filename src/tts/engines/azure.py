@@ -1,16 +1,21 @@
 from __future__ import annotations
 
+import contextvars
 import os
 
 import numpy as np
 import azure.cognitiveservices.speech as speechsdk
 
-from src.tts.base import BaseTTS, State
+from src.tts.base import BaseTTS
 from src.utils.logging import logger
 
 
 class AzureTTS(BaseTTS):
     CHUNK_SIZE = 640  # 16kHz, 20ms, 16-bit Mono PCM size
+    # 单个 synthesizer，音频在 SDK 回调线程输出，不支持预取
+    max_lookahead = 1
+    # SDK 回调输出的帧没有 start / end 事件，录制结果永远不完整
+    cacheable = False
 
     def __init__(self, config, parent):
         super().__init__(config, parent)
@@ -30,9 +35,25 @@ class AzureTTS(BaseTTS):
             speech_config=speech_config, audio_config=None
         )
         self.speech_synthesizer.synthesizing.connect(self._on_synthesizing)
+        # 当前句子的上下文，SDK 回调线程里输出的帧靠它归到所属句子
+        self._context = contextvars.copy_context()
+
+    def flush_talk(self) -> int:
+        generation = super().flush_talk()
+        # 打断时让 SDK 停止当前合成，不再接收剩余音频
+        self.speech_synthesizer.stop_speaking_async()
+        return generation
+
+    def close(self) -> bool:
+        stopped = super().close()
+        # SDK 回调持有 self，断开后引擎才能被回收
+        self.speech_synthesizer.synthesizing.disconnect_all()
+        return stopped
 
     def txt_to_audio(self, msg: tuple[str, dict]):
         msg_text: str = msg[0]
+        self.audio_buffer = b""
+        self._context = contextvars.copy_context()
         result = self.speech_synthesizer.speak_text(msg_text)
 
         # 延迟指标
@@ -52,6 +73,9 @@ class AzureTTS(BaseTTS):
 
     # === 回调 ===
     def _on_synthesizing(self, evt: speechsdk.SpeechSynthesisEventArgs):
+        self._context.run(self._handle_synthesizing, evt)
+
+    def _handle_synthesizing(self, evt: speechsdk.SpeechSynthesisEventArgs):
         if evt.result.reason == speechsdk.ResultReason.SynthesizingAudioCompleted:
             logger.info("SynthesizingAudioCompleted")
         elif evt.result.reason == speechsdk.ResultReason.Canceled:
@@ -61,7 +85,7 @@ class AzureTTS(BaseTTS):
                 if cancellation_details.error_details:
                     logger.info(f"Error details: {cancellation_details.error_details}")
 
-        if self.state != State.RUNNING:
+        if self.is_cancelled():
             self.audio_buffer = b""
             return
 
@@ -74,5 +98,5 @@ class AzureTTS(BaseTTS):
             frame = (
                 np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32767.0
             )
-            self.parent.put_audio_frame(frame)
+            self.put_audio_frame(frame)
 
@@ -1,91 +1,188 @@
 from __future__ import annotations
 
-import asyncio
 import time
-from io import BytesIO
+from queue import Queue
 
+import av
 import edge_tts
 import numpy as np
-import resampy
-import soundfile as sf
 
-from src.tts.base import BaseTTS, State
+from src.tts.base import BaseTTS
+from src.tts.resampler import StreamingResampler
 from src.utils.logging import logger
 
 
-class EdgeTTS(BaseTTS):
-    def __init__(self, config, parent):
-        super().__init__(config, parent)
-        # EdgeTTS 需要 BytesIO 缓冲区来累积音频数据
-        self.input_stream = BytesIO()
+# mpg123 / libavcodec 的 MP3 解码延迟（采样）
+_MP3_DECODER_DELAY = 529
+# 没有 LAME 标签时按 LAME 默认的编码延迟处理
+_MP3_DEFAULT_ENCODER_DELAY = 576
+
+
+def _lame_encoder_delay(packet: bytes) -> int | None:
+    """首帧为 Xing / Info 头时返回 LAME 标签里的编码延迟，不是则返回 None。"""
+    for tag in (b"Xing", b"Info"):
+        pos = packet.find(tag, 0, 64)
+        if pos >= 0:
+            break
+    else:
+        return None
+    flags = int.from_bytes(packet[pos + 4:pos + 8], "big")
+    # 依次跳过可选的帧数、字节数、TOC、质量字段，之后是 LAME 扩展标签
+    pos += 8 + 4 * bool(flags & 1) + 4 * bool(flags & 2) + 100 * bool(flags & 4) + 4 * bool(flags & 8)
+    delay = packet[pos + 21:pos + 24]
+    if len(delay) < 3:
+        return _MP3_DEFAULT_ENCODER_DELAY
+    return (delay[0] << 4) | (delay[1] >> 4)
+
+
+class _Mp3StreamDecoder:
+    """MP3 字节流增量解码：喂入任意长度的数据，返回已能解出的目标采样率单声道 float32 样本。
+
+    去掉流开头的编码器 + 解码器延迟（约 46ms 的静音），与 ffmpeg 按 LAME 标签裁剪首帧的做法一致：
+    ID3v2 标签先剥掉（否则 parser 会把它和下一帧拼成一个无法解码的包，吞掉一帧），
+    Xing / Info 头帧不解码，只读取其中的编码延迟。
+    """
+
+    def __init__(self, sample_rate: int):
+        self._codec = av.CodecContext.create("mp3", "r")
+        # 只做格式转换（planar -> packed 单声道），采样率转换交给流式重采样
+        self._converter = av.AudioResampler(format="flt", layout="mono")
+        self._sample_rate = sample_rate
+        self._resampler: StreamingResampler | None = None
+        self._head = b""  # 判断是否有 ID3v2 标签前缓存的开头字节
+        self._id3_left = None  # 还要丢弃的 ID3 字节数，None 表示尚未判断
+        self._skip = None  # 首个音频包确定后，还要丢弃的开头样本数
+
+    def feed(self, data: bytes) -> np.ndarray:
+        return self._decode(self._codec.parse(self._strip_id3(data)))
+
+    def flush(self) -> np.ndarray:
+        """流结束：冲刷 parser / 解码器 / 重采样器中剩余的样本。"""
+        tail = self._strip_id3(b"", final=True)
+        out = self._decode(list(self._codec.parse(tail)) + list(self._codec.parse(None)) + [None])
+        if self._resampler is None:
+            return out
+        return np.concatenate((out, self._resampler.flush()))
+
+    def _strip_id3(self, data: bytes, final: bool = False) -> bytes:
+        if self._id3_left is None:
+            self._head += data
+            if len(self._head) < 10 and not final:
+                return b""
+            data, self._head = self._head, b""
+            self._id3_left = 0
+            if data[:3] == b"ID3" and len(data) >= 10:
+                size = 0
+                for b in data[6:10]:
+                    size = (size << 7) | (b & 0x7F)
+                self._id3_left = 10 + size + (10 if data[5] & 0x10 else 0)
+        if self._id3_left:
+            n = min(self._id3_left, len(data))
+            self._id3_left -= n
+            data = data[n:]
+        return data
+
+    def _decode(self, packets) -> np.ndarray:
+        out = []
+        for packet in packets:
+            if self._skip is None and packet is not None:
+                encoder_delay = _lame_encoder_delay(bytes(packet))
+                self._skip = _MP3_DECODER_DELAY + (
+                    _MP3_DEFAULT_ENCODER_DELAY if encoder_delay is None else encoder_delay)
+                if encoder_delay is not None:
+                    # Xing / Info 头帧不含音频
+                    continue
+            try:
+                frames = self._codec.decode(packet)
+            except av.error.InvalidDataError:
+                # ID3 等非音频数据
+                continue
+            for frame in frames:
+                if self._resampler is None:
+                    self._resampler = StreamingResampler(frame.sample_rate, self._sample_rate)
+                for converted in self._converter.resample(frame):
+                    samples = converted.to_ndarray()[0]
+                    if self._skip:
+                        n = min(self._skip, len(samples))
+                        self._skip -= n
+                        samples = samples[n:]
+                    out.append(self._resampler.process(samples))
+        return np.concatenate(out) if out else np.zeros(0, np.float32)
+
 
+class EdgeTTS(BaseTTS):
     def txt_to_audio(self, msg: tuple[str, dict]):
         voicename = self.config.tts.ref_file  # 比如 "zh-CN-YunxiaNeural"
         text, textevent = msg
         t = time.time()
 
-        # 每次调用独立事件循环，避免和外部 loop 冲突
-        asyncio.new_event_loop().run_until_complete(self.__main(voicename, text))
+        # 进程共享的 TTS 事件循环上只做下载，MP3 解码、重采样和推帧放在本线程，不拖慢其它会话的下载
+        chunks: "Queue[bytes | None]" = Queue()
+        fut = self.submit_coroutine(self.__download(voicename, text, chunks))
+        # 下载结束、失败或被打断（协程可能还没开始运行）时都唤醒解码
+        fut.add_done_callback(lambda _: chunks.put(None))
+        nframes = self.__decode(chunks, text, textevent)
         logger.info(f"-------edge tts time:{time.time() - t:.4f}s")
 
         # Edge TTS 失败保护
-        if self.input_stream.getbuffer().nbytes <= 0:
+        if nframes == 0:
             logger.error("edgetts err!!!!!")
-            return
-
-        # 将 BytesIO 转为 float32 流，并按 chunk 推送给上层
-        self.input_stream.seek(0)
-        stream = self.__create_bytes_stream(self.input_stream)
-        streamlen = stream.shape[0]
-        idx = 0
-        while streamlen >= self.chunk and self.state == State.RUNNING:
-            eventpoint = {}
-            streamlen -= self.chunk
-            if idx == 0:
-                # 首帧标记 start，方便前端做状态切换
-                eventpoint = {"status": "start", "text": text}
-                eventpoint.update(**textevent)
-            elif streamlen < self.chunk:
-                # 末帧标记 end
-                eventpoint = {"status": "end", "text": text}
-                eventpoint.update(**textevent)
-            self.parent.put_audio_frame(stream[idx : idx + self.chunk], eventpoint)
-            idx += self.chunk
-
-        # 清空缓冲区，准备下一次调用
-        self.input_stream.seek(0)
-        self.input_stream.truncate()
-
-    def __create_bytes_stream(self, byte_stream: BytesIO) -> np.ndarray:
-        stream, sample_rate = sf.read(byte_stream)  # [T*sample_rate,] float64
-        logger.info(f"[INFO]tts audio stream {sample_rate}: {stream.shape}")
-        stream = stream.astype(np.float32)
-
-        if stream.ndim > 1:
-            logger.info(f"[WARN] audio has {stream.shape[1]} channels, only use the first.")
-            stream = stream[:, 0]
-
-        if sample_rate != self.sample_rate and stream.shape[0] > 0:
-            logger.info(
-                f"[WARN] audio sample rate is {sample_rate}, resampling into {self.sample_rate}."
-            )
-            stream = resampy.resample(
-                x=stream, sr_orig=sample_rate, sr_new=self.sample_rate
-            )
-
-        return stream
-
-    async def __main(self, voicename: str, text: str):
+
+    async def __download(self, voicename: str, text: str, chunks: "Queue[bytes | None]") -> None:
         try:
             communicate = edge_tts.Communicate(text, voicename)
-
-            first = True
             async for chunk in communicate.stream():
-                if first:
-                    first = False
-                if chunk["type"] == "audio" and self.state == State.RUNNING:
-                    self.input_stream.write(chunk["data"])
-                elif chunk["type"] == "WordBoundary":
-                    pass
+                if self.is_cancelled():
+                    return
+                if chunk["type"] == "audio":
+                    chunks.put(chunk["data"])
         except Exception:
             logger.exception("edgetts")
+            self.mark_failed()
+
+    def __decode(self, chunks: "Queue[bytes | None]", text: str, textevent: dict) -> int:
+        decoder = _Mp3StreamDecoder(self.sample_rate)
+        buffer = np.zeros(0, np.float32)
+        # 始终压住最近一帧，流结束时才知道哪一帧是末帧
+        last = None
+        nframes = 0
+        t = time.time()
+
+        def emit(samples: np.ndarray):
+            nonlocal buffer, last, nframes
+            if samples.size == 0:
+                return
+            if nframes == 0 and last is None:
+                logger.info(f"edge tts Time to first audio: {time.time() - t:.4f}s")
+            buffer = np.concatenate((buffer, samples))
+            n = buffer.shape[0] // self.chunk
+            for i in range(n):
+                if last is not None:
+                    eventpoint = {}
+                    if nframes == 0:
+                        # 首帧标记 start，方便前端做状态切换
+                        eventpoint = {"status": "start", "text": text}
+                        eventpoint.update(**textevent)
+                    self.put_audio_frame(last, eventpoint)
+                    nframes += 1
+                last = buffer[i * self.chunk : (i + 1) * self.chunk]
+            buffer = buffer[n * self.chunk :]
+
+        while True:
+            data = chunks.get()
+            if data is None:
+                break
+            if self.is_cancelled():
+                return nframes
+            emit(decoder.feed(data))
+        if self.is_cancelled():
+            return nframes
+
+        emit(decoder.flush())
+        if last is not None:
+            # 末帧标记 end（只有一帧时按首帧处理）
+            eventpoint = {"status": "start" if nframes == 0 else "end", "text": text}
+            eventpoint.update(**textevent)
+            self.put_audio_frame(last, eventpoint)
+            nframes += 1
+        return nframes
@@ -4,10 +4,10 @@ import os
 import time
 
 import numpy as np
-import resampy
 import soundfile as sf
 
-from src.tts.base import BaseTTS, State
+from src.tts.base import BaseTTS
+from src.tts.resampler import StreamingResampler
 from src.utils.logging import logger
 
 
@@ -46,7 +46,7 @@ class IndexTTS2(BaseTTS):
 
             # 循环生成每个片段的音频
             for i, segment_text in enumerate(segments):
-                if self.state != State.RUNNING:
+                if self.is_cancelled():
                     break
 
                 logger.info(f"IndexTTS2 正在生成第 {i+1}/{len(segments)} 段音频...")
@@ -62,9 +62,11 @@ class IndexTTS2(BaseTTS):
                     )
                 else:
                     logger.error(f"IndexTTS2 第 {i+1} 段音频生成失败")
+                    self.mark_failed()
 
         except Exception as e:
             logger.exception(f"IndexTTS2 txt_to_audio 错误: {e}")
+            self.mark_failed()
 
     def split_text(self, text):
         """使用 IndexTTS2 API 分割文本"""
@@ -161,28 +163,27 @@ class IndexTTS2(BaseTTS):
 
             if sample_rate != self.sample_rate and stream.shape[0] > 0:
                 logger.info(f"IndexTTS2 重采样: {sample_rate}Hz -> {self.sample_rate}Hz")
-                stream = resampy.resample(
-                    x=stream, sr_orig=sample_rate, sr_new=self.sample_rate
-                )
+                resampler = StreamingResampler(sample_rate, self.sample_rate, self.chunk)
+                stream = np.concatenate((resampler.process(stream), resampler.flush()))
 
             streamlen = stream.shape[0]
             idx = 0
             first_chunk = True
 
-            while streamlen >= self.chunk and self.state == State.RUNNING:
+            while streamlen >= self.chunk and not self.is_cancelled():
                 eventpoint = None
 
                 if is_first and first_chunk:
                     eventpoint = {"status": "start", "text": text, "msgevent": textevent}
                     first_chunk = False
 
-                self.parent.put_audio_frame(stream[idx : idx + self.chunk], eventpoint)
+                self.put_audio_frame(stream[idx : idx + self.chunk], eventpoint)
                 idx += self.chunk
                 streamlen -= self.chunk
 
             if is_last:
                 eventpoint = {"status": "end", "text": text, "msgevent": textevent}
-                self.parent.put_audio_frame(np.zeros(self.chunk, np.float32), eventpoint)
+                self.put_audio_frame(np.zeros(self.chunk, np.float32), eventpoint)
 
             try:
                 if os.path.exists(audio_file):
@@ -193,4 +194,5 @@ class IndexTTS2(BaseTTS):
 
         except Exception as e:
             logger.exception(f"IndexTTS2 音频流处理失败: {e}")
+            self.mark_failed()
 
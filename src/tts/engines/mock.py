@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+import time
+import zlib
+from typing import Iterator
+
+import numpy as np
+
+from src.tts.base import BaseTTS
+from src.utils.logging import logger
+
+# tts.mock 未配置时的默认值
+MOCK_DEFAULTS = {
+    "first_byte_ms": 200.0,  # 首包延迟
+    "chunk_ms": 100.0,  # 每个网络块包含的音频时长
+    "rtf": 0.3,  # 合成耗时 / 音频时长，决定块间隔 chunk_ms * rtf
+    "sample_rate": 24000,  # 输出采样率，走和真实引擎相同的重采样路径
+    "chars_per_second": 4.0,  # 按文本长度估算音频时长
+}
+
+
+class MockTTS(BaseTTS):
+    """
+    本地模拟引擎，不依赖任何外部服务，用于离线压测和回归 TTS 链路。
+    按配置的首包延迟、块间隔输出由文本决定的确定性 PCM（同一文本每次输出完全相同）。
+    模拟的是自建服务，同样参与 server_concurrency 调度。
+    """
+
+    shared_server = True
+
+    def __init__(self, config, parent):
+        super().__init__(config, parent)
+        self.params = {**MOCK_DEFAULTS, **(config.tts.mock or {})}
+
+    def cache_params(self) -> dict:
+        return {**super().cache_params(), "mock": self.params}
+
+    def txt_to_audio(self, msg: tuple[str, dict]):
+        text, textevent = msg
+        self.stream_tts(self.mock_stream(text), msg)
+
+    def mock_stream(self, text: str) -> Iterator[bytes]:
+        p = self.params
+        sr = int(p["sample_rate"])
+        total = int(sr * max(len(text), 1) / p["chars_per_second"])
+        step = max(int(sr * p["chunk_ms"] / 1000), 1)
+        start = time.perf_counter()
+
+        time.sleep(p["first_byte_ms"] / 1000)
+        for offset in range(0, total, step):
+            if self.is_cancelled():
+                break
+            if offset:
+                time.sleep(p["chunk_ms"] * p["rtf"] / 1000)
+            else:
+                logger.info(f"mock tts Time to first chunk: {time.perf_counter() - start:.4f}s")
+            yield self.synth_pcm(text, offset, min(step, total - offset), sr)
+
+    @staticmethod
+    def synth_pcm(text: str, offset: int, n: int, sr: int) -> bytes:
+        """由文本决定音高的谐波 + 4Hz 音节包络，按样本序号生成，和分块方式无关。"""
+        seed = zlib.crc32(text.encode("utf-8"))
+        f0 = 110.0 + seed % 120
+        t = np.arange(offset, offset + n) / sr
+        wave = sum(np.sin(2 * np.pi * f0 * k * t) / k for k in (1, 2, 3))
+        envelope = 0.5 - 0.5 * np.cos(2 * np.pi * 4.0 * t)
+        return (wave * envelope * 6000).astype("<i2").tobytes()
+
+    def stream_tts(self, audio_stream, msg: tuple[str, dict]):
+        frames = self.sentence_frames(msg, int(self.params["sample_rate"]))
+        for chunk in audio_stream:
+            frames.push_pcm16(chunk)
+        frames.finish()
@@ -4,16 +4,17 @@ from io import BytesIO
 from typing import Iterator
 
 import numpy as np
-import requests
-import resampy
 import soundfile as sf
 
-from src.tts.base import BaseTTS, State
+from src.tts.base import BaseTTS
+from src.tts.connection import http_session
 from src.utils.logging import logger
 import time
 
 
 class SovitsTTS(BaseTTS):
+    shared_server = True
+
     def txt_to_audio(self, msg: tuple[str, dict]):
         text, textevent = msg
         self.stream_tts(
@@ -41,32 +42,37 @@ class SovitsTTS(BaseTTS):
             "streaming_mode": True,
         }
         try:
-            res = requests.post(
+            with http_session(server_url).post(
                 f"{server_url}/tts",
                 json=req,
                 stream=True,
-            )
-            end = time.perf_counter()
-            logger.info(f"gpt_sovits Time to make POST: {end-start}s")
+            ) as res:
+                end = time.perf_counter()
+                logger.info(f"gpt_sovits Time to make POST: {end-start}s")
 
-            if res.status_code != 200:
-                logger.error("Error:%s", res.text)
-                return
+                if res.status_code != 200:
+                    logger.error("Error:%s", res.text)
+                    self.mark_failed()
+                    return
 
-            first = True
+                first = True
 
-            for chunk in res.iter_content(chunk_size=None):
-                logger.info("chunk len:%d", len(chunk))
-                if first:
-                    end = time.perf_counter()
-                    logger.info(f"gpt_sovits Time to first chunk: {end-start}s")
-                    first = False
-                if chunk and self.state == State.RUNNING:
-                    yield chunk
+                for chunk in res.iter_content(chunk_size=None):
+                    logger.info("chunk len:%d", len(chunk))
+                    if first:
+                        end = time.perf_counter()
+                        logger.info(f"gpt_sovits Time to first chunk: {end-start}s")
+                        first = False
+                    if self.is_cancelled():
+                        # 已被打断：退出 with 时关闭连接，不再下载剩余音频
+                        break
+                    if chunk:
+                        yield chunk
         except Exception:
             logger.exception("sovits")
+            self.mark_failed()
 
-    def __create_bytes_stream(self, byte_stream: BytesIO) -> np.ndarray:
+    def __decode_chunk(self, byte_stream: BytesIO) -> tuple[np.ndarray, int]:
         stream, sample_rate = sf.read(byte_stream)
         logger.info(f"[INFO]tts audio stream {sample_rate}: {stream.shape}")
         stream = stream.astype(np.float32)
@@ -74,36 +80,13 @@ class SovitsTTS(BaseTTS):
         if stream.ndim > 1:
             logger.info(f"[WARN] audio has {stream.shape[1]} channels, only use the first.")
             stream = stream[:, 0]
-
-        if sample_rate != self.sample_rate and stream.shape[0] > 0:
-            logger.info(
-                f"[WARN] audio sample rate is {sample_rate}, resampling into {self.sample_rate}."
-            )
-            stream = resampy.resample(
-                x=stream, sr_orig=sample_rate, sr_new=self.sample_rate
-            )
-
-        return stream
+        return stream, sample_rate
 
     def stream_tts(self, audio_stream, msg: tuple[str, dict]):
-        text, textevent = msg
-        first = True
+        # 首块确定采样率，之后跨块保留滤波历史和剩余样本
+        frames = self.sentence_frames(msg)
         for chunk in audio_stream:
             if chunk is not None and len(chunk) > 0:
-                byte_stream = BytesIO(chunk)
-                stream = self.__create_bytes_stream(byte_stream)
-                streamlen = stream.shape[0]
-                idx = 0
-                while streamlen >= self.chunk:
-                    eventpoint = {}
-                    if first:
-                        eventpoint = {"status": "start", "text": text}
-                        eventpoint.update(**textevent)
-                        first = False
-                    self.parent.put_audio_frame(stream[idx : idx + self.chunk], eventpoint)
-                    streamlen -= self.chunk
-                    idx += self.chunk
-        eventpoint = {"status": "end", "text": text}
-        eventpoint.update(**textevent)
-        self.parent.put_audio_frame(np.zeros(self.chunk, np.float32), eventpoint)
-
+                stream, sample_rate = self.__decode_chunk(BytesIO(chunk))
+                frames.push(stream, sample_rate)
+        frames.finish()
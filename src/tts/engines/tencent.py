@@ -9,10 +9,8 @@ import time
 import uuid
 from typing import Iterator
 
-import numpy as np
-import requests
-
-from src.tts.base import BaseTTS, State
+from src.tts.base import BaseTTS
+from src.tts.connection import http_session
 from src.utils.logging import logger
 
 _PROTOCOL = "https://"
@@ -91,51 +89,35 @@ class TencentTTS(BaseTTS):
         }
         url = _PROTOCOL + _HOST + _PATH
         try:
-            res = requests.post(url, headers=headers, data=json.dumps(params), stream=True)
-
-            end = time.perf_counter()
-            logger.info(f"tencent Time to make POST: {end-start}s")
+            with http_session(url).post(url, headers=headers, data=json.dumps(params), stream=True) as res:
+                end = time.perf_counter()
+                logger.info(f"tencent Time to make POST: {end-start}s")
 
-            first = True
+                first = True
 
-            for chunk in res.iter_content(chunk_size=6400):  # 16K*20ms*2
-                if first:
-                    try:
-                        rsp = json.loads(chunk)
-                        logger.error("tencent tts:%s", rsp["Response"]["Error"]["Message"])
-                        return
-                    except Exception:
-                        end = time.perf_counter()
-                        logger.info(f"tencent Time to first chunk: {end-start}s")
-                        first = False
-                if chunk and self.state == State.RUNNING:
-                    yield chunk
+                for chunk in res.iter_content(chunk_size=6400):  # 16K*20ms*2
+                    if first:
+                        try:
+                            rsp = json.loads(chunk)
+                            logger.error("tencent tts:%s", rsp["Response"]["Error"]["Message"])
+                            self.mark_failed()
+                            return
+                        except Exception:
+                            end = time.perf_counter()
+                            logger.info(f"tencent Time to first chunk: {end-start}s")
+                            first = False
+                    if self.is_cancelled():
+                        # 已被打断：退出 with 时关闭连接，不再下载剩余音频
+                        break
+                    if chunk:
+                        yield chunk
         except Exception:
             logger.exception("tencent")
+            self.mark_failed()
 
     def stream_tts(self, audio_stream, msg: tuple[str, dict]):
-        text, textevent = msg
-        first = True
-        last_stream = np.array([], dtype=np.float32)
+        frames = self.sentence_frames(msg, self.sample_rate)
         for chunk in audio_stream:
-            if chunk is not None and len(chunk) > 0:
-                stream = (
-                    np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32767
-                )
-                stream = np.concatenate((last_stream, stream))
-                streamlen = stream.shape[0]
-                idx = 0
-                while streamlen >= self.chunk:
-                    eventpoint = {}
-                    if first:
-                        eventpoint = {"status": "start", "text": text}
-                        eventpoint.update(**textevent)
-                        first = False
-                    self.parent.put_audio_frame(stream[idx : idx + self.chunk], eventpoint)
-                    streamlen -= self.chunk
-                    idx += self.chunk
-                last_stream = stream[idx:]
-        eventpoint = {"status": "end", "text": text}
-        eventpoint.update(**textevent)
-        self.parent.put_audio_frame(np.zeros(self.chunk, np.float32), eventpoint)
+            frames.push_pcm16(chunk)
+        frames.finish()
 
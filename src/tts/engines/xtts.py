@@ -3,15 +3,14 @@ from __future__ import annotations
 import time
 from typing import Iterator
 
-import numpy as np
-import requests
-import resampy
-
 from src.tts.base import BaseTTS
+from src.tts.connection import http_session
 from src.utils.logging import logger
 
 
 class XTTS(BaseTTS):
+    shared_server = True
+
     def __init__(self, config, parent):
         super().__init__(config, parent)
         self.speaker = self.get_speaker(config.tts.ref_file, config.tts.tts_server)
@@ -31,7 +30,7 @@ class XTTS(BaseTTS):
 
     def get_speaker(self, ref_audio, server_url):
         files = {"wav_file": ("reference.wav", open(ref_audio, "rb"))}
-        response = requests.post(f"{server_url}/clone_speaker", files=files)
+        response = http_session(server_url).post(f"{server_url}/clone_speaker", files=files)
         return response.json()
 
     def xtts(
@@ -42,56 +41,38 @@ class XTTS(BaseTTS):
         speaker["language"] = language
         speaker["stream_chunk_size"] = stream_chunk_size
         try:
-            res = requests.post(
+            with http_session(server_url).post(
                 f"{server_url}/tts_stream",
                 json=speaker,
                 stream=True,
-            )
-            end = time.perf_counter()
-            logger.info(f"xtts Time to make POST: {end-start}s")
+            ) as res:
+                end = time.perf_counter()
+                logger.info(f"xtts Time to make POST: {end-start}s")
 
-            if res.status_code != 200:
-                print("Error:", res.text)
-                return
+                if res.status_code != 200:
+                    print("Error:", res.text)
+                    self.mark_failed()
+                    return
 
-            first = True
+                first = True
 
-            for chunk in res.iter_content(chunk_size=None):
-                if first:
-                    end = time.perf_counter()
-                    logger.info(f"xtts Time to first chunk: {end-start}s")
-                    first = False
-                if chunk:
-                    yield chunk
+                for chunk in res.iter_content(chunk_size=None):
+                    if first:
+                        end = time.perf_counter()
+                        logger.info(f"xtts Time to first chunk: {end-start}s")
+                        first = False
+                    if self.is_cancelled():
+                        # 已被打断：退出 with 时关闭连接，不再下载剩余音频
+                        break
+                    if chunk:
+                        yield chunk
         except Exception as e:
             print(e)
+            self.mark_failed()
 
     def stream_tts(self, audio_stream, msg: tuple[str, dict]):
-        text, textevent = msg
-        first = True
-        last_stream = np.array([], dtype=np.float32)
+        frames = self.sentence_frames(msg, 24000)
         for chunk in audio_stream:
-            if chunk is not None and len(chunk) > 0:
-                stream = (
-                    np.frombuffer(chunk, dtype=np.int16).astype(np.float32) / 32767
-                )
-                stream = resampy.resample(
-                    x=stream, sr_orig=24000, sr_new=self.sample_rate
-                )
-                stream = np.concatenate((last_stream, stream))
-                streamlen = stream.shape[0]
-                idx = 0
-                while streamlen >= self.chunk:
-                    eventpoint = {}
-                    if first:
-                        eventpoint = {"status": "start", "text": text}
-                        eventpoint.update(**textevent)
-                        first = False
-                    self.parent.put_audio_frame(stream[idx : idx + self.chunk], eventpoint)
-                    streamlen -= self.chunk
-                    idx += self.chunk
-                last_stream = stream[idx:]
-        eventpoint = {"status": "end", "text": text}
-        eventpoint.update(**textevent)
-        self.parent.put_audio_frame(np.zeros(self.chunk, np.float32), eventpoint)
+            frames.push_pcm16(chunk)
+        frames.finish()
 
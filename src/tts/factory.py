@@ -14,6 +14,7 @@ from .engines import (
     EdgeTTS,
     FishTTS,
     IndexTTS2,
+    MockTTS,
     SovitsTTS,
     TencentTTS,
     XTTS,
@@ -30,6 +31,7 @@ _ENGINE_MAP: dict[str, Type[BaseTTS]] = {
     "doubao": DoubaoTTS,
     "indextts2": IndexTTS2,
     "azuretts": AzureTTS,
+    "mock": MockTTS,
 }
 
 
@@ -0,0 +1,136 @@
+"""
+流式重采样
+
+TTS 引擎收到的网络音频块长度不定，原来每块单独调用 resampy.resample：
+每次都从零开始跑高阶 sinc 滤波，块边界处缺少前后文，会产生咔哒声；
+各引擎还要自己处理不足一帧的剩余样本。
+
+StreamingResampler 用有理数比例 L/M 的多相 FIR（Kaiser 窗 sinc）实现，
+跨块保留输入历史，分块结果与整段重采样一致；同时负责按 20ms 切帧。
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from math import ceil, gcd
+
+import numpy as np
+
+
+@lru_cache(maxsize=None)
+def _polyphase_filter(up: int, down: int, zeros: int, rolloff: float, beta: float) -> tuple[np.ndarray, int]:
+    """返回 [up, 2*half] 的相位系数表和半宽 half（输入样本数）。"""
+    # 降采样时截止频率跟随输出奈奎斯特频率
+    cutoff = min(1.0, up / down) * rolloff
+    half = int(ceil(zeros / cutoff))
+    taps = np.arange(-half + 1, half + 1)
+    # 第 p 相：输出点位于输入 base + p/up 处，taps 对应输入 base + j
+    t = np.arange(up)[:, None] / up - taps[None, :]
+    # 连续 Kaiser 窗，|t| >= half 处为 0
+    r = np.clip(1 - (t / half) ** 2, 0, None)
+    win = np.i0(beta * np.sqrt(r)) / np.i0(beta) * (np.abs(t) < half)
+    table = cutoff * np.sinc(cutoff * t) * win
+    return table.astype(np.float32), half
+
+
+class StreamingResampler:
+    """
+    有状态的流式重采样 + 分帧。
+
+    - process(x)：喂入任意长度的 float32 样本，返回已能确定的输出样本；
+    - push_pcm16(data)：直接喂入 int16 小端字节，奇数字节会留到下一块；
+    - frames(x) / flush_frames()：按 frame_size 切帧，不足一帧的样本留到下一次；
+    - flush()：流结束时补零冲刷滤波器尾部。
+    """
+
+    def __init__(self, sr_orig: int, sr_new: int = 16000, frame_size: int = 320,
+                 zeros: int = 16, rolloff: float = 0.945, beta: float = 8.6):
+        g = gcd(int(sr_orig), int(sr_new))
+        self.sr_orig = sr_orig
+        self.sr_new = sr_new
+        self.up = int(sr_new) // g
+        self.down = int(sr_orig) // g
+        self.frame_size = frame_size
+        self.passthrough = self.up == self.down
+        if not self.passthrough:
+            self._table, self._half = _polyphase_filter(self.up, self.down, zeros, rolloff, beta)
+        else:
+            self._table, self._half = None, 0
+        self.reset()
+
+    def reset(self) -> None:
+        # 输入缓冲首样本的全局下标，开头补 half-1 个零作为左侧历史
+        self._buf = np.zeros(max(self._half - 1, 0), np.float32)
+        self._buf_start = -len(self._buf)
+        self._in_total = 0
+        self._out_next = 0
+        self._pending_bytes = b""
+        self._frame_buf = np.zeros(0, np.float32)
+
+    def process(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype=np.float32).reshape(-1)
+        self._in_total += len(x)
+        if self.passthrough:
+            return x
+        self._buf = np.concatenate((self._buf, x))
+        # 输出 n 依赖输入 base(n)+half，base(n) = n*down//up
+        last_base = self._buf_start + len(self._buf) - 1 - self._half
+        return self._emit(last_base)
+
+    def flush(self) -> np.ndarray:
+        """补零计算剩余输出，总输出长度为 ceil(输入长度 * up / down)。"""
+        if self.passthrough:
+            return np.zeros(0, np.float32)
+        self._buf = np.concatenate((self._buf, np.zeros(self._half, np.float32)))
+        total = -(-self._in_total * self.up // self.down)
+        return self._emit(self._buf_start + len(self._buf) - 1 - self._half, total)
+
+    def _emit(self, last_base: int, limit: int | None = None) -> np.ndarray:
+        if last_base < 0:
+            return np.zeros(0, np.float32)
+        end = -(-(last_base + 1) * self.up // self.down)
+        if limit is not None:
+            end = min(end, limit)
+        n = np.arange(self._out_next, end)
+        if len(n) == 0:
+            return np.zeros(0, np.float32)
+        pos = n * self.down
+        base = pos // self.up
+        phase = pos - base * self.up
+        windows = np.lib.stride_tricks.sliding_window_view(self._buf, 2 * self._half)
+        out = np.einsum("ij,ij->i", windows[base - self._half + 1 - self._buf_start], self._table[phase])
+        self._out_next = end
+        # 丢掉后续输出不再需要的历史
+        keep_from = end * self.down // self.up - self._half + 1
+        drop = keep_from - self._buf_start
+        if drop > 0:
+            self._buf = self._buf[drop:]
+            self._buf_start = keep_from
+        return out.astype(np.float32, copy=False)
+
+    def push_pcm16(self, data: bytes) -> np.ndarray:
+        """喂入 16bit 小端 PCM 字节（网络块可能在半个样本处截断）。"""
+        data = self._pending_bytes + data
+        usable = len(data) - len(data) % 2
+        self._pending_bytes = data[usable:]
+        pcm = np.frombuffer(data[:usable], dtype="<i2").astype(np.float32) / 32767
+        return self.process(pcm)
+
+    def frames(self, x: np.ndarray) -> list[np.ndarray]:
+        """把已重采样的样本按 frame_size 切帧，剩余样本留到下一次。"""
+        if len(x):
+            self._frame_buf = np.concatenate((self._frame_buf, x))
+        n = len(self._frame_buf) // self.frame_size
+        out = [self._frame_buf[i * self.frame_size:(i + 1) * self.frame_size] for i in range(n)]
+        self._frame_buf = self._frame_buf[n * self.frame_size:]
+        return out
+
+    def flush_frames(self, pad: bool = False) -> list[np.ndarray]:
+        """冲刷滤波器尾部并切帧；pad=True 时最后不足一帧的样本补零输出，否则丢弃。"""
+        out = self.frames(self.flush())
+        if pad and len(self._frame_buf):
+            tail = np.zeros(self.frame_size, np.float32)
+            tail[:len(self._frame_buf)] = self._frame_buf
+            out.append(tail)
+        self._frame_buf = np.zeros(0, np.float32)
+        return out
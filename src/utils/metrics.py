@@ -0,0 +1,243 @@
+"""
+进程内指标，按 Prometheus 文本格式（0.0.4）在 /metrics 输出
+
+各阶段耗时用直方图记录，标签为 session / avatar（模型类型）；会话回收时删除该会话的全部序列，
+避免 sessionid 不断增长导致序列数膨胀。/health 里原有的统计（pacer、TTS 连接 / 缓存 / 调度、
+会话池、准入控制、生命周期）在抓取时转换成 gauge 一并输出，见 stats_gauges。
+
+记录一次观测只是一次 bisect 加几次自增（每个序列一把锁），不依赖 prometheus_client，
+可以在生产环境常开；app.metrics 为 false 时所有记录都是空操作。
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from bisect import bisect_left
+from typing import Iterable
+
+enabled = True
+
+# 秒。ASR / LLM / TTS 这类请求级耗时
+REQUEST_BUCKETS = (0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0)
+# 秒。特征提取 / 前向 / 贴回这类逐批、逐帧耗时
+STEP_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.02, 0.04, 0.08, 0.16, 0.32, 0.64)
+SESSION_LABELS = ("session", "avatar")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _NoopChild:
+    def inc(self, amount: float = 1) -> None:
+        pass
+
+    def set(self, value: float) -> None:
+        pass
+
+    def observe(self, value: float) -> None:
+        pass
+
+
+_NOOP = _NoopChild()
+
+
+class _CounterChild:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1) -> None:
+        with self._lock:
+            self.value += amount
+
+
+class _GaugeChild:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class _HistogramChild:
+    def __init__(self, bounds: tuple[float, ...]):
+        self._lock = threading.Lock()
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # 最后一个是 +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        i = bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = SESSION_LABELS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._children: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """取得（必要时创建）一组标签值对应的序列"""
+        if not enabled:
+            return _NOOP
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def remove(self, label: str, value: str) -> None:
+        index = self.labelnames.index(label)
+        with self._lock:
+            for key in [k for k in self._children if k[index] == value]:
+                del self._children[key]
+
+    def _samples(self, key, child) -> list[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(child.value)}"]
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for key, child in children:
+            lines.extend(self._samples(key, child))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _new_child(self):
+        return _GaugeChild()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = SESSION_LABELS,
+                 buckets: tuple[float, ...] = REQUEST_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def _samples(self, key, child) -> list[str]:
+        with child._lock:
+            counts = list(child.counts)
+            total, count = child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (math.inf,), counts):
+            cumulative += n
+            le = f'le="{_format_value(bound)}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+_REGISTRY: list[_Metric] = []
+
+
+def session_labels(avatar) -> tuple[str, str]:
+    """avatar 对应的 session / avatar 标签值"""
+    return str(avatar.sessionid), avatar.config.model.type
+
+
+def remove_session(sessionid) -> None:
+    """会话结束时删除该会话的所有序列"""
+    value = str(sessionid)
+    for metric in _REGISTRY:
+        if "session" in metric.labelnames:
+            metric.remove("session", value)
+
+
+def _flatten(prefix: str, stats: dict):
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (bool, int, float)):
+            yield name, float(value)
+
+
+def stats_gauges(prefix: str, rows: Iterable[tuple[dict, dict | None]]) -> list[str]:
+    """把 stats() 返回的字典展开成 gauge。
+
+    rows 为 (标签, stats) 列表，例如按会话的 pacer 统计、按端点的 TTS 连接统计；
+    嵌套字典的 key 拼进指标名，非数值字段跳过。"""
+    families: dict[str, list[str]] = {}
+    for labels, stats in rows:
+        if not stats:
+            continue
+        label_str = _format_labels(labels.keys(), labels.values())
+        for name, value in _flatten(prefix, stats):
+            families.setdefault(name, []).append(f"{name}{label_str} {_format_value(value)}")
+    lines = []
+    for name, samples in families.items():
+        lines.append(f"# TYPE {name} gauge")
+        lines.extend(samples)
+    return lines
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+
+# ---------- 流水线各阶段 ----------
+
+ASR_TRANSCRIBE = Histogram("linly_asr_transcribe_seconds", "ASR transcribe time", ("engine",))
+LLM_FIRST_TOKEN = Histogram("linly_llm_first_token_seconds", "LLM request to first streamed token")
+LLM_RESPONSE = Histogram("linly_llm_response_seconds", "LLM request to end of stream")
+TTS_FIRST_FRAME = Histogram("linly_tts_first_frame_seconds", "TTS sentence queued to first audio frame")
+REPLY_FIRST_AUDIO = Histogram("linly_reply_first_audio_seconds", "LLM first token to first audio frame of the reply")
+AUDIO_FEATURE = Histogram("linly_audio_feature_seconds", "Audio feature extraction per step", buckets=STEP_BUCKETS)
+MODEL_FORWARD = Histogram("linly_model_forward_seconds", "Lip-sync model forward per batch", buckets=STEP_BUCKETS)
+PASTE_BACK = Histogram("linly_paste_back_seconds", "Paste-back per frame", buckets=STEP_BUCKETS)
+FRAME_QUEUE_DEPTH = Gauge("linly_frame_queue_depth", "Inferred frames waiting for paste-back")
+WEBRTC_FRAMES = Counter("linly_webrtc_frames_sent_total", "Frames handed to WebRTC", SESSION_LABELS + ("kind",))
+WEBRTC_FPS = Gauge("linly_webrtc_send_fps", "Video frames sent per second, averaged over the last 100 frames")
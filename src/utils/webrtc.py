@@ -6,6 +6,7 @@ import json
 import logging
 import threading
 import time
+from collections import deque
 from typing import Tuple, Dict, Optional, Set, Union
 from av.frame import Frame
 from av.packet import Packet
@@ -28,7 +29,104 @@ from aiortc import (
 
 logging.basicConfig()
 logger = logging.getLogger(__name__)
-from logger import logger as mylogger
+from src.utils.logging import logger as mylogger
+from src.utils import metrics
+
+
+def _wake(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class TrackBuffer:
+    """工作线程到 recv 的线程安全帧缓冲
+
+    生产者（render 线程）按批写入，不经过事件循环；只有 recv 正在等待时才唤醒一次事件循环，
+    一批帧只有一次跨线程调度。写满时生产者阻塞等待 recv 取走（与原来 asyncio.Queue.put 一致），
+    不丢帧，保证 eventpoint 和音视频对齐；正常情况下节奏控制会让深度远低于容量。
+    轨道停止时 close() 唤醒并放行阻塞的生产者，之后写入的帧直接丢弃。
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._items = deque()
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        self._loop = None
+        self._waiter = None
+        self._closed = False
+        self.blocked = 0  # 生产者因缓冲写满而等待的次数
+
+    def _wake_locked(self):
+        waiter, self._waiter = self._waiter, None
+        if waiter is not None:
+            try:
+                self._loop.call_soon_threadsafe(_wake, waiter)
+            except RuntimeError:  # 事件循环已关闭
+                pass
+
+    def put_many(self, items):
+        """任意线程调用，一次写入一批 (frame, eventpoint)；缓冲写满时阻塞"""
+        if not items:
+            return
+        with self._lock:
+            for item in items:
+                if len(self._items) >= self.maxsize and not self._closed:
+                    self.blocked += 1
+                    self._wake_locked()
+                    while len(self._items) >= self.maxsize and not self._closed:
+                        self._not_full.wait()
+                if self._closed:
+                    return
+                self._items.append(item)
+            self._wake_locked()
+
+    def put(self, item):
+        """写入单个 (frame, eventpoint)；缓冲写满时阻塞，同 put_many"""
+        self.put_many((item,))
+
+    def _pop_locked(self):
+        item = self._items.popleft()
+        self._not_full.notify()
+        return item
+
+    async def get(self):
+        while True:
+            with self._lock:
+                if self._items:
+                    return self._pop_locked()
+                self._loop = asyncio.get_running_loop()
+                waiter = self._waiter = self._loop.create_future()
+            try:
+                await waiter
+            finally:
+                with self._lock:
+                    if self._waiter is waiter:
+                        self._waiter = None
+
+    def get_nowait(self):
+        with self._lock:
+            if not self._items:
+                raise asyncio.QueueEmpty
+            return self._pop_locked()
+
+    def qsize(self) -> int:
+        return len(self._items)
+
+    def empty(self) -> bool:
+        return not self._items
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._not_full.notify_all()
+
+    def close(self):
+        """轨道停止：清空缓冲并放行阻塞的生产者"""
+        with self._lock:
+            self._closed = True
+            self._items.clear()
+            self._not_full.notify_all()
 
 
 class PlayerStreamTrack(MediaStreamTrack):
@@ -40,13 +138,16 @@ class PlayerStreamTrack(MediaStreamTrack):
         super().__init__()  # don't forget this!
         self.kind = kind
         self._player = player
-        self._queue = asyncio.Queue(maxsize=100)
+        # 音频 20ms 一帧，容量按时长与视频对齐
+        self._queue = TrackBuffer(maxsize=100 if kind == 'video' else 200)
         self.timelist = [] #记录最近包的时间戳
         self.current_frame_count = 0
+        self._sent_metric = None
         if self.kind == 'video':
             self.framecount = 0
             self.lasttime = time.perf_counter()
             self.totaltime = 0
+            self._last_frame = None
     
     _start: float
     _timestamp: int
@@ -93,34 +194,61 @@ class PlayerStreamTrack(MediaStreamTrack):
                 mylogger.info('audio start:%f',self._start)
             return self._timestamp, AUDIO_TIME_BASE
 
+    async def _get_video(self):
+        pacer = self._player.pacer if self._player is not None else None
+        if pacer is None or not pacer.duplicate or self._last_frame is None:
+            return await self._queue.get()
+        # 到本帧发送时刻仍没有新帧时重复上一帧，保持时间轴连续
+        wait = self._start + (self.current_frame_count + 1) * VIDEO_PTIME - time.time()
+        try:
+            item = await asyncio.wait_for(self._queue.get(), timeout=max(wait, 0.001))
+        except asyncio.TimeoutError:
+            pacer.on_video_duplicated()
+            return self._last_frame, None
+        # 之前重复过的帧用后续新帧抵消，视频重新对齐音频
+        while not self._queue.empty() and pacer.repay_duplicate():
+            item = self._queue.get_nowait()
+        return item
+
     async def recv(self) -> Union[Frame, Packet]:        
         self._player._start(self)
 
-        frame,eventpoint = await self._queue.get()
+        if self.kind == 'video':
+            frame,eventpoint = await self._get_video()
+        else:
+            frame,eventpoint = await self._queue.get()
+        if frame is None:
+            self.stop()
+            raise Exception
         pts, time_base = await self.next_timestamp()
         frame.pts = pts
         frame.time_base = time_base
         if eventpoint and self._player is not None:
             self._player.notify(eventpoint)
-        if frame is None:
-            self.stop()
-            raise Exception
+        if self._sent_metric is None and self._player is not None:
+            self._metric_labels = self._player.metric_labels()
+            self._sent_metric = metrics.WEBRTC_FRAMES.labels(*self._metric_labels, self.kind)
+        if self._sent_metric is not None:
+            self._sent_metric.inc()
         if self.kind == 'video':
+            self._last_frame = frame
+            if self._player is not None and self._player.pacer is not None:
+                self._player.pacer.on_video_sent()
             self.totaltime += (time.perf_counter() - self.lasttime)
             self.framecount += 1
             self.lasttime = time.perf_counter()
             if self.framecount==100:
                 mylogger.info(f"------actual avg final fps:{self.framecount/self.totaltime:.4f}")
+                if self._sent_metric is not None:
+                    metrics.WEBRTC_FPS.labels(*self._metric_labels).set(self.framecount/self.totaltime)
                 self.framecount = 0
                 self.totaltime=0
         return frame
     
     def stop(self):
         super().stop()
-        # Drain & delete remaining frames
-        while not self._queue.empty():
-            item = self._queue.get_nowait()
-            del item
+        # Drain & delete remaining frames, release a blocked producer
+        self._queue.close()
         if self._player is not None:
             self._player._stop(self)
             self._player = None
@@ -156,6 +284,13 @@ class HumanPlayer:
         if self.__container is not None:
             self.__container.notify(eventpoint)
 
+    @property
+    def pacer(self):
+        return getattr(self.__container, 'pacer', None)
+
+    def metric_labels(self):
+        return metrics.session_labels(self.__container) if self.__container is not None else ("", "")
+
     @property
     def audio(self) -> MediaStreamTrack:
         """
@@ -192,14 +327,20 @@ class HumanPlayer:
         self.__started.discard(track)
 
         if not self.__started and self.__thread is not None:
+            # 只发退出信号：aiortc 会在事件循环里 stop 轨道，join 放到 join() 中由回收线程执行
             self.__log_debug("Stopping worker thread")
             self.__thread_quit.set()
-            self.__thread.join()
-            self.__thread = None
 
         if not self.__started and self.__container is not None:
             #self.__container.close()
             self.__container = None
 
+    def join(self) -> None:
+        """等待渲染线程退出（阻塞，轨道都已 stop 后在线程池中调用）"""
+        thread = self.__thread
+        if thread is not None and not self.__started:
+            thread.join()
+            self.__thread = None
+
     def __log_debug(self, msg: str, *args) -> None:
         mylogger.debug(f"HumanPlayer {msg}", *args)